@@ -0,0 +1,111 @@
+"""
+Streaming downloads to disk with bounded memory and resume.
+
+Files are written chunk by chunk to a spool file (DOWNLOAD_SPOOL_DIR, default the
+system temp dir), so peak memory is one chunk regardless of the PDF size. A dropped
+connection resumes from the bytes already on disk with an HTTP Range request
+(guarded by If-Range on the first response's ETag); without an ETag, and from servers
+that ignore Range, the transfer restarts from zero.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Union
+
+import requests
+from loguru import logger
+
+RETRYABLE = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def chunk_size() -> int:
+    return max(64 * 1024, int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(1024 * 1024))))
+
+
+def download_retries() -> int:
+    return max(0, int(os.getenv("DOWNLOAD_RETRIES", "3")))
+
+
+def spool_path(suffix: str = ".pdf") -> Path:
+    """New empty spool file for a download (the caller owns and removes it)."""
+    spool_dir = Path(os.getenv("DOWNLOAD_SPOOL_DIR") or tempfile.gettempdir())
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=spool_dir, prefix="download-", suffix=suffix)
+    os.close(fd)
+    return Path(name)
+
+
+class IncompleteDownload(IOError):
+    """The server closed the body before Content-Length bytes arrived."""
+
+
+def stream_to_file(
+    url: str,
+    headers_fn: Callable[[], Dict[str, str]],
+    dest: Optional[Path] = None,
+    retries: Optional[int] = None,
+    session: Optional[requests.Session] = None,
+) -> Path:
+    """
+    GET url into dest (a new spool file by default) and return its path.
+    headers_fn is called per attempt so expired tokens are refreshed on resume.
+    """
+    dest = Path(dest) if dest else spool_path()
+    retries = download_retries() if retries is None else retries
+    http = session or requests
+    written, total, etag = 0, None, None
+    dest.write_bytes(b"")
+    for attempt in range(retries + 1):
+        headers = dict(headers_fn())
+        if written and not etag:
+            written = 0  # no validator: a Range could splice bytes of a newer version onto the old ones
+        if written:
+            headers["Range"] = f"bytes={written}-"
+            if etag:
+                headers["If-Range"] = etag
+        try:
+            with http.get(url, headers=headers, stream=True, timeout=(10, 60)) as resp:
+                if written and resp.status_code == 416 and total == written:
+                    return dest
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    written = 0  # full body: Range ignored or the file changed since the first attempt
+                    length = resp.headers.get("Content-Length")
+                    total = int(length) if length else None
+                    etag = resp.headers.get("ETag")
+                with open(dest, "r+b" if written else "wb") as fh:
+                    fh.seek(written)
+                    fh.truncate()
+                    for chunk in resp.iter_content(chunk_size=chunk_size()):
+                        fh.write(chunk)
+                        written += len(chunk)
+                if total is not None and written < total:
+                    raise IncompleteDownload(f"received {written} of {total} bytes")
+            return dest
+        except (*RETRYABLE, IncompleteDownload) as exc:
+            if attempt >= retries:
+                dest.unlink(missing_ok=True)
+                raise
+            logger.warning(
+                "Download interrupted at {} bytes ({}); {}", written, exc, "resuming" if etag else "restarting"
+            )
+            time.sleep(min(2**attempt, 10))
+        except Exception:
+            dest.unlink(missing_ok=True)
+            raise
+    return dest
+
+
+@contextmanager
+def temporary_download(path: Union[str, Path]) -> Iterator[Path]:
+    """`with temporary_download(sp.download_file(fid)) as pdf_path:` removes the spool file afterwards."""
+    path = Path(path)
+    try:
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 import os
+import time
+from pathlib import Path
 from typing import List, Optional, Tuple
 
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError, ResourceModifiedError
+
 from azure.storage.blob import BlobServiceClient
 
+from src.bridge.downloads import download_retries, spool_path
+
 
 class RawFilesBlobReader:
     """
@@ -34,11 +41,7 @@ class RawFilesBlobReader:
                     docs.add(prefix)
         return sorted(docs)
 
-    def fetch_pdf(self, doc_name: str) -> Tuple[bytes, str]:
-        """
-        Fetch the first PDF under raw-files/<doc_name>/.
-        Skips DOCX (unsupported).
-        """
+    def _pdf_blob(self, doc_name: str) -> str:
         prefix = f"{doc_name}/"
         pdf_blob = None
         for blob in self.client.list_blobs(name_starts_with=prefix):
@@ -50,7 +53,61 @@ class RawFilesBlobReader:
                 continue
         if not pdf_blob:
             raise FileNotFoundError(f"No PDF found for doc '{doc_name}' in container '{self.container}'")
-        downloader = self.client.get_blob_client(pdf_blob)
-        data = downloader.download_blob().readall()
-        return data, pdf_blob
+        return pdf_blob
+
+    def download_pdf(self, doc_name: str, dest: Optional[Path] = None) -> Tuple[Path, str]:
+        """
+        Stream the first PDF under raw-files/<doc_name>/ to disk chunk by chunk.
+        An interrupted transfer resumes at the current offset, pinned to the ETag of the
+        first response; if the blob changed meanwhile the download restarts from zero.
+        Returns (path, blob name); the caller removes the file. On any error the partial
+        file is removed.
+        """
+        pdf_blob = self._pdf_blob(doc_name)
+        blob = self.client.get_blob_client(pdf_blob)
+        dest = Path(dest) if dest else spool_path()
+        retries = download_retries()
+        written, etag = 0, None
+        try:
+            with open(dest, "wb") as fh:
+                for attempt in range(retries + 1):
+                    try:
+                        if written:
+                            stream = blob.download_blob(
+                                offset=written,
+                                etag=etag,
+                                match_condition=MatchConditions.IfNotModified,
+                            )
+                        else:
+                            stream = blob.download_blob()
+                            etag = stream.properties.etag
+                        fh.seek(written)
+                        fh.truncate()
+                        for chunk in stream.chunks():
+                            fh.write(chunk)
+                            written += len(chunk)
+                        return dest, pdf_blob
+                    except ResourceModifiedError:
+                        if attempt >= retries:
+                            raise
+                        written, etag = 0, None  # blob replaced since the first response: start over
+                    except AzureError:
+                        if attempt >= retries:
+                            raise
+                        time.sleep(min(2**attempt, 10))
+        except BaseException:
+            dest.unlink(missing_ok=True)
+            raise
+        return dest, pdf_blob
+
+    def fetch_pdf(self, doc_name: str) -> Tuple[bytes, str]:
+        """
+        Fetch the first PDF under raw-files/<doc_name>/ in memory.
+        Skips DOCX (unsupported).
+        """
+        path, pdf_blob = self.download_pdf(doc_name)
+        try:
+            return path.read_bytes(), pdf_blob
+        finally:
+            path.unlink(missing_ok=True)
 
@@ -1,22 +1,62 @@
 from __future__ import annotations
 
-from functools import lru_cache
-from typing import Dict, List, Optional
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
 
 import requests
 from azure.identity import ClientSecretCredential
 from loguru import logger
 from msgraph import GraphServiceClient
+from requests.adapters import HTTPAdapter
 
+from src.bridge.downloads import stream_to_file
 from src.config.settings import get_settings
 
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+ROOT_FOLDERS = ("", "root", "/", "documents", "shared documents")
+ITEM_SELECT = "id,name,lastModifiedDateTime,eTag,file,folder,parentReference"
+THROTTLED = (429, 503, 504)
+BATCH_LIMIT = 20  # Graph JSON batching accepts at most 20 requests per call
+
+
+def graph_base_url() -> str:
+    return os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+
+
+def _to_item(child: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": child.get("id"),
+        "name": child.get("name"),
+        "lastModified": child.get("lastModifiedDateTime") or child.get("lastModified"),
+        "eTag": child.get("eTag"),
+        "parentPath": (child.get("parentReference") or {}).get("path"),
+        "parentId": (child.get("parentReference") or {}).get("id"),
+        "isFolder": "folder" in child,
+    }
+
+
+def _retry_after(headers: Optional[Dict[str, str]], attempt: int) -> float:
+    """Seconds to wait: Graph's Retry-After when present, else exponential backoff (capped at 60s)."""
+    value = next((v for k, v in (headers or {}).items() if k.lower() == "retry-after"), "")
+    try:
+        return min(float(value), 60.0)
+    except ValueError:
+        return min(2.0**attempt, 60.0)
+
 
 class SharePointConnector:
     """
     SharePoint bridge using Microsoft Graph.
 
-    - Auth via azure-identity ClientSecretCredential.
-    - Provides file streaming and listing with detailed logging.
+    - Auth via azure-identity ClientSecretCredential; tokens are cached until shortly before expiry.
+    - One pooled requests.Session; 429/503/504 responses are retried after Retry-After.
+    - Bulk reads (recursive listing, item metadata) are grouped into JSON $batch calls.
+    - Provides file streaming and paginated (optionally recursive) listing with detailed logging.
     - Supports resolving a drive by name (e.g., "Documents").
     """
 
@@ -28,17 +68,30 @@ class SharePointConnector:
         site_id: str,
         drive_id: Optional[str] = None,
         drive_name: str = "Documents",
+        max_workers: Optional[int] = None,
     ) -> None:
         self.site_id = site_id
         self.drive_id = drive_id
         self.drive_name = drive_name
+        self.base_url = graph_base_url()
+        self.max_workers = max_workers or int(os.getenv("GRAPH_LIST_WORKERS", "4"))
+        self.max_retries = int(os.getenv("GRAPH_MAX_RETRIES", "5"))
+        self.page_size = int(os.getenv("GRAPH_PAGE_SIZE", "200"))
 
-        scopes = ["https://graph.microsoft.com/.default"]
         credential = ClientSecretCredential(
             tenant_id=tenant_id, client_id=client_id, client_secret=client_secret
         )
         self.credential = credential
-        self.client = GraphServiceClient(credential, scopes=scopes)
+        self.client = GraphServiceClient(credential, scopes=[GRAPH_SCOPE])
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, self.max_workers * 2))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token_lock = threading.Lock()
+        self._access_token: Optional[Any] = None
+        self._drive_lock = threading.Lock()
+        self._drives: Optional[List[Dict[str, Any]]] = None
+        self._drive_id: Optional[str] = None
         logger.debug(
             "Initialized GraphServiceClient site_id={} drive_id={} drive_name={}",
             site_id,
@@ -47,19 +100,98 @@ class SharePointConnector:
         )
 
     def _token(self) -> str:
-        return self.credential.get_token("https://graph.microsoft.com/.default").token
+        """Bearer token, refreshed 5 minutes before it expires."""
+        with self._token_lock:
+            if self._access_token is None or self._access_token.expires_on - time.time() < 300:
+                self._access_token = self.credential.get_token(GRAPH_SCOPE)
+            return self._access_token.token
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self._token()}"}
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Request with auth on the pooled session, sleeping out Graph throttling (Retry-After)."""
+        for attempt in range(self.max_retries + 1):
+            resp = self.session.request(method, url, headers=self._auth_headers(), timeout=(10, 60), **kwargs)
+            if resp.status_code not in THROTTLED or attempt >= self.max_retries:
+                resp.raise_for_status()
+                return resp
+            delay = _retry_after(resp.headers, attempt)
+            logger.warning("Graph throttled ({}) on {}; retrying in {:.1f}s", resp.status_code, url, delay)
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        return self._request("GET", url, params=params)
+
+    def batch(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """
+        GET many Graph URLs (relative like '/drives/x/items/y', or absolute nextLinks) through
+        JSON $batch, BATCH_LIMIT per call with up to max_workers calls in flight. Sub-requests
+        that are throttled are re-sent after their largest Retry-After. Returns
+        [{"status", "headers", "body"}] in input order; other failures are returned, not raised.
+        """
+        relative = [u[len(self.base_url) :] if u.startswith(self.base_url) else u for u in urls]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+
+        def run(indices: List[int]) -> None:
+            for attempt in range(self.max_retries + 1):
+                payload = {"requests": [{"id": str(i), "method": "GET", "url": relative[i]} for i in indices]}
+                body = self._request("POST", f"{self.base_url}/$batch", json=payload).json()
+                throttled, delay = [], 0.0
+                for sub in body.get("responses", []) or []:
+                    i, status = int(sub["id"]), int(sub.get("status") or 0)
+                    if status in THROTTLED and attempt < self.max_retries:
+                        throttled.append(i)
+                        delay = max(delay, _retry_after(sub.get("headers"), attempt))
+                        continue
+                    results[i] = {"status": status, "headers": sub.get("headers") or {}, "body": sub.get("body")}
+                if not throttled:
+                    return
+                logger.warning("Graph throttled {} batched request(s); retrying in {:.1f}s", len(throttled), delay)
+                time.sleep(delay)
+                indices = throttled
+
+        chunks = [list(range(i, min(i + BATCH_LIMIT, len(urls)))) for i in range(0, len(urls), BATCH_LIMIT)]
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                run(chunk)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                list(pool.map(run, chunks))
+        return [r or {"status": 0, "headers": {}, "body": None} for r in results]
+
+    def get_items(self, file_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Metadata for many items via $batch: id -> item (as list_files, plus a pre-authenticated
+        downloadUrl). Items that no longer exist are left out.
+        """
+        drive_id = self._resolved_drive_id()
+        query = urlencode({"$select": ITEM_SELECT + ",@microsoft.graph.downloadUrl"}, safe="$,@")
+        responses = self.batch([f"/drives/{drive_id}/items/{fid}?{query}" for fid in file_ids])
+        items: Dict[str, Dict] = {}
+        for fid, r in zip(file_ids, responses):
+            if r["status"] == 404:
+                continue
+            if r["status"] != 200:
+                raise requests.HTTPError(f"Graph $batch item {fid} failed with status {r['status']}")
+            item = _to_item(r["body"] or {})
+            item["downloadUrl"] = (r["body"] or {}).get("@microsoft.graph.downloadUrl")
+            items[fid] = item
+        logger.debug("Fetched metadata for {} of {} items", len(items), len(file_ids))
+        return items
+
+    def _list_drives(self) -> List[Dict[str, Any]]:
+        with self._drive_lock:
+            if self._drives is None:
+                logger.debug("Listing drives for site_id={}", self.site_id)
+                resp = self._get(f"{self.base_url}/sites/{self.site_id}/drives", params={"$select": "id,name"})
+                self._drives = resp.json().get("value", []) or []
+            return self._drives
 
-    @lru_cache(maxsize=1)
     def _default_drive_id(self) -> str:
         """Resolve default drive id for the site if none was provided."""
-        logger.debug("Resolving default drive ID for site_id={}", self.site_id)
-        token = self._token()
-        resp = requests.get(
-            f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives",
-            headers={"Authorization": f"Bearer {token}"},
-        )
-        resp.raise_for_status()
-        drives = resp.json().get("value", []) or []
+        drives = self._list_drives()
         if not drives:
             raise RuntimeError("No drives found for site")
         # Prefer Documents drive
@@ -70,18 +202,9 @@ class SharePointConnector:
         logger.debug("Resolved default drive_id={}", drive_id)
         return drive_id
 
-    @lru_cache(maxsize=1)
     def _drive_id_from_name(self) -> Optional[str]:
         """Resolve drive ID by its friendly name."""
-        logger.debug("Resolving drive by name='{}' for site_id={}", self.drive_name, self.site_id)
-        token = self._token()
-        resp = requests.get(
-            f"https://graph.microsoft.com/v1.0/sites/{self.site_id}/drives",
-            headers={"Authorization": f"Bearer {token}"},
-        )
-        resp.raise_for_status()
-        drives = resp.json().get("value", []) or []
-        for d in drives:
+        for d in self._list_drives():
             if d.get("name") == self.drive_name:
                 found = d.get("id")
                 logger.debug("Resolved drive '{}' to id={}", self.drive_name, found)
@@ -91,72 +214,162 @@ class SharePointConnector:
     def _resolved_drive_id(self) -> str:
         if self.drive_id and len(self.drive_id) > 10:
             return self.drive_id
-        return self._drive_id_from_name() or self._default_drive_id()
+        if self._drive_id is None:
+            self._drive_id = self._drive_id_from_name() or self._default_drive_id()
+        return self._drive_id
 
-    def get_file_stream(self, file_id: str) -> bytes:
-        """Fetch the raw byte stream of a file (typically PDF) from SharePoint."""
+    def download_file(
+        self, file_id: str, dest: Optional[Path] = None, download_url: Optional[str] = None
+    ) -> Path:
+        """
+        Stream a file (typically PDF) to disk and return the path; memory stays at one chunk
+        and an interrupted transfer resumes with a Range request. The caller removes the file.
+        A pre-authenticated download_url (get_items) skips the Graph /content redirect; if it
+        has expired, the file is fetched through Graph instead.
+        """
+        if download_url:
+            try:
+                return stream_to_file(download_url, dict, dest=dest, session=self.session)
+            except requests.HTTPError as exc:
+                if getattr(exc.response, "status_code", None) not in (401, 403, 404, 410):
+                    raise
+                logger.debug("Download URL for {} expired; falling back to Graph", file_id)
         drive_id = self._resolved_drive_id()
         logger.debug(
-            "Fetching file stream from Graph",
+            "Downloading file from Graph",
             extra={"site_id": self.site_id, "drive_id": drive_id, "file_id": file_id},
         )
-        token = self._token()
-        url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{file_id}/content"
-        resp = requests.get(url, headers={"Authorization": f"Bearer {token}"})
-        resp.raise_for_status()
-        data = resp.content
-        logger.debug("Retrieved file stream length={} bytes", len(data))
-        return data
+        url = f"{self.base_url}/drives/{drive_id}/items/{file_id}/content"
+        path = stream_to_file(url, self._auth_headers, dest=dest, session=self.session)
+        logger.debug("Downloaded {} bytes to {}", path.stat().st_size, path)
+        return path
+
+    def download_file_by_path(self, path: str, dest: Optional[Path] = None) -> Path:
+        """download_file for an item addressed by path (e.g., 'Documents/MyFolder/foo.pdf')."""
+        drive_id = self._resolved_drive_id()
+        logger.debug(
+            "Downloading file by path",
+            extra={"site_id": self.site_id, "drive_id": drive_id, "path": path},
+        )
+        url = f"{self.base_url}/drives/{drive_id}/root:/{path}:/content"
+        local = stream_to_file(url, self._auth_headers, dest=dest, session=self.session)
+        logger.debug("Downloaded {} bytes to {}", local.stat().st_size, local)
+        return local
+
+    def get_file_stream(self, file_id: str) -> bytes:
+        """Fetch the raw bytes of a file in memory (prefer download_file for large PDFs)."""
+        local = self.download_file(file_id)
+        try:
+            return local.read_bytes()
+        finally:
+            local.unlink(missing_ok=True)
 
     def get_file_stream_by_path(self, path: str) -> bytes:
         """
         Fetch bytes for an item by path (e.g., 'Documents/MyFolder/foo.pdf').
         """
+        local = self.download_file_by_path(path)
+        try:
+            return local.read_bytes()
+        finally:
+            local.unlink(missing_ok=True)
+
+    def _children(self, url: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """All children of one folder, following @odata.nextLink pages."""
+        children: List[Dict[str, Any]] = []
+        while url:
+            body = self._get(url, params=params).json()
+            children.extend(c for c in body.get("value", []) or [] if isinstance(c, dict))
+            url, params = body.get("@odata.nextLink"), None  # nextLink already carries the query
+        return children
+
+    def folder_id(self, folder_path: str = "Documents") -> str:
+        """Drive item id of a folder (the drive root for ROOT_FOLDERS)."""
         drive_id = self._resolved_drive_id()
-        logger.debug(
-            "Fetching file stream by path",
-            extra={"site_id": self.site_id, "drive_id": drive_id, "path": path},
-        )
-        token = self._token()
-        url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{path}:/content"
-        resp = requests.get(url, headers={"Authorization": f"Bearer {token}"})
-        resp.raise_for_status()
-        data = resp.content
-        logger.debug("Retrieved file stream length={} bytes", len(data))
-        return data  # type: ignore[return-value]
+        clean_path = (folder_path or "").strip("/")
+        if clean_path.lower() in ROOT_FOLDERS:
+            url = f"{self.base_url}/drives/{drive_id}/root"
+        else:
+            url = f"{self.base_url}/drives/{drive_id}/root:/{clean_path}"
+        return self._get(url, params={"$select": "id"}).json()["id"]
 
-    def list_files(self, folder_path: str = "Documents") -> List[Dict]:
+    def list_files(self, folder_path: str = "Documents", recursive: bool = False) -> List[Dict]:
         """
-        List files in a folder path. Returns ID, name, lastModified.
+        List a folder (all pages). Returns id, name, lastModified, eTag, parentPath, parentId, isFolder.
+        With recursive=True, subfolders are walked level by level through $batch (up to
+        GRAPH_LIST_WORKERS batches in flight) and only the files of the whole tree are returned.
         """
         drive_id = self._resolved_drive_id()
         logger.debug(
             "Listing files",
             extra={"site_id": self.site_id, "drive_id": drive_id, "folder_path": folder_path},
         )
-        clean_path = folder_path or ""
-        if clean_path.lower() in ("", "root", "/", "documents", "shared documents"):
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root/children"
+        clean_path = (folder_path or "").strip("/")
+        if clean_path.lower() in ROOT_FOLDERS:
+            url = f"{self.base_url}/drives/{drive_id}/root/children"
         else:
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{clean_path}:/children"
-        token = self._token()
-        resp = requests.get(url, headers={"Authorization": f"Bearer {token}"})
-        resp.raise_for_status()
-        items = resp.json().get("value", []) or []
-        result = []
-        for child in items:
-            if isinstance(child, dict):
-                cid = child.get("id")
-                name = child.get("name")
-                last = child.get("lastModifiedDateTime") or child.get("lastModified")
-            else:
-                cid = getattr(child, "id", None)
-                name = getattr(child, "name", None)
-                last = getattr(child, "last_modified_date_time", None)
-            result.append({"id": cid, "name": name, "lastModified": last})
+            url = f"{self.base_url}/drives/{drive_id}/root:/{clean_path}:/children"
+        params = {"$select": ITEM_SELECT, "$top": self.page_size}
+        result = [_to_item(c) for c in self._children(url, params)]
+        if recursive:
+            result = self._walk(drive_id, result, params)
         logger.debug("Listed {} items from folder {}", len(result), folder_path)
         return result
 
+    def _walk(self, drive_id: str, top: List[Dict], params: Dict[str, Any]) -> List[Dict]:
+        """
+        Breadth-first walk of the folders in `top`: each level's folder listings (and their
+        next pages) go out together through $batch instead of one round trip per folder.
+        """
+        query = urlencode(params, safe="$,")
+        files = [i for i in top if not i["isFolder"]]
+        pending = [f"/drives/{drive_id}/items/{i['id']}/children?{query}" for i in top if i["isFolder"]]
+        while pending:
+            responses = self.batch(pending)
+            next_round: List[str] = []
+            for url, r in zip(pending, responses):
+                if r["status"] != 200:
+                    raise requests.HTTPError(f"Graph $batch listing {url} failed with status {r['status']}")
+                body = r["body"] or {}
+                for item in map(_to_item, body.get("value", []) or []):
+                    if item["isFolder"]:
+                        next_round.append(f"/drives/{drive_id}/items/{item['id']}/children?{query}")
+                    else:
+                        files.append(item)
+                if body.get("@odata.nextLink"):
+                    next_round.append(body["@odata.nextLink"])
+            pending = next_round
+        return files
+
+    def delta(self, delta_link: Optional[str] = None) -> Tuple[List[Dict], str]:
+        """
+        Changes on the drive since delta_link (everything when None), following all pages.
+        Returns (items, new_delta_link). Items carry id, name, lastModified, eTag, parentPath,
+        parentId, isFolder and deleted (True for removed items, which may lack a name).
+        Graph leaves parentPath out of delta responses: use parentId (and the folder items)
+        to tell which folder an item is in.
+        """
+        drive_id = self._resolved_drive_id()
+        url = delta_link or f"{self.base_url}/drives/{drive_id}/root/delta"
+        params = None if delta_link else {"$select": ITEM_SELECT + ",deleted"}
+        logger.debug("Fetching drive delta", extra={"drive_id": drive_id, "incremental": bool(delta_link)})
+        items: List[Dict] = []
+        while True:
+            body = self._get(url, params=params).json()
+            params = None
+            for child in body.get("value", []) or []:
+                item = _to_item(child)
+                item["deleted"] = "deleted" in child
+                items.append(item)
+            if body.get("@odata.nextLink"):
+                url = body["@odata.nextLink"]
+                continue
+            new_link = body.get("@odata.deltaLink")
+            if not new_link:
+                raise RuntimeError("Graph delta response had neither nextLink nor deltaLink")
+            logger.debug("Delta returned {} changed items", len(items))
+            return items, new_link
+
     def get_first_pdf_in_folder(self, folder_path: str = "Documents") -> bytes:
         """
         Convenience: fetch the first PDF bytes in a folder.
@@ -200,4 +413,3 @@ if __name__ == "__main__":
             logger.info(f)
     except Exception as exc:  # pragma: no cover - network call
         logger.error("SharePoint mock run failed: {}", exc)
-
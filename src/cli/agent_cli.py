@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import argparse
 
-from src.orchestration.agent import build_agent
+from src.orchestration.agent import get_1440_agent
 
 
 def main() -> None:
@@ -10,8 +10,8 @@ def main() -> None:
     parser.add_argument("--query", required=True, help="User query")
     args = parser.parse_args()
 
-    agent = build_agent()
-    result = agent.run(args.query)
+    agent = get_1440_agent()
+    result = agent.run_query(args.query)  # type: ignore[attr-defined]
     print(result)
 
 
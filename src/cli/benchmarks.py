@@ -0,0 +1,360 @@
+"""
+Micro-benchmarks for the QA and ingest paths.
+
+Usage:
+  python -m src.cli.benchmarks agent --iterations 20
+  python -m src.cli.benchmarks embed --backends hf onnx
+  python -m src.cli.benchmarks filter --points 20000 --url http://localhost:6333
+  python -m src.cli.benchmarks figures --formats png webp-lossless webp jpeg
+  python -m src.cli.benchmarks fastpath --pdf manuals/sop.pdf
+  python -m src.cli.benchmarks upsert --docs 20 --url http://localhost:6333
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+
+def _time_calls(fn: Callable[[], object], iterations: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": statistics.median(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def _report(label: str, stats: Dict[str, float]) -> None:
+    print(
+        f"{label:<36} mean={stats['mean_ms']:9.2f}ms  p50={stats['p50_ms']:9.2f}ms  max={stats['max_ms']:9.2f}ms"
+    )
+
+
+def bench_agent(iterations: int) -> None:
+    """
+    Per-query setup overhead: building the agent + retrieval/inference clients on every
+    request (old behaviour) vs. reusing the process-wide instances.
+    Retrieval and inference themselves are excluded; they hit the network.
+    """
+    from src.orchestration import agent as agent_mod
+    from src.retrieval import multimodal_service as mms
+
+    def per_query_build() -> None:
+        agent_mod._configure_openai_env.cache_clear()
+        mms._text_client_model.cache_clear()
+        mms._openai_client.cache_clear()
+        agent_mod.build_1440_agent()
+        mms._text_client_model()
+        mms._openai_client()
+
+    def cached() -> None:
+        agent_mod.get_1440_agent()
+        mms._text_client_model()
+        mms._openai_client()
+
+    _report("before: build per query", _time_calls(per_query_build, iterations))
+    cached()  # warm
+    _report("after: cached agent + clients", _time_calls(cached, iterations))
+
+
+def _sample_corpus(export_root: Path, min_docs: int = 32) -> List[str]:
+    """Manual markdown from local exports (URL-free), repeated to a stable workload size."""
+    from src.text_indexing.utils import strip_urls_for_embed
+
+    docs: List[str] = []
+    for md in sorted(export_root.glob("*/markdown.md")):
+        text = strip_urls_for_embed(md.read_text(encoding="utf-8"))
+        docs.extend(part.strip() for part in text.split("---") if part.strip())
+    if not docs:
+        docs = [f"Step {i}: open the settings page and confirm the backup schedule." for i in range(8)]
+    while len(docs) < min_docs:
+        docs = docs + docs
+    return docs
+
+
+def bench_embed(backends: List[str], export_root: Path, queries: int) -> None:
+    """
+    Embedding throughput per backend:
+    - ingest: all step chunks of the exported manuals embedded as one batch call
+    - query:  short questions embedded one at a time (interactive QA latency)
+    """
+    from src.embedding.backends import get_embed_model
+
+    corpus = _sample_corpus(export_root)
+    questions = [f"How do I complete step {i % 7 + 1} of the backup policy?" for i in range(queries)]
+    for backend in backends:
+        model = get_embed_model(backend)
+        model.get_text_embedding("warm up")
+
+        start = time.perf_counter()
+        model.get_text_embedding_batch(corpus)
+        ingest_s = time.perf_counter() - start
+
+        rotating = itertools.cycle(questions)
+        stats = _time_calls(lambda: model.get_query_embedding(next(rotating)), queries)
+        print(
+            f"{backend:<6} ingest: {len(corpus) / ingest_s:8.1f} chunks/s ({len(corpus)} chunks)  "
+            f"query: mean={stats['mean_ms']:.2f}ms p50={stats['p50_ms']:.2f}ms"
+        )
+
+
+def bench_filter(url: str, points: int, iterations: int, dim: int = 384) -> None:
+    """
+    Search latency on a synthetic collection of `points` step chunks: unfiltered vs.
+    filtered by document / department (file_name set) / neighbour steps, before and
+    after creating the payload indexes. Uses a throwaway collection; point --url at a
+    Qdrant server, the in-process ":memory:" mode ignores payload indexes.
+    """
+    import numpy as np
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    from src.retrieval.filters import payload_filter
+    from src.text_indexing.qdrant_writer import ensure_payload_indexes
+
+    client = QdrantClient(url=url, check_compatibility=False) if url != ":memory:" else QdrantClient(":memory:")
+    collection = f"bench_filtered_{os.getpid()}"
+    rng = np.random.default_rng(0)
+    docs = max(points // 50, 1)
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+    )
+    try:
+        for start in range(0, points, 1000):
+            n = min(1000, points - start)
+            vecs = rng.standard_normal((n, dim)).astype("float32")
+            client.upsert(
+                collection_name=collection,
+                points=[
+                    models.PointStruct(
+                        id=start + i,
+                        vector=vecs[i].tolist(),
+                        payload={
+                            "doc_id": f"doc-{(start + i) % docs}",
+                            "file_name": f"manual_{(start + i) % docs}.pdf",
+                            "doc_type": "markdown_step",
+                            "doc_version": 1,
+                            "step": (start + i) // docs + 1,
+                        },
+                    )
+                    for i in range(n)
+                ],
+            )
+        query = rng.standard_normal(dim).astype("float32").tolist()
+        cases = {
+            "unfiltered": None,
+            "one document": payload_filter(file_name="manual_7.pdf"),
+            "department (10 manuals)": payload_filter(file_name=[f"manual_{i}.pdf" for i in range(10)]),
+            "neighbour steps n-1..n+1": payload_filter(
+                file_name="manual_7.pdf", doc_type="markdown_step", step={"gte": 4, "lte": 6}
+            ),
+        }
+
+        def run(label: str) -> None:
+            for name, flt in cases.items():
+                stats = _time_calls(
+                    lambda: client.query_points(collection_name=collection, query=query, query_filter=flt, limit=8),
+                    iterations,
+                )
+                _report(f"{label}: {name}", stats)
+
+        print(f"{points} points, {docs} manuals, dim={dim}")
+        run("no index")
+        ensure_payload_indexes(client, collection)
+        run("indexed")
+    finally:
+        client.delete_collection(collection)
+
+
+def _sample_figures(export_root: Path) -> List[List[object]]:
+    """Figure crops per exported manual (decoded), or synthetic screenshot-like crops."""
+    from PIL import Image, ImageDraw
+
+    manuals: List[List[object]] = []
+    for images_dir in sorted(export_root.glob("*/images")):
+        figs = [Image.open(f).convert("RGB") for f in sorted(images_dir.iterdir()) if f.is_file()]
+        if figs:
+            manuals.append(figs)
+    if manuals:
+        return manuals
+    for m in range(4):
+        figs = []
+        for i in range(12):
+            img = Image.new("RGB", (900, 600), (245, 245, 245))
+            draw = ImageDraw.Draw(img)
+            draw.rectangle([0, 0, 900, 48], fill=(30, 90, 160))
+            for row in range(14):
+                y = 70 + row * 36
+                draw.rectangle([24, y, 24 + (row * 53 + m * 17 + i * 29) % 700 + 120, y + 18], fill=(60, 60, 60))
+            draw.ellipse([700, 300 + i * 5, 860, 460], outline=(220, 40, 40), width=4)
+            figs.append(img)
+        manuals.append(figs)
+    return manuals
+
+
+def bench_figures(formats: List[str], export_root: Path, quality: int) -> None:
+    """
+    Encode time and bytes per manual for each figure format, against the old path that
+    encoded every figure twice (PNG for upload + img.save for the local export).
+    """
+    import io
+
+    from src.text_indexing.figure_codec import FigureCodec
+
+    manuals = _sample_figures(export_root)
+    n_figs = sum(len(figs) for figs in manuals)
+    print(f"{len(manuals)} manual(s), {n_figs} figure(s)")
+
+    def double_png(img: object) -> bytes:
+        for _ in range(2):
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")  # type: ignore[attr-defined]
+        return buf.getvalue()
+
+    encoders = [("before: png x2", double_png)]
+    encoders += [(f"{fmt} (q={quality})", FigureCodec(fmt, quality).encode) for fmt in formats]
+    for label, encode in encoders:
+        start = time.perf_counter()
+        total = sum(len(encode(img)) for figs in manuals for img in figs)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<24} encode={elapsed / len(manuals) * 1000:9.1f}ms/manual  "
+            f"size={total / len(manuals) / 1024:9.1f}KiB/manual"
+        )
+
+
+def bench_fastpath(pdfs: List[Path]) -> None:
+    """
+    Per-page cost of the text-layer fast path vs. running docling on every page, with the
+    route and reason the pre-flight picked for each page.
+    """
+    from src.text_indexing.doc_parser import build_converter, parse_document
+    from src.text_indexing.fast_path import parse_hybrid
+
+    converter = build_converter()
+    for pdf in pdfs:
+        start = time.perf_counter()
+        _doc, serial = parse_document(converter, pdf, pdf.name)
+        docling_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        total, hybrid, report = parse_hybrid(
+            pdf, pdf.name, lambda first, last: parse_document(converter, pdf, pdf.name, (first, last))[1]
+        )
+        hybrid_s = time.perf_counter() - start
+
+        print(
+            f"\n{pdf.name}: {total} page(s), {report['fast_pages']} on the fast path, "
+            f"{report['docling_calls']} docling call(s)"
+        )
+        for page in report["pages"]:
+            print(
+                f"  page {page['page']:>4}  {page['route']:<8} {page['reason']:<22} chars={page['chars']:<6} "
+                f"image_cover={page['image_cover']:<6} paths={page['paths']}"
+            )
+        print(
+            f"  docling only: {docling_s / total * 1000:8.1f}ms/page ({len(serial)} items)\n"
+            f"  hybrid:       {hybrid_s / total * 1000:8.1f}ms/page ({len(hybrid)} items)  "
+            f"speedup x{docling_s / max(hybrid_s, 1e-9):.1f}"
+        )
+
+
+def bench_upsert(url: str, docs: int, export_root: Path, backend: str) -> None:
+    """
+    Indexing throughput in chunks/s for `docs` manuals: per-document embedding and
+    wait=True upserts (the single-document path) vs. BatchedQdrantWriter accumulating
+    chunks across documents. Each run writes to a throwaway collection.
+    """
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    from src.embedding.backends import get_embed_model
+    from src.text_indexing.qdrant_writer import BatchedQdrantWriter, step_chunks, upsert_steps
+
+    model = get_embed_model(backend)
+    dim = len(model.get_text_embedding("warm up"))
+    sections = _sample_corpus(export_root)
+    manuals = [[(i + 1, sec) for i, sec in enumerate(sections)] for _ in range(docs)]
+    chunks = sum(len(m) for m in manuals)
+    client = QdrantClient(url=url, check_compatibility=False) if url != ":memory:" else QdrantClient(":memory:")
+
+    def per_document(collection: str) -> None:
+        for d, steps in enumerate(manuals):
+            upsert_steps(client, collection, model, steps, {"doc_id": f"doc-{d}", "doc_version": 1, "file_name": "m"})
+
+    def batched(collection: str) -> None:
+        writer = BatchedQdrantWriter(client, model)
+        for d, steps in enumerate(manuals):
+            for pid, text, payload in step_chunks(steps, {"doc_id": f"doc-{d}", "doc_version": 1, "file_name": "m"}):
+                writer.add(collection, pid, text, payload)
+        writer.close()
+
+    print(f"{docs} manuals, {chunks} chunks, backend={backend}, dim={dim}")
+    for label, run in (("per document", per_document), ("batched writer", batched)):
+        collection = f"bench_upsert_{os.getpid()}"
+        client.create_collection(
+            collection_name=collection,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        )
+        try:
+            start = time.perf_counter()
+            run(collection)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<16} {chunks / elapsed:8.1f} chunks/s ({elapsed:.2f}s)")
+        finally:
+            client.delete_collection(collection)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="QA/ingest micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_agent = sub.add_parser("agent", help="Per-query agent construction overhead")
+    p_agent.add_argument("--iterations", type=int, default=10)
+    p_embed = sub.add_parser("embed", help="Embedding throughput per backend (ingest + query)")
+    p_embed.add_argument("--backends", nargs="+", default=["hf", "onnx"])
+    p_embed.add_argument("--export-root", type=Path, default=Path("markdown_exports"))
+    p_embed.add_argument("--queries", type=int, default=50)
+    p_filter = sub.add_parser("filter", help="Filtered vs. unfiltered Qdrant search latency")
+    p_filter.add_argument("--url", default=os.getenv("QDRANT_URL", ":memory:"))
+    p_filter.add_argument("--points", type=int, default=10000)
+    p_filter.add_argument("--iterations", type=int, default=20)
+    p_figures = sub.add_parser("figures", help="Figure encode time and bytes per manual per format")
+    p_figures.add_argument("--formats", nargs="+", default=["png", "webp-lossless", "webp", "jpeg"])
+    p_figures.add_argument("--export-root", type=Path, default=Path("markdown_exports"))
+    p_figures.add_argument("--quality", type=int, default=int(os.getenv("FIGURE_QUALITY", "85")))
+    p_fast = sub.add_parser("fastpath", help="Per-page speedup of the text-layer fast path over docling")
+    p_fast.add_argument("--pdf", type=Path, nargs="+", required=True)
+    p_upsert = sub.add_parser("upsert", help="Indexing chunks/s: per-document vs. batched Qdrant writer")
+    p_upsert.add_argument("--url", default=os.getenv("QDRANT_URL", ":memory:"))
+    p_upsert.add_argument("--docs", type=int, default=20)
+    p_upsert.add_argument("--export-root", type=Path, default=Path("markdown_exports"))
+    p_upsert.add_argument("--backend", default=os.getenv("EMBED_BACKEND", "hf"))
+    args = parser.parse_args()
+
+    if args.command == "agent":
+        bench_agent(args.iterations)
+    elif args.command == "embed":
+        bench_embed(args.backends, args.export_root, args.queries)
+    elif args.command == "filter":
+        bench_filter(args.url, args.points, args.iterations)
+    elif args.command == "figures":
+        bench_figures(args.formats, args.export_root, args.quality)
+    elif args.command == "fastpath":
+        bench_fastpath(args.pdf)
+    elif args.command == "upsert":
+        bench_upsert(args.url, args.docs, args.export_root, args.backend)
+
+
+if __name__ == "__main__":
+    main()
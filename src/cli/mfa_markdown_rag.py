@@ -13,18 +13,14 @@ from __future__ import annotations
 import argparse
 import os
 import re
-import uuid
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from openai import APIError, APITimeoutError, OpenAI
-from qdrant_client import QdrantClient, models
-
-# Optional sentence-transformer for embeddings
-try:
+if TYPE_CHECKING:  # pragma: no cover
+    from openai import OpenAI
+    from qdrant_client import QdrantClient, models
     from sentence_transformers import SentenceTransformer
-except Exception:  # pragma: no cover - optional dependency
-    SentenceTransformer = None  # type: ignore
 
 
 # Configuration
@@ -39,16 +35,34 @@ DEFAULT_DIM = 384  # matches all-MiniLM-L6-v2; used for zero-vector fallback
 STEP_RE = re.compile(r"^#{1,6}\s*Step\s*(\d+)\s*(?::\s*(.+))?$", re.IGNORECASE)
 IMG_RE = re.compile(r"!\[[^\]]*\]\(([^)]+)\)")
 
-# Model clients
-client = OpenAI(base_url=VLLM_BASE_URL, api_key="null")
+# Model clients (created lazily; importing this module stays cheap)
 _embedder: Optional["SentenceTransformer"] = None
 _embed_dim: int = DEFAULT_DIM
 
 
+@lru_cache(maxsize=1)
+def vllm_client() -> OpenAI:
+    """Shared OpenAI-compatible client for the local vLLM server."""
+    from openai import OpenAI
+
+    return OpenAI(base_url=VLLM_BASE_URL, api_key="null")
+
+
 def load_embedder() -> None:
-    """Load sentence-transformer if available and set embed dimension."""
+    """Load the MiniLM embedder (EMBED_BACKEND=hf|onnx) if available and set embed dimension."""
     global _embedder, _embed_dim
-    if SentenceTransformer is None:
+    from src.embedding.backends import embed_backend, embed_service_url, get_embed_model
+
+    if embed_backend() == "onnx" or embed_service_url():
+        try:
+            _embedder = get_embed_model()
+            _embed_dim = len(_embedder.get_text_embedding("dimension probe"))
+            return
+        except Exception:
+            _embedder = None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except Exception:  # pragma: no cover - optional dependency
         return
     try:
         _embedder = SentenceTransformer("all-MiniLM-L6-v2")
@@ -60,11 +74,26 @@ def load_embedder() -> None:
 
 def embed(text: str) -> List[float]:
     """Return an embedding vector for text or a zero-vector fallback."""
+    if _embedder is not None and hasattr(_embedder, "get_text_embedding"):
+        return list(_embedder.get_text_embedding(text))
     if _embedder:
         return _embedder.encode([text])[0].tolist()
     return [0.0] * _embed_dim
 
 
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """Batched embed(): one model call for all texts instead of one forward pass each."""
+    if not texts:
+        return []
+    if _embedder is not None and hasattr(_embedder, "get_text_embedding_batch"):
+        return [list(v) for v in _embedder.get_text_embedding_batch(texts)]
+    if _embedder:
+        from src.text_indexing.qdrant_writer import embed_batch_size
+
+        return [v.tolist() for v in _embedder.encode(texts, batch_size=embed_batch_size())]
+    return [[0.0] * _embed_dim for _ in texts]
+
+
 def parse_markdown(md_text: str) -> List[Dict[str, Any]]:
     """Parse markdown into ordered steps with text and image URLs."""
     steps: List[Dict[str, Any]] = []
@@ -97,6 +126,8 @@ def parse_markdown(md_text: str) -> List[Dict[str, Any]]:
 
 def ensure_collection(client: QdrantClient) -> None:
     """Create collection if missing."""
+    from qdrant_client import models
+
     collections = [c.name for c in client.get_collections().collections]
     if COLLECTION in collections:
         return
@@ -107,37 +138,70 @@ def ensure_collection(client: QdrantClient) -> None:
 
 
 def ingest_markdown(path: str) -> None:
-    """Ingest a markdown file into Qdrant as step-level points."""
+    """
+    Ingest a markdown file into Qdrant as step-level points.
+    Point ids derive from (file, step index, file mtime), so re-ingesting replaces the
+    file's previous points instead of duplicating them.
+    """
     md_text = Path(path).read_text(encoding="utf-8")
     steps = parse_markdown(md_text)
     if not steps:
         print(f"No steps found in {path}")
         return
 
+    from qdrant_client import QdrantClient, models
+
+    from src.text_indexing.qdrant_writer import BatchedQdrantWriter, point_id
+
     qc = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
     ensure_collection(qc)
 
-    points: List[models.PointStruct] = []
-    for s in steps:
-        vec = embed(s["text"])
+    version = int(Path(path).stat().st_mtime)
+    writer = BatchedQdrantWriter(qc, _embedder)
+    for idx, (s, vec) in enumerate(zip(steps, embed_many([s["text"] for s in steps]))):
         payload = {
             "step": s["step"],
             "title": s.get("title", ""),
             "text": s["text"],
             "image_urls": s.get("images", []),
+            "doc_id": str(path),
             "source_md": str(path),
+            "doc_version": version,
         }
-        points.append(models.PointStruct(id=str(uuid.uuid4()), vector=vec, payload=payload))
+        writer.add(COLLECTION, point_id(str(path), idx, version), s["text"], payload, vector=vec)
+    # Drop this file's older versions (and pre-versioning / pre-doc_id copies) once the new points are applied.
+    legacy = models.Filter(
+        must=[
+            models.FieldCondition(key="source_md", match=models.MatchValue(value=str(path))),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key="doc_id")),
+        ]
+    )
+    same_doc = models.Filter(
+        should=[models.FieldCondition(key="doc_id", match=models.MatchValue(value=str(path))), legacy]
+    )
+    writer.after_flush(
+        lambda: qc.delete(
+            collection_name=COLLECTION,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[same_doc],
+                    must_not=[models.FieldCondition(key="doc_version", match=models.MatchValue(value=version))],
+                )
+            ),
+        )
+    )
 
     try:
-        qc.upsert(collection_name=COLLECTION, points=points)
-        print(f"Ingested {len(points)} steps into {COLLECTION} from {path}")
+        writer.close()
+        print(f"Ingested {len(steps)} steps into {COLLECTION} from {path}")
     except Exception as exc:  # pragma: no cover - external IO
         print(f"Failed to upsert into Qdrant: {exc}")
 
 
 def search_steps(query: str, k: int = 3) -> List[models.ScoredPoint]:
     """Search Qdrant for top-k steps."""
+    from qdrant_client import QdrantClient, models
+
     qc = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
     qvec = embed(query)
     try:
@@ -173,8 +237,10 @@ def answer_question(question: str, top_k: int = 1, timeout: float = 30.0) -> str
     for url in images[:20]:
         content.append({"type": "image_url", "image_url": {"url": url}})
 
+    from openai import APIError, APITimeoutError
+
     try:
-        resp = client.chat.completions.create(
+        resp = vllm_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": content}],
             temperature=0.2,
@@ -0,0 +1,195 @@
+"""
+Deduplicate Qdrant collections filled before point ids were deterministic.
+
+Documents are keyed the way ingest derives doc_id (doc_id, else file_name, else
+source_md); legacy points written without doc_id join the doc_id that other points of
+the same file carry. For every document only the newest complete version is kept; older
+versions, pre-versioning copies and leftovers of interrupted writes are deleted in bulk.
+Remaining duplicates of the same chunk (doc_type + step) are collapsed to one point.
+
+--gc-figures also deletes shared figure blobs (figures/...) that no remaining point
+references, once they are older than --min-age-hours. Run it while no ingest is writing.
+
+Usage:
+  python -m src.cli.qdrant_cleanup --collection manuals_text --collection mfa_guides --dry-run
+  python -m src.cli.qdrant_cleanup --gc-figures
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+KEY_FIELDS = ["doc_id", "file_name", "source_md", "doc_version", "current", "doc_type", "step"]
+
+
+def _doc_key(payload: Dict[str, Any], legacy_ids: Optional[Dict[Tuple[str, str], str]] = None) -> Optional[str]:
+    """Ingest's doc_id for a point; legacy points (no doc_id) map through legacy_ids when their file is known."""
+    if payload.get("doc_id"):
+        return payload["doc_id"]
+    for field in ("file_name", "source_md"):
+        if payload.get(field):
+            return (legacy_ids or {}).get((field, payload[field]), payload[field])
+    return None
+
+
+def _legacy_ids(points: List[Any]) -> Dict[Tuple[str, str], str]:
+    """(file_name | source_md, value) -> doc_id, for files that map to exactly one doc_id."""
+    ids: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+    for p in points:
+        payload = p.payload or {}
+        if payload.get("doc_id"):
+            for field in ("file_name", "source_md"):
+                if payload.get(field):
+                    ids[(field, payload[field])].add(payload["doc_id"])
+    return {key: next(iter(doc_ids)) for key, doc_ids in ids.items() if len(doc_ids) == 1}
+
+
+def plan_dedupe(points: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """
+    (ids to delete, ids to mark current=True) for scrolled points (id + payload).
+    The kept version is the newest one not flagged current=False; if a document only
+    has unfinished versions, the newest of those is kept and activated.
+    """
+    by_doc: Dict[str, List[Any]] = defaultdict(list)
+    legacy_ids = _legacy_ids(points)
+    for p in points:
+        key = _doc_key(p.payload or {}, legacy_ids)
+        if key:
+            by_doc[key].append(p)
+
+    delete: List[Any] = []
+    activate: List[Any] = []
+    for pts in by_doc.values():
+        versions = {p.payload.get("doc_version") for p in pts} - {None}
+        live = {p.payload.get("doc_version") for p in pts if p.payload.get("current") is not False} - {None}
+        keep_version = max(live) if live else (max(versions) if versions else None)
+
+        kept: List[Any] = []
+        for p in pts:
+            if keep_version is not None and p.payload.get("doc_version") != keep_version:
+                delete.append(p.id)
+            else:
+                kept.append(p)
+
+        seen = set()
+        for p in sorted(kept, key=lambda p: str(p.id)):
+            chunk = (p.payload.get("doc_type"), p.payload.get("step"))
+            if chunk in seen:
+                delete.append(p.id)
+                continue
+            seen.add(chunk)
+            if p.payload.get("current") is False:
+                activate.append(p.id)
+    return delete, activate
+
+
+def dedupe_collection(client: Any, collection: str, dry_run: bool = False, batch: int = 1000) -> Dict[str, int]:
+    from qdrant_client.http import models
+
+    points: List[Any] = []
+    offset = None
+    while True:
+        page, offset = client.scroll(
+            collection_name=collection,
+            limit=batch,
+            offset=offset,
+            with_payload=models.PayloadSelectorInclude(include=KEY_FIELDS),
+            with_vectors=False,
+        )
+        points.extend(page)
+        if offset is None:
+            break
+
+    delete, activate = plan_dedupe(points)
+    print(f"{collection}: {len(points)} points, {len(delete)} to delete, {len(activate)} to activate")
+    if not dry_run:
+        for start in range(0, len(activate), batch):
+            client.set_payload(
+                collection_name=collection,
+                payload={"current": True},
+                points=activate[start : start + batch],
+                wait=True,
+            )
+        for start in range(0, len(delete), batch):
+            client.delete(
+                collection_name=collection,
+                points_selector=models.PointIdsList(points=delete[start : start + batch]),
+                wait=True,
+            )
+    return {"points": len(points), "deleted": len(delete), "activated": len(activate)}
+
+
+def referenced_figures(client: Any, collection: str, batch: int = 1000) -> Set[str]:
+    """Blob names of the shared figures the points of a collection point at (payload fig_images)."""
+    from qdrant_client.http import models
+
+    names: Set[str] = set()
+    offset = None
+    while True:
+        page, offset = client.scroll(
+            collection_name=collection,
+            limit=batch,
+            offset=offset,
+            with_payload=models.PayloadSelectorInclude(include=["fig_images"]),
+            with_vectors=False,
+        )
+        for p in page:
+            names.update(m["blob_name"] for m in (p.payload or {}).get("fig_images") or [] if m.get("shared"))
+        if offset is None:
+            return names
+
+
+def gc_figures(client: Any, collections: List[str], min_age_hours: float, dry_run: bool = False) -> List[str]:
+    from src.text_indexing.figure_store import FigureStore
+    from src.text_indexing.storage import AzureBlobStorage
+
+    referenced: Set[str] = set()
+    for collection in collections:
+        referenced |= referenced_figures(client, collection)
+    if not referenced:
+        print("figures: no point references a shared figure; refusing to delete them all")
+        return []
+    storage = AzureBlobStorage(
+        container=os.getenv("AZURE_STORAGE_CONTAINER", "manual-images"),
+        connection_string=os.environ["AZURE_STORAGE_CONNECTION_STRING"],
+    )
+    store = FigureStore(storage)
+    if dry_run:
+        orphans = [name for name, _ in storage.list_blobs(f"{store.prefix}/") if name not in referenced]
+        print(f"figures: {len(referenced)} referenced, up to {len(orphans)} unreferenced (dry run)")
+        return orphans
+    deleted = store.collect_garbage(referenced, min_age_s=min_age_hours * 3600)
+    print(f"figures: {len(referenced)} referenced, {len(deleted)} unreferenced blob(s) deleted")
+    return deleted
+
+
+def main() -> None:
+    from qdrant_client import QdrantClient
+
+    from src.config.settings import get_settings
+
+    parser = argparse.ArgumentParser(description="Deduplicate Qdrant collections")
+    parser.add_argument("--collection", action="append", dest="collections", help="Repeatable; default manuals_text")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--gc-figures", action="store_true", help="Delete shared figure blobs no point references")
+    parser.add_argument("--min-age-hours", type=float, default=24.0, help="Keep younger figure blobs (--gc-figures)")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    client = QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key, check_compatibility=False)
+    existing = []
+    for collection in args.collections or ["manuals_text"]:
+        if not client.collection_exists(collection):
+            print(f"{collection}: missing, skipped")
+            continue
+        dedupe_collection(client, collection, dry_run=args.dry_run)
+        existing.append(collection)
+    if args.gc_figures and existing:
+        gc_figures(client, existing, args.min_age_hours, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
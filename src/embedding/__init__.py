@@ -0,0 +1 @@
+# Shared text-embedding backends (PyTorch / ONNX Runtime)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Optional
+
+HF_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_DIM = 384
+BACKENDS = ("hf", "onnx")
+
+
+def embed_backend() -> str:
+    """Selected local embedding backend (EMBED_BACKEND=hf|onnx, default hf)."""
+    backend = (os.getenv("EMBED_BACKEND") or "hf").strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported EMBED_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+
+def embed_service_url() -> Optional[str]:
+    """URL of the shared local embedding service (src.embedding.server), if configured."""
+    return (os.getenv("EMBED_SERVICE_URL") or "").strip() or None
+
+
+def get_embed_model(backend: Optional[str] = None, use_service: bool = True) -> Any:
+    """
+    Build the MiniLM embedder for the selected backend.
+
+    - hf:   llama-index HuggingFaceEmbedding (PyTorch, full precision)
+    - onnx: int8 ONNX Runtime model; EMBED_ONNX_THREADS / EMBED_BATCH_SIZE tune it
+    Both return the same 384-d normalised vectors and expose get_text_embedding().
+
+    When EMBED_SERVICE_URL points at a running embedding service, a thin client is
+    returned instead so the process does not load its own model copy; it falls back to
+    the in-process backend if the service is absent or goes away. A service reporting
+    another model or dimension raises EmbeddingMismatch rather than mixing vectors.
+    """
+    backend = backend or embed_backend()
+    url = embed_service_url() if use_service else None
+    if url:
+        from src.embedding.client import RemoteEmbedding
+
+        remote = RemoteEmbedding(
+            url,
+            fallback_factory=lambda: get_embed_model(backend, use_service=False),
+            model_id=HF_MODEL_NAME,
+            dim=EMBED_DIM,
+        )
+        if remote.health():
+            return remote
+    if backend == "onnx":
+        from src.embedding.onnx_minilm import OnnxMiniLMEmbedding
+
+        threads = os.getenv("EMBED_ONNX_THREADS")
+        return OnnxMiniLMEmbedding(
+            num_threads=int(threads) if threads else None,
+            max_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+        )
+
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    return HuggingFaceEmbedding(model_name=HF_MODEL_NAME)
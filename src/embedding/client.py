@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, List, Optional
+
+import requests
+from loguru import logger
+
+
+class EmbeddingMismatch(RuntimeError):
+    """The embedding service and the local fallback do not produce the same vectors."""
+
+
+class RemoteEmbedding:
+    """
+    Client for src.embedding.server, usable wherever get_text_embedding() is called.
+
+    If the service is unreachable, calls fall back to an in-process model built by
+    `fallback_factory` (loaded on first need); the service is retried after `retry_after`
+    seconds so a restarted server is picked up again.
+
+    `model_id` and `dim` describe the fallback. The service must report the same on
+    /health (checked on health() and again after every outage), and a loaded fallback
+    must match the service's dimension; otherwise EmbeddingMismatch is raised instead of
+    mixing vectors from two models in one collection.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        fallback_factory: Optional[Callable[[], Any]] = None,
+        timeout: float = 30.0,
+        retry_after: float = 30.0,
+        model_id: Optional[str] = None,
+        dim: Optional[int] = None,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.model_id = model_id
+        self._fallback_factory = fallback_factory
+        self._fallback: Any = None
+        self._down_until = 0.0
+        self._session = requests.Session()
+        self.dimensions: Optional[int] = dim
+
+    def _check_service(self) -> dict:
+        """GET /health and compare the service's model and dimension with the fallback's."""
+        resp = self._session.get(f"{self.url}/health", timeout=min(self.timeout, 2.0))
+        resp.raise_for_status()
+        info = resp.json()
+        if self.model_id is not None and info.get("model") != self.model_id:
+            raise EmbeddingMismatch(
+                f"Embedding service {self.url} serves model {info.get('model')!r}, expected {self.model_id!r}"
+            )
+        if self.dimensions is not None and info.get("dim") != self.dimensions:
+            raise EmbeddingMismatch(
+                f"Embedding service {self.url} returns {info.get('dim')}-d vectors, expected {self.dimensions}-d"
+            )
+        self.dimensions = info.get("dim")
+        return info
+
+    def health(self) -> Optional[dict]:
+        """Service info, None if it is unreachable; raises EmbeddingMismatch for a different model."""
+        try:
+            return self._check_service()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def _local(self) -> Any:
+        if self._fallback is None:
+            if self._fallback_factory is None:
+                raise RuntimeError(f"Embedding service {self.url} unavailable and no fallback configured")
+            logger.warning("Embedding service {} unavailable; loading in-process model", self.url)
+            fallback = self._fallback_factory()
+            if self.dimensions is not None:
+                dim = len(fallback.get_text_embedding("dimension probe"))
+                if dim != self.dimensions:
+                    raise EmbeddingMismatch(
+                        f"In-process fallback returns {dim}-d vectors, embedding service {self.url} "
+                        f"returns {self.dimensions}-d"
+                    )
+            self._fallback = fallback
+        return self._fallback
+
+    def get_text_embedding_batch(self, texts: List[str], **_: Any) -> List[List[float]]:
+        if not texts:
+            return []
+        if time.monotonic() >= self._down_until:
+            try:
+                if self._down_until:  # back after an outage: the service may now run another model
+                    self._check_service()
+                    self._down_until = 0.0
+                resp = self._session.post(f"{self.url}/embed", json={"texts": list(texts)}, timeout=self.timeout)
+                resp.raise_for_status()
+                return resp.json()["embeddings"]
+            except requests.RequestException as exc:
+                logger.warning("Embedding service request failed: {}", exc)
+                self._down_until = time.monotonic() + self.retry_after
+        return self._local().get_text_embedding_batch(list(texts))
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embedding_batch([text])[0]
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
+
+    def encode(self, texts: List[str]):
+        """SentenceTransformer-style helper returning an (n, dim) array."""
+        import numpy as np
+
+        return np.asarray(self.get_text_embedding_batch(list(texts)), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self.dimensions is None:
+            self.dimensions = len(self.get_text_embedding("dimension probe"))
+        return int(self.dimensions)
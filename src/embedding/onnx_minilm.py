@@ -0,0 +1,211 @@
+"""
+ONNX Runtime (int8) backend for sentence-transformers/all-MiniLM-L6-v2.
+
+Produces the same mean-pooled, L2-normalised 384-d vectors as the PyTorch model, so it
+can query/extend existing collections. The quantised model is prepared once into
+EMBED_ONNX_DIR (default ~/.cache/va-rag/onnx/<model>) and reused afterwards:
+
+  python -m src.embedding.onnx_minilm --prepare
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # sentence-transformers max_seq_length for MiniLM-L6-v2
+INT8_FILE = "model_int8.onnx"
+FP32_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def default_model_dir(model_name: str = MODEL_NAME) -> Path:
+    base = os.getenv("EMBED_ONNX_DIR")
+    if base:
+        return Path(base)
+    return Path.home() / ".cache" / "va-rag" / "onnx" / model_name.replace("/", "__")
+
+
+def _export_fp32_with_torch(model_name: str, out_dir: Path) -> None:
+    """Fallback when the hub has no ONNX export: trace the HF model with torch."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, model: Any) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):  # type: ignore[override]
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    tok = AutoTokenizer.from_pretrained(model_name)
+    tok.save_pretrained(out_dir)
+    model = _LastHidden(AutoModel.from_pretrained(model_name).eval())
+    enc = tok(["export sample"], return_tensors="pt")
+    dyn = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        model,
+        (enc["input_ids"], enc["attention_mask"], enc["token_type_ids"]),
+        str(out_dir / FP32_FILE),
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": dyn, "attention_mask": dyn, "token_type_ids": dyn, "last_hidden_state": dyn},
+        opset_version=14,
+        do_constant_folding=True,
+    )
+
+
+def prepare_model(model_name: str = MODEL_NAME, model_dir: Optional[Path] = None) -> Path:
+    """
+    Ensure an int8 dynamically-quantised ONNX model + tokenizer exist in model_dir.
+    Uses the hub's ONNX export when available, otherwise exports with torch.
+    """
+    out_dir = Path(model_dir or default_model_dir(model_name))
+    int8_path = out_dir / INT8_FILE
+    if int8_path.exists() and (out_dir / TOKENIZER_FILE).exists():
+        return out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    fp32_path = out_dir / FP32_FILE
+    if not fp32_path.exists():
+        try:
+            import shutil
+
+            from huggingface_hub import hf_hub_download
+
+            shutil.copyfile(hf_hub_download(model_name, "onnx/model.onnx"), fp32_path)
+            shutil.copyfile(hf_hub_download(model_name, TOKENIZER_FILE), out_dir / TOKENIZER_FILE)
+        except Exception:
+            _export_fp32_with_torch(model_name, out_dir)
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return out_dir
+
+
+def plan_batches(lengths: Sequence[int], max_batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group input indices into length-sorted batches.
+
+    Each batch is padded to its longest member, so sorting keeps padding small; a batch
+    closes when it would exceed max_batch_size inputs or max_batch_tokens padded tokens.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        padded = (len(current) + 1) * max(lengths[i], 1)
+        if current and (len(current) >= max_batch_size or padded > max_batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OnnxMiniLMEmbedding:
+    """
+    Drop-in for the HuggingFaceEmbedding/SentenceTransformer call sites
+    (get_text_embedding, get_query_embedding, get_text_embedding_batch, encode).
+    """
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        model_dir: Optional[Path] = None,
+        num_threads: Optional[int] = None,
+        max_batch_size: int = 32,
+        max_batch_tokens: int = 8192,
+        max_length: int = MAX_SEQ_LENGTH,
+    ) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        model_path = prepare_model(model_name, model_dir)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(model_path / INT8_FILE), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_path / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+        self.dimensions = self.session.get_outputs()[0].shape[-1]
+        if not isinstance(self.dimensions, int):
+            self.dimensions = len(self._embed_batch(["dimension probe"])[0])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.dimensions)
+
+    def _embed_batch(self, texts: Sequence[str]):
+        return self._run(self.tokenizer.encode_batch(list(texts)))
+
+    def _run(self, encodings: Sequence[Any]):
+        import numpy as np
+
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention = np.zeros_like(input_ids)
+        for row, enc in enumerate(encodings):
+            n = len(enc.ids)
+            input_ids[row, :n] = enc.ids
+            attention[row, :n] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalise (matches sentence-transformers).
+        mask = attention[..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def encode(self, texts: Sequence[str]):
+        """Embed texts with dynamic, length-bucketed batching; returns an (n, dim) array."""
+        import numpy as np
+
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, int(self.dimensions)), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(texts)
+        lengths = [len(e.ids) for e in encodings]
+        out = np.zeros((len(texts), int(self.dimensions)), dtype=np.float32)
+        for batch in plan_batches(lengths, self.max_batch_size, self.max_batch_tokens):
+            out[batch] = self._run([encodings[i] for i in batch])
+        return out
+
+    def get_text_embedding_batch(self, texts: List[str], **_: Any) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare the int8 ONNX MiniLM model")
+    parser.add_argument("--prepare", action="store_true", help="Download/export and quantise the model")
+    parser.add_argument("--model-dir", type=Path, default=None)
+    args = parser.parse_args()
+    if args.prepare:
+        print(f"Model ready in {prepare_model(model_dir=args.model_dir)}")
@@ -0,0 +1,203 @@
+"""
+Local embedding service: one model instance shared by every Streamlit session, CLI and
+ingest worker on the host. Concurrent requests are coalesced into micro-batches.
+
+Usage:
+  python -m src.embedding.server --port 8765 --max-batch 64 --max-wait-ms 5
+
+Clients opt in with EMBED_SERVICE_URL=http://127.0.0.1:8765 (see src.embedding.client).
+
+Endpoints:
+  GET  /health            -> {"ok": true, "model": "sentence-transformers/all-MiniLM-L6-v2", "dim": 384,
+                              "backend": "onnx"}
+  POST /embed {"texts": [...]} -> {"embeddings": [[...], ...]}
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent embed requests into one model call.
+
+    The worker blocks for the first pending request, then keeps collecting until
+    max_batch_size texts are queued or max_wait_ms has passed since that first request.
+    """
+
+    def __init__(self, embed_fn: EmbedFn, max_batch_size: int = 64, max_wait_ms: float = 5.0) -> None:
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: Sequence[str]) -> "Future[List[List[float]]]":
+        fut: "Future[List[List[float]]]" = Future()
+        if not texts:
+            fut.set_result([])
+        else:
+            self._queue.put((list(texts), fut))
+        return fut
+
+    def embed(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[List[float]]:
+        return self.submit(texts).result(timeout=timeout)
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._worker.join(timeout=1.0)
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            pending = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.max_wait_s
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(nxt)
+                size += len(nxt[0])
+            self._run(pending)
+
+    def _run(self, pending: List[Tuple[List[str], Future]]) -> None:
+        texts = [t for req_texts, _ in pending for t in req_texts]
+        try:
+            vectors = self.embed_fn(texts)
+        except Exception as exc:
+            for _, fut in pending:
+                fut.set_exception(exc)
+            return
+        offset = 0
+        for req_texts, fut in pending:
+            fut.set_result(vectors[offset : offset + len(req_texts)])
+            offset += len(req_texts)
+
+
+class _EmbedHandler(BaseHTTPRequestHandler):
+    server: "EmbeddingServer"
+
+    def _send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path == "/health":
+            info = {"ok": True, "model": self.server.model_id, "dim": self.server.dim, "backend": self.server.backend}
+            self._send_json(200, info)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        if self.path != "/embed":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            texts = json.loads(self.rfile.read(length) or b"{}").get("texts") or []
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("'texts' must be a list of strings")
+        except Exception as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        try:
+            vectors = self.server.batcher.embed(texts, timeout=self.server.request_timeout)
+        except Exception as exc:
+            logger.error("Embedding request failed: {}", exc)
+            self._send_json(500, {"error": str(exc)})
+            return
+        self._send_json(200, {"embeddings": vectors})
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - http.server API
+        logger.debug("embed-server " + format, *args)
+
+
+class EmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        model: Any,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        backend: str = "custom",
+        request_timeout: float = 60.0,
+        model_id: Optional[str] = None,
+    ) -> None:
+        super().__init__((host, port), _EmbedHandler)
+        self.backend = backend
+        self.model_id = model_id
+        self.request_timeout = request_timeout
+        self.dim = len(model.get_text_embedding("dimension probe"))
+        self.batcher = MicroBatcher(
+            lambda texts: [list(map(float, v)) for v in model.get_text_embedding_batch(texts)],
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+        )
+
+    def server_close(self) -> None:
+        self.batcher.close()
+        super().server_close()
+
+
+def main() -> None:
+    from src.embedding.backends import HF_MODEL_NAME, embed_backend, get_embed_model
+
+    parser = argparse.ArgumentParser(description="Shared local embedding service with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--backend", default=None, help="hf|onnx (default: EMBED_BACKEND)")
+    parser.add_argument("--max-batch", type=int, default=64, help="Max texts per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Max time to wait for a batch to fill")
+    args = parser.parse_args()
+
+    backend = args.backend or embed_backend()
+    model = get_embed_model(backend, use_service=False)
+    server = EmbeddingServer(
+        model,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        backend=backend,
+        model_id=HF_MODEL_NAME,  # both backends embed with the same MiniLM weights
+    )
+    logger.info("Embedding service ({}, dim={}) listening on http://{}:{}", backend, server.dim, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
 
 import os
 
 from loguru import logger
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
 
 from src.config.settings import get_settings
 from src.retrieval.multimodal_service import get_1440_response, hybrid_search
 
+if TYPE_CHECKING:  # pragma: no cover
+    from pydantic_ai import Agent
+
 
 class TechnicalResponse(BaseModel):
     """
@@ -20,21 +24,29 @@ class TechnicalResponse(BaseModel):
 
     answer_markdown: str = Field(..., description="The full interleaved text and image response")
     source_file: Optional[str] = Field(None, description="The primary manual used for the answer")
+    sources: List[str] = Field(default_factory=list, description="All manuals included in the context")
     confidence_score: float = Field(0.0, description="The retrieval score from Qdrant")
 
 
+@lru_cache(maxsize=1)
+def _configure_openai_env() -> None:
+    """Export configured OpenAI key/base once so the PydanticAI provider can pick them up."""
+    settings = get_settings()
+    if settings.openai_api_key:
+        os.environ.setdefault("OPENAI_API_KEY", settings.openai_api_key)
+    if settings.openai_api_base:
+        os.environ.setdefault("OPENAI_BASE_URL", settings.openai_api_base)
+
+
 def build_1440_agent() -> Agent[TechnicalResponse]:
     """
     Creates the PydanticAI Agent that orchestrates the 1440 Support Bot.
     This variant runs directly on a single model (local Qwen or remote OpenAI)
     and performs retrieval + answer inline (no tool calls).
     """
-    settings = get_settings()
-    # Ensure downstream OpenAI provider picks up configured key/base.
-    if settings.openai_api_key:
-        os.environ.setdefault("OPENAI_API_KEY", settings.openai_api_key)
-    if settings.openai_api_base:
-        os.environ.setdefault("OPENAI_BASE_URL", settings.openai_api_base)
+    from pydantic_ai import Agent
+
+    _configure_openai_env()
 
     agent_model = os.getenv("AGENT_MODEL", "gpt-5.2-flagship")
     agent = Agent(
@@ -75,6 +87,7 @@ def build_1440_agent() -> Agent[TechnicalResponse]:
             return TechnicalResponse(
                 answer_markdown=grounded_answer,
                 source_file=retrieval_data["text"]["metadata"].get("file_name"),
+                sources=retrieval_data["text"].get("sources") or [],
                 confidence_score=retrieval_data["text"].get("score", 0.0),
             )
         except Exception as exc:
@@ -84,12 +97,26 @@ def build_1440_agent() -> Agent[TechnicalResponse]:
                 confidence_score=retrieval_data["text"].get("score", 0.0),
             )
 
+    async def _run_query_async(user_query: str) -> TechnicalResponse:
+        # Retrieval + inference are blocking I/O on shared, thread-safe clients,
+        # so concurrent requests simply fan out over the default executor.
+        return await asyncio.to_thread(_run_query, user_query)
+
     agent.run_query = _run_query  # type: ignore[attr-defined]
+    agent.run_query_async = _run_query_async  # type: ignore[attr-defined]
     return agent
 
 
+@lru_cache(maxsize=1)
+def get_1440_agent() -> Agent[TechnicalResponse]:
+    """
+    Process-wide agent instance; built on first use and reused for every query.
+    """
+    return build_1440_agent()
+
+
 if __name__ == "__main__":
-    agent = build_1440_agent()
+    agent = get_1440_agent()
     query = "How do I change the oil filter?"
     result = agent.run_query(query)  # type: ignore[attr-defined]
     print(result)
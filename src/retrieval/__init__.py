@@ -1,4 +1,16 @@
 # Retrieval package
 
-from .multimodal_service import hybrid_search, get_1440_response
+from __future__ import annotations
 
+from typing import Any
+
+__all__ = ["hybrid_search", "get_1440_response"]
+
+
+def __getattr__(name: str) -> Any:
+    # Lazy re-export: `import src.retrieval` must not pull in the service module.
+    if name in __all__:
+        from . import multimodal_service
+
+        return getattr(multimodal_service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
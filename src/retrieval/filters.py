@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+
+def payload_filter(conditions: Optional[Dict[str, Any]] = None, **extra: Any) -> Any:
+    """
+    Build a Qdrant filter from {payload_key: condition}:
+    scalar -> exact match, list/tuple/set -> match any, {"gte": .., "lte": ..} -> range.
+    e.g. payload_filter({"file_name": ["vpn.pdf", "mfa.pdf"]}, doc_type="markdown_step", step={"gte": 2, "lte": 4})
+    Returns None when there is nothing to filter on.
+    """
+    from qdrant_client.http import models
+
+    merged = {**(conditions or {}), **extra}
+    must = []
+    for key, cond in merged.items():
+        if cond is None:
+            continue
+        if isinstance(cond, dict):
+            must.append(models.FieldCondition(key=key, range=models.Range(**cond)))
+        elif isinstance(cond, (list, tuple, set)):
+            must.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(cond))))
+        else:
+            must.append(models.FieldCondition(key=key, match=models.MatchValue(value=cond)))
+    return models.Filter(must=must) if must else None
+
+
+def merge_filters(*filters: Any) -> Any:
+    """AND together several filters (None entries are ignored)."""
+    from qdrant_client.http import models
+
+    must = []
+    for flt in filters:
+        if flt is not None:
+            must.extend(flt.must or [])
+            if flt.should or flt.must_not:
+                must.append(flt)
+    return models.Filter(must=must) if must else None
+
+
+def current_only() -> Any:
+    """
+    Hide points of a version that is still being written (current=False). Points written
+    before versioned replacement have no `current` field and stay visible.
+    """
+    from qdrant_client.http import models
+
+    return models.Filter(must_not=[models.FieldCondition(key="current", match=models.MatchValue(value=False))])
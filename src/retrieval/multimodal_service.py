@@ -2,18 +2,22 @@ from __future__ import annotations
 
 import os
 import re
+import time
 from datetime import datetime
 from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
-from openai import OpenAI
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-
 from src.config.settings import get_settings
 
+# Heavy clients (openai, qdrant_client, llama_index/torch) are imported on first use so
+# that importing the QA path stays cheap; see tests/test_import_time.py.
+if TYPE_CHECKING:  # pragma: no cover
+    from openai import OpenAI
+
+
+PRIMARY_MODEL = "gpt-5.2-2025-12-11"
+
 
 def ts_print(msg: str) -> None:
     print(f"[{datetime.now().isoformat()}] {msg}")
@@ -23,10 +27,16 @@ def ts_print(msg: str) -> None:
 
 
 def get_text_embed():
-    return HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    from src.embedding.backends import get_embed_model
 
+    return get_embed_model()
 
+
+@lru_cache(maxsize=1)
 def _text_client_model():
+    """Shared Qdrant client + query embedder, created once per process."""
+    from qdrant_client import QdrantClient
+
     settings = get_settings()
     client = QdrantClient(
         url=settings.qdrant_url,
@@ -37,23 +47,294 @@ def _text_client_model():
     return client, model
 
 
+@lru_cache(maxsize=1)
+def _document_router():
+    """Card-level router over the shared client (ROUTER_REFRESH_S / ROUTER_REBUILD_S)."""
+    from src.retrieval.router import DocumentRouter
+
+    client, _model = _text_client_model()
+    return DocumentRouter(
+        client,
+        refresh_s=float(os.getenv("ROUTER_REFRESH_S", "30")),
+        rebuild_s=float(os.getenv("ROUTER_REBUILD_S", "900")),
+    )
+
+
+def _route_filter(q_vec: List[float]) -> Any:
+    """
+    Stage one: restrict the chunk search to the ROUTER_TOP_N manuals whose cards best
+    match the query. None (search everything) if routing is off, empty or failing.
+    """
+    from qdrant_client.http import models
+
+    from src.retrieval.router import router_top_n
+
+    top_n = router_top_n()
+    if not top_n:
+        return None
+    try:
+        router = _document_router()
+        doc_ids = router.route(q_vec, top_n)
+    except Exception as exc:
+        ts_print(f"Document routing failed, searching all manuals: {exc}")
+        return None
+    if not doc_ids:
+        return None
+    ts_print(f"Routed to: {', '.join(router.file_names(doc_ids))}")
+    # Cards written before doc ids are keyed by file_name: match those points by name.
+    return models.Filter(
+        should=[
+            models.FieldCondition(key="doc_id", match=models.MatchAny(any=doc_ids)),
+            models.FieldCondition(key="file_name", match=models.MatchAny(any=doc_ids)),
+        ]
+    )
+
+
+@lru_cache(maxsize=1)
+def _openai_client() -> OpenAI:
+    """Shared OpenAI client (connection pool reused across queries and threads)."""
+    from openai import OpenAI
+
+    settings = get_settings()
+    return OpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_api_base or None,
+    )
+
+
 # --- Retrieval Logic ---
 
 
-def hybrid_search(query: str) -> Dict[str, Any]:
-    """Layout-aware text retrieval with small-doc full markdown injection."""
+FULL_DOC_MAX_PAGES = 10  # only manuals this small are injected whole
+IMAGE_TOKENS = 85  # low-detail vision cost per image
+SECTION_RE = re.compile(r"(?m)^(?=#{1,3} )")
+MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\(([^)]+)\)")
+MAX_SECTIONS = 256  # step points fetched per manual when packing sections
+
+
+def estimate_tokens(markdown: str) -> int:
+    """Cheap prompt-size estimate: ~4 chars/token for text plus a flat cost per image."""
+    images = MD_IMAGE_RE.findall(markdown or "")
+    text = MD_IMAGE_RE.sub("", markdown or "")
+    return len(text) // 4 + IMAGE_TOKENS * len(images)
+
+
+def _hit_markdown(payload: Dict[str, Any]) -> str:
+    return (
+        payload.get("llm_markdown")
+        or payload.get("text")
+        or payload.get("page_content")
+        or payload.get("content")
+        or ""
+    )
+
+
+def _dedupe_hits(hits: List[Any], top_k: int, score_gap: float) -> List[Any]:
+    """Best hit per document (doc_id, else file_name), dropping anything more than score_gap below the top score."""
+    best: Dict[str, Any] = {}
+    for hit in hits:
+        payload = hit.payload or {}
+        key = payload.get("doc_id") or payload.get("file_name") or str(hit.id)
+        if key not in best or hit.score > best[key].score:
+            best[key] = hit
+    ranked = sorted(best.values(), key=lambda h: h.score, reverse=True)
+    if not ranked:
+        return []
+    floor = ranked[0].score - score_gap
+    return [h for h in ranked if h.score >= floor][:top_k]
+
+
+def _stored_sections(client: Any, payload: Dict[str, Any], q_vec: List[float]) -> Optional[List[Tuple[str, float]]]:
+    """
+    (section markdown, score) per step of the hit's document in step order, scored by
+    Qdrant against the step vectors stored at ingest. None when the document has no
+    step points (ingested before steps were indexed) or the lookup fails.
+    """
+    from src.retrieval.filters import current_only, merge_filters, payload_filter
+
+    doc = {"doc_id": payload["doc_id"]} if payload.get("doc_id") else {"file_name": payload.get("file_name")}
+    flt = merge_filters(
+        payload_filter(doc, doc_type="markdown_step", doc_version=payload.get("doc_version")), current_only()
+    )
+    try:
+        points = client.query_points(
+            collection_name="manuals_text", query=q_vec, query_filter=flt, limit=MAX_SECTIONS, with_payload=True
+        ).points
+    except Exception as exc:
+        ts_print(f"Step lookup failed for {payload.get('file_name')}: {exc}")
+        return None
+    if not points:
+        return None
+    points = sorted(points, key=lambda p: (p.payload or {}).get("step") or 0)
+    return [(_hit_markdown(p.payload or {}), p.score) for p in points]
+
+
+def _truncate_to_budget(markdown: str, budget: int) -> str:
+    """Leading lines of markdown within budget tokens (a long text line is cut, an image that does not fit dropped)."""
+    kept: List[str] = []
+    used = 0
+    for line in markdown.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            if not MD_IMAGE_RE.search(line) and budget - used > 1:
+                kept.append(line[: (budget - used - 1) * 4])
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).strip()
+
+
+def _select_sections(
+    markdown: str,
+    q_vec: List[float],
+    text_model: Any,
+    budget: int,
+    stored: Optional[List[Tuple[str, float]]] = None,
+) -> str:
+    """
+    Chunk fallback for manuals that do not fit whole: rank step sections by similarity
+    to the query and keep the best ones (in document order) within budget tokens.
+    `stored` are the sections already scored from their indexed vectors (_stored_sections);
+    only documents without step points are split and embedded here. A best section
+    larger than the whole budget is truncated to it.
+    """
+    if stored:
+        sections, scores = [sec for sec, _ in stored], [score for _, score in stored]
+    else:
+        sections = [sec.strip() for sec in SECTION_RE.split(markdown or "") if sec.strip()]
+        if not sections:
+            return ""
+        try:
+            from src.text_indexing.utils import strip_urls_for_embed
+
+            vecs = text_model.get_text_embedding_batch([strip_urls_for_embed(sec) for sec in sections])
+            scores = [sum(a * b for a, b in zip(q_vec, v)) for v in vecs]
+        except Exception:
+            scores = [0.0] * len(sections)
+    chosen: Dict[int, str] = {}
+    used = 0
+    for idx in sorted(range(len(sections)), key=lambda i: scores[i], reverse=True):
+        section = sections[idx]
+        cost = estimate_tokens(section)
+        if used + cost > budget:
+            if chosen:
+                continue
+            section = _truncate_to_budget(section, budget)
+            if not section:
+                break
+            cost = estimate_tokens(section)
+        chosen[idx] = section
+        used += cost
+        if used >= budget:
+            break
+    return "\n\n".join(chosen[i] for i in sorted(chosen))
+
+
+def _pack_documents(
+    hits: List[Any], q_vec: List[float], text_model: Any, token_budget: int, client: Any = None
+) -> List[Dict[str, Any]]:
+    """
+    Inject as many whole small manuals as fit token_budget (best score first); larger
+    manuals, or ones that no longer fit, contribute their most relevant sections
+    (ranked from their stored step vectors when `client` is given).
+    """
+    docs: List[Dict[str, Any]] = []
+    remaining = token_budget
+    for hit in hits:
+        if remaining <= 0:
+            break
+        payload = hit.payload or {}
+        markdown = _hit_markdown(payload)
+        total_pages = payload.get("total_pages") or 0
+        cost = estimate_tokens(markdown)
+        if total_pages and total_pages <= FULL_DOC_MAX_PAGES and cost <= remaining:
+            mode, packed = "full_doc", markdown
+        else:
+            stored = _stored_sections(client, payload, q_vec) if client is not None else None
+            mode, packed = "chunk", _select_sections(markdown, q_vec, text_model, remaining, stored=stored)
+            cost = estimate_tokens(packed)
+        if not packed:
+            continue
+        remaining -= cost
+        sas_urls = payload.get("sas_urls") or []
+        if mode == "chunk":
+            in_packed = set(MD_IMAGE_RE.findall(packed))
+            sas_urls = [u for u in sas_urls if u in in_packed]
+        docs.append(
+            {
+                "file_name": payload.get("file_name"),
+                "markdown": packed,
+                "metadata": payload,
+                "score": hit.score,
+                "mode": mode,
+                "sas_urls": sas_urls,
+                "tokens": cost,
+            }
+        )
+    return docs
+
+
+def _combine_documents(docs: List[Dict[str, Any]]) -> str:
+    if len(docs) == 1:
+        return docs[0]["markdown"]
+    return "\n\n".join(f"## SOURCE: {d['file_name']}\n\n{d['markdown']}" for d in docs)
+
+
+def hybrid_search(
+    query: str,
+    top_k: Optional[int] = None,
+    score_gap: Optional[float] = None,
+    token_budget: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Layout-aware text retrieval across manuals.
+
+    `filters` restricts the search by indexed payload fields (see
+    src.retrieval.filters.payload_filter), e.g. {"file_name": [...]} for one
+    department's manuals or {"doc_id": "..."} for a single document.
+
+    Returns the top_k best manuals (deduplicated by doc_id, within score_gap of the
+    best hit) packed into one context under token_budget: small manuals whole
+    ("full_doc"), the rest as their most relevant step sections ("chunk").
+    `text` carries the combined markdown (with per-manual SOURCE headers when several
+    manuals are used) and the top manual's metadata; `documents` lists each manual.
+    """
+    from qdrant_client.http import models
+
+    from src.retrieval.filters import current_only, merge_filters, payload_filter
+
+    top_k = top_k or int(os.getenv("RETRIEVAL_TOP_K", "3"))
+    score_gap = score_gap if score_gap is not None else float(os.getenv("RETRIEVAL_SCORE_GAP", "0.1"))
+    token_budget = token_budget or int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "12000"))
+
     ts_print("Embedding query for text search")
     try:
         text_client, text_model = _text_client_model()
         q_vec = text_model.get_text_embedding(query)
+        # Whole-document points only; step points are fetched via neighbor_steps.
+        base = merge_filters(payload_filter(filters, doc_type="markdown_bridge"), current_only())
+        route = _route_filter(q_vec)
         res = text_client.http.search_api.search_points(
             collection_name="manuals_text",
             search_request=models.SearchRequest(
                 vector=q_vec,
-                limit=1,
+                filter=merge_filters(base, route),
+                limit=max(top_k * 4, 8),
                 with_payload=True,
             ),
         ).result
+        if route is not None and not res:
+            # Cards can lag behind the text collection; never return less than a plain search.
+            res = text_client.http.search_api.search_points(
+                collection_name="manuals_text",
+                search_request=models.SearchRequest(
+                    vector=q_vec,
+                    filter=base,
+                    limit=max(top_k * 4, 8),
+                    with_payload=True,
+                ),
+            ).result
     except Exception as exc:
         ts_print(f"Qdrant text search failed: {exc}")
         return {
@@ -63,34 +344,66 @@ def hybrid_search(query: str) -> Dict[str, Any]:
             "error": f"Qdrant search failed: {exc}",
         }
 
-    if not res:
+    docs = _pack_documents(_dedupe_hits(res or [], top_k, score_gap), q_vec, text_model, token_budget, text_client)
+    if not docs:
         return {"text": None, "sas_urls": [], "mode": "none"}
 
-    top = res[0]
-    payload = top.payload or {}
-    llm_md = (
-        payload.get("llm_markdown")
-        or payload.get("text")
-        or payload.get("page_content")
-        or payload.get("content")
-        or ""
-    )
+    top = docs[0]
+    sas_urls: List[str] = []
+    for d in docs:
+        sas_urls.extend(u for u in d["sas_urls"] if u not in sas_urls)
     text_hit = {
-        "markdown": llm_md,
-        "metadata": payload,
-        "score": top.score,
+        "markdown": _combine_documents(docs),
+        "metadata": top["metadata"],
+        "score": top["score"],
+        "sources": [d["file_name"] for d in docs],
     }
+    mode = top["mode"] if len(docs) == 1 else "multi_doc"
+    ts_print(
+        "Context: "
+        + ", ".join(f"{d['file_name']} ({d['mode']}, ~{d['tokens']} tok)" for d in docs)
+        + f" of budget {token_budget}"
+    )
+    return {"text": text_hit, "sas_urls": sas_urls, "mode": mode, "documents": docs}
 
-    meta = text_hit["metadata"] or {}
-    total_pages = meta.get("total_pages") or 0
-    sas_urls = meta.get("sas_urls") or []
-    file_name = meta.get("file_name")
-
-    if total_pages and total_pages <= 10 and file_name:
-        ts_print(f"Full-doc injection for {file_name} (<=10 pages)")
-        return {"text": text_hit, "sas_urls": sas_urls, "mode": "full_doc"}
 
-    return {"text": text_hit, "sas_urls": sas_urls, "mode": "chunk"}
+def neighbor_steps(
+    file_name: str,
+    step: int,
+    radius: int = 1,
+    doc_version: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Payloads of steps step-radius..step+radius of one manual (in step order), served
+    from the payload indexes without a vector search. Without doc_version the newest
+    ingested version of each step is returned.
+    """
+    from src.retrieval.filters import current_only, merge_filters, payload_filter
+
+    text_client, _model = _text_client_model()
+    flt = merge_filters(
+        payload_filter(
+            file_name=file_name,
+            doc_type="markdown_step",
+            step={"gte": step - radius, "lte": step + radius},
+            doc_version=doc_version,
+        ),
+        current_only(),
+    )
+    points, _ = text_client.scroll(
+        collection_name="manuals_text",
+        scroll_filter=flt,
+        limit=(2 * radius + 1) * 4,
+        with_payload=True,
+        with_vectors=False,
+    )
+    by_step: Dict[int, Dict[str, Any]] = {}
+    for p in points:
+        payload = p.payload or {}
+        current = by_step.get(payload.get("step"))
+        if current is None or (payload.get("doc_version") or 0) > (current.get("doc_version") or 0):
+            by_step[payload.get("step")] = payload
+    return [by_step[k] for k in sorted(by_step)]
 
 
 # --- OpenAI & Fallback Inference Logic ---
@@ -230,17 +543,12 @@ def _restore_sas_tokens(answer: str, sas_urls: List[str], source_md: str) -> str
     return answer
 
 
-def get_1440_response(user_query: str, retrieved_context: Dict[str, Any]) -> str:
+def _build_context_prefix(retrieved_context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
-    Inference coordinator:
-    1. Primary: OpenAI GPT-4o
-    2. Fallback: Local Qwen-VL via vLLM
+    Static part of the Responses API input: system prompt + retrieved manual context.
+    Kept byte-identical across turns so OpenAI prompt caching can reuse it.
     """
-    settings = get_settings()
-    text_hit = retrieved_context.get("text")
-    if not text_hit:
-        return "No context found for the query."
-
+    text_hit = retrieved_context.get("text") or {}
     sas_urls = retrieved_context.get("sas_urls") or []
     full_md = text_hit.get("markdown") or ""
     interleaved_content = _interleave_markdown_content(full_md, sas_urls=sas_urls, max_images=10, image_detail="low")
@@ -248,65 +556,134 @@ def get_1440_response(user_query: str, retrieved_context: Dict[str, Any]) -> str
     if sas_urls:
         mapping_text = "Reference SAS URLs:\n" + "\n".join(f"- {u}" for u in sas_urls[:10])
         interleaved_content.insert(0, {"type": "text", "text": mapping_text})
+    sources = text_hit.get("sources") or []
+    if len(sources) > 1:
+        attribution = (
+            f"The context below combines {len(sources)} manuals, each introduced by '## SOURCE: <file>'. "
+            "Answer from whichever manuals apply, keep each instruction with images from its own source, "
+            "and end with a 'Sources:' line naming the manuals you used."
+        )
+        interleaved_content.insert(0, {"type": "text", "text": attribution})
+
+    return [
+        {"role": "system", "content": [{"type": "input_text", "text": _get_system_prompt()}]},
+        {"role": "user", "content": _to_response_content(interleaved_content)},
+    ]
 
-    system_prompt = _get_system_prompt()
 
-    # Messages ordered for cache friendliness: system + context (prefix), then dynamic query
-    responses_input = [
-        {"role": "system", "content": [{"type": "input_text", "text": system_prompt}]},
-        {"role": "user", "content": _to_response_content(interleaved_content)},  # cached prefix
-        {"role": "user", "content": [{"type": "input_text", "text": f"Technician Query: {user_query}"}]},  # dynamic
-    ]
+def _query_message(user_query: str) -> Dict[str, Any]:
+    return {"role": "user", "content": [{"type": "input_text", "text": f"Technician Query: {user_query}"}]}
+
+
+def _history_messages(history: Optional[List[Tuple[str, str]]]) -> List[Dict[str, Any]]:
+    messages: List[Dict[str, Any]] = []
+    for question, answer in history or []:
+        messages.append(_query_message(question))
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+def answer_with_context(
+    user_query: str,
+    retrieved_context: Dict[str, Any],
+    prefix: Optional[List[Dict[str, Any]]] = None,
+    history: Optional[List[Tuple[str, str]]] = None,
+    previous_response_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run primary inference and return {"ok", "answer", "response_id", "prefix"}; ok is False
+    when "answer" is an error message rather than a model answer.
+
+    Follow-up turns pass either `previous_response_id` (only the new question is sent;
+    OpenAI keeps the earlier input server-side) or the `prefix` from an earlier turn plus
+    bounded `history`, so the request starts with the same cacheable prefix.
+    """
+    settings = get_settings()
+    text_hit = retrieved_context.get("text")
+    if not text_hit:
+        return {"ok": False, "answer": "No context found for the query.", "response_id": None, "prefix": None}
+
+    sas_urls = retrieved_context.get("sas_urls") or []
+    full_md = text_hit.get("markdown") or ""
+    # Messages ordered for cache friendliness: system + context (prefix), then dynamic turns
+    prefix = prefix or _build_context_prefix(retrieved_context)
+    full_input = [*prefix, *_history_messages(history), _query_message(user_query)]
 
     # Primary: OpenAI GPT-5.2 snapshot (skip if running local-only or missing key)
-    if settings.openai_api_key and (not settings.openai_api_base or "localhost" not in settings.openai_api_base):
-        attempts = 3
-        last_err = None
-        for attempt in range(attempts):
-            try:
-                ts_print(
-                    f"Attempting primary inference with GPT-5.2-2025-12-11 "
-                    f"(base={settings.openai_api_base or 'https://api.openai.com'}), "
-                    f"attempt {attempt + 1}/{attempts}"
-                )
-                client = OpenAI(
-                    api_key=settings.openai_api_key,
-                    base_url=settings.openai_api_base or None,
-                )
+    if not settings.openai_api_key or (settings.openai_api_base and "localhost" in settings.openai_api_base):
+        ts_print("Primary inference skipped (no API key or using localhost base)")
+        return {
+            "ok": False,
+            "answer": "OpenAI not configured: missing API key or using localhost base.",
+            "response_id": None,
+            "prefix": prefix,
+        }
+
+    attempts = 3
+    last_err = None
+    for attempt in range(attempts):
+        try:
+            ts_print(
+                f"Attempting primary inference with {PRIMARY_MODEL} "
+                f"(base={settings.openai_api_base or 'https://api.openai.com'}), "
+                f"attempt {attempt + 1}/{attempts}"
+            )
+            client = _openai_client()
+            response = None
+            if previous_response_id:
+                try:
+                    response = client.responses.create(
+                        model=PRIMARY_MODEL,
+                        previous_response_id=previous_response_id,
+                        input=[_query_message(user_query)],
+                        temperature=0,
+                        timeout=300,
+                    )
+                except Exception as exc:
+                    # Expired/unknown response id: resend the cached prefix instead.
+                    ts_print(f"previous_response_id reuse failed ({exc}); resending context prefix")
+                    previous_response_id = None
+            if response is None:
                 response = client.responses.create(
-                    model="gpt-5.2-2025-12-11",
-                    input=[
-                        {"role": "system", "content": [{"type": "input_text", "text": system_prompt}]},
-                        {"role": "user", "content": _to_response_content(interleaved_content)},
-                        {"role": "user", "content": [{"type": "input_text", "text": f"Technician Query: {user_query}"}]},
-                    ],
+                    model=PRIMARY_MODEL,
+                    input=full_input,
                     temperature=0,
                     timeout=300,
                 )
-                # Log cache usage if available
-                try:
-                    usage = getattr(response, "usage", None)
-                    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) if usage else 0
-                    total = getattr(usage, "total_tokens", 0) if usage else 0
-                    ts_print(f"Usage: {total} tokens total. Cache hit tokens: {cached}.")
-                except Exception:
-                    pass
-
-                answer = response.output_text
-                answer = _restore_sas_tokens(answer, sas_urls, full_md)
-                _write_model_answer(text_hit, answer)
-                ts_print("Primary inference succeeded (OpenAI GPT-5.2-2025-12-11)")
-                return answer
-            except Exception as e:
-                last_err = e
-                ts_print(f"GPT-5.2-2025-12-11 failed on attempt {attempt + 1}/{attempts}: {e}")
-                if attempt < attempts - 1:
-                    time.sleep(3)
-                    continue
-                return f"OpenAI primary error after retries: {last_err}"
-    else:
-        ts_print("Primary inference skipped (no API key or using localhost base)")
-        return "OpenAI not configured: missing API key or using localhost base."
+            # Log cache usage if available
+            try:
+                usage = getattr(response, "usage", None)
+                cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) if usage else 0
+                total = getattr(usage, "total_tokens", 0) if usage else 0
+                ts_print(f"Usage: {total} tokens total. Cache hit tokens: {cached}.")
+            except Exception:
+                pass
+
+            answer = response.output_text
+            answer = _restore_sas_tokens(answer, sas_urls, full_md)
+            _write_model_answer(text_hit, answer)
+            ts_print(f"Primary inference succeeded (OpenAI {PRIMARY_MODEL})")
+            return {"ok": True, "answer": answer, "response_id": getattr(response, "id", None), "prefix": prefix}
+        except Exception as e:
+            last_err = e
+            ts_print(f"{PRIMARY_MODEL} failed on attempt {attempt + 1}/{attempts}: {e}")
+            if attempt < attempts - 1:
+                time.sleep(3)
+    return {
+        "ok": False,
+        "answer": f"OpenAI primary error after retries: {last_err}",
+        "response_id": None,
+        "prefix": prefix,
+    }
+
+
+def get_1440_response(user_query: str, retrieved_context: Dict[str, Any]) -> str:
+    """
+    Inference coordinator:
+    1. Primary: OpenAI GPT-4o
+    2. Fallback: Local Qwen-VL via vLLM
+    """
+    return answer_with_context(user_query, retrieved_context)["answer"]
 
 
 def _write_model_answer(text_hit: Dict[str, Any], answer: str) -> None:
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+CARDS_COLLECTION = os.getenv("QDRANT_COLLECTION_CARDS", "manuals_cards")
+
+
+class DocumentRouter:
+    """
+    In-memory index of document cards (one vector per manual) used to pick the few
+    manuals worth searching before the chunk-level search. Cards are keyed by doc_id
+    (file_name for cards written before doc ids); file_name is only shown.
+
+    The index is synced incrementally: only cards with `updated_at` newer than the last
+    sync are fetched every `refresh_s`; a full rebuild every `rebuild_s` drops cards of
+    deleted manuals.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        collection: str = CARDS_COLLECTION,
+        refresh_s: float = 30.0,
+        rebuild_s: float = 900.0,
+    ) -> None:
+        self.client = client
+        self.collection = collection
+        self.refresh_s = refresh_s
+        self.rebuild_s = rebuild_s
+        self._cards: Dict[str, Tuple[List[float], Dict[str, Any]]] = {}
+        self._synced_at = 0.0  # max card updated_at seen
+        self._last_refresh = 0.0
+        self._last_rebuild = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def refresh(self, force: bool = False) -> None:
+        from qdrant_client.http import models
+
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_refresh < self.refresh_s:
+                return
+            rebuild = force or now - self._last_rebuild >= self.rebuild_s
+            if not self.client.collection_exists(self.collection):
+                self._last_refresh = now
+                return
+            flt = None
+            if not rebuild and self._synced_at:
+                flt = models.Filter(
+                    must=[models.FieldCondition(key="updated_at", range=models.Range(gt=self._synced_at))]
+                )
+            cards: Dict[str, Tuple[List[float], Dict[str, Any]]] = {} if rebuild else dict(self._cards)
+            synced_at = 0.0 if rebuild else self._synced_at
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection,
+                    scroll_filter=flt,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                for p in points:
+                    payload = p.payload or {}
+                    key = payload.get("doc_id") or payload.get("file_name")
+                    if key and p.vector is not None:
+                        cards[key] = (list(p.vector), payload)  # type: ignore[arg-type]
+                        synced_at = max(synced_at, float(payload.get("updated_at") or 0.0))
+                if offset is None:
+                    break
+            self._cards, self._synced_at = cards, synced_at
+            self._last_refresh = now
+            if rebuild:
+                self._last_rebuild = now
+
+    def forget(self, doc_id: str) -> None:
+        with self._lock:
+            self._cards.pop(doc_id, None)
+
+    def route(self, q_vec: List[float], k: int = 5) -> List[str]:
+        """doc_ids of the k manuals whose cards best match the query vector."""
+        self.refresh()
+        scored = [(sum(a * b for a, b in zip(q_vec, vec)), key) for key, (vec, _payload) in self._cards.items()]
+        scored.sort(reverse=True)
+        return [key for _score, key in scored[:k]]
+
+    def file_names(self, doc_ids: List[str]) -> List[str]:
+        """Display names for routed doc_ids."""
+        cards = self._cards
+        return [(cards[d][1].get("file_name") if d in cards else None) or d for d in doc_ids]
+
+
+def router_top_n() -> Optional[int]:
+    """Manuals to route to per query (ROUTER_TOP_N, 0 disables routing)."""
+    n = int(os.getenv("ROUTER_TOP_N", "5"))
+    return n if n > 0 else None
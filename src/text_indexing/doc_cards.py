@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import re
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.retrieval.router import CARDS_COLLECTION
+
+from .step_builder import step_title
+
+CARD_NAMESPACE = uuid.UUID("6f1b8a52-3c0e-4d39-9a57-1440b0c4d5e1")
+MAX_KEYWORDS = 15
+
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9\-]{2,}")
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "your", "you", "are", "will", "can", "not",
+    "into", "then", "when", "click", "select", "step", "page", "have", "has", "was", "all", "any",
+    "each", "use", "using", "these", "those", "there", "their", "them", "also", "may", "must",
+    "should", "which", "what", "how", "once", "under", "over", "below", "above", "out", "via",
+}
+
+
+def build_document_card(
+    file_name: str,
+    ordered_steps: List[Tuple[int, Dict[str, Any]]],
+    doc_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Compact routing summary of one manual, derived from build_steps output:
+    title, step titles and the most frequent content keywords. Keyed by doc_id (the
+    SharePoint item id; file_name when there is none): same-named manuals in different
+    folders keep separate cards.
+    """
+    step_titles: List[str] = []
+    counts: Counter = Counter()
+    for step_no, data in ordered_steps:
+        content = data.get("content") or []
+        step_titles.append(f"Step {step_no}: {step_title(step_no, content)}")
+        for itm in content:
+            if itm.get("type") == "text":
+                counts.update(w.lower() for w in WORD_RE.findall(itm["text"]) if w.lower() not in STOPWORDS)
+
+    first_content = ordered_steps[0][1].get("content") if ordered_steps else []
+    title = step_title(1, first_content or []) if first_content else Path(file_name).stem
+    return {
+        "doc_id": doc_id or file_name,
+        "file_name": file_name,
+        "title": title,
+        "step_titles": step_titles,
+        "keywords": [w for w, _ in counts.most_common(MAX_KEYWORDS)],
+        "step_count": len(ordered_steps),
+    }
+
+
+def card_text(card: Dict[str, Any]) -> str:
+    """Text embedded for routing (title + step titles + keywords)."""
+    return "\n".join(
+        [
+            f"{Path(card['file_name']).stem}: {card.get('title') or ''}",
+            "; ".join(card.get("step_titles") or []),
+            ", ".join(card.get("keywords") or []),
+        ]
+    )
+
+
+def card_point_id(doc_id: str) -> str:
+    """One card per document: re-ingesting replaces it in place."""
+    return str(uuid.uuid5(CARD_NAMESPACE, doc_id))
+
+
+def ensure_cards_collection(client: QdrantClient, dim: int, collection: str = CARDS_COLLECTION) -> None:
+    if not client.collection_exists(collection):
+        client.create_collection(
+            collection_name=collection,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        )
+        client.create_payload_index(
+            collection_name=collection, field_name="updated_at", field_schema=models.PayloadSchemaType.FLOAT
+        )
+
+
+def upsert_card(
+    client: QdrantClient,
+    embed_model,
+    card: Dict[str, Any],
+    collection: str = CARDS_COLLECTION,
+    vec: Optional[List[float]] = None,
+) -> None:
+    vec = vec if vec is not None else embed_model.get_text_embedding(card_text(card))
+    payload = {**card, "updated_at": time.time()}
+    client.upsert(
+        collection_name=collection,
+        points=[
+            models.PointStruct(
+                id=card_point_id(card.get("doc_id") or card["file_name"]),
+                vector=vec,
+                payload=payload,
+            )
+        ],
+    )
@@ -2,23 +2,52 @@ from __future__ import annotations
 
 import io
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from docling.document_converter import DocumentConverter
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
 from docling_core.types.io import DocumentStream
 from docling_core.types.doc import PictureItem, TextItem
 
 from .step_builder import detect_step_number
 
 
-def parse_document(converter: DocumentConverter, pdf_bytes: bytes, file_name: str) -> tuple[Any, List[Dict[str, Any]]]:
-    """Run docling conversion and return (doc, collected_items)."""
-    ds = DocumentStream(name=file_name, stream=io.BytesIO(pdf_bytes))
-    conv_res = converter.convert(ds)
+def pipeline_options() -> PdfPipelineOptions:
+    """PDF pipeline options for step manuals (picture crops at 2x); also keys the parse cache."""
+    options = PdfPipelineOptions()
+    options.generate_picture_images = True  # extract UI crops
+    options.images_scale = 2.0  # high quality crops
+    return options
+
+
+def build_converter() -> DocumentConverter:
+    """Docling converter configured for step manuals."""
+    return DocumentConverter(format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options())})
+
+
+def parse_document(
+    converter: DocumentConverter,
+    pdf: Union[bytes, str, Path],
+    file_name: str,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> tuple[Any, List[Dict[str, Any]]]:
+    """
+    Run docling conversion and return (doc, collected_items).
+    Pass a path (Path or str, e.g. a streamed download) so docling reads pages from disk instead of
+    holding another in-memory copy of the PDF. page_range (1-based, inclusive) limits the
+    conversion to those pages; page numbers stay those of the whole PDF.
+    """
+    source = Path(pdf) if isinstance(pdf, (str, Path)) else DocumentStream(name=file_name, stream=io.BytesIO(pdf))
+    conv_res = converter.convert(source, page_range=page_range) if page_range else converter.convert(source)
     doc = conv_res.document
     if not doc:
         raise RuntimeError("Docling conversion returned no document")
+    return doc, collect_items(doc)
+
 
+def collect_items(doc: Any) -> List[Dict[str, Any]]:
+    """Docling document -> ordered text/image items (the `collected` shape used downstream)."""
     collected: List[Dict[str, Any]] = []
     for idx, (element, _level) in enumerate(doc.iterate_items()):
         if isinstance(element, TextItem):
@@ -38,5 +67,5 @@ def parse_document(converter: DocumentConverter, pdf_bytes: bytes, file_name: st
             except Exception:
                 page_no = 0
             collected.append({"idx": idx, "type": "image", "image": img, "page": page_no, "step": None})
-    return doc, collected
+    return collected
 
@@ -0,0 +1,230 @@
+"""
+Born-digital fast path: pages with a clean text layer (Word/PowerPoint exports) are
+read directly with pypdfium2 (text lines + embedded pictures) instead of running the
+docling layout models. Scanned or complex pages still go to docling, and both kinds of
+page are merged back in page order in the usual `collected` item shape.
+
+Off by default (FAST_PATH=1 to enable): unlike docling it does not drop page headers and
+footers, order multi-column text, crop vector-drawn figures or structure tables, so it
+suits simple single-column exports.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from .step_builder import detect_step_number
+
+IMAGES_SCALE = 2.0  # same crop resolution as the docling pipeline
+IMAGE_OBJ, PATH_OBJ = 3, 2  # FPDF_PAGEOBJ_* types
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def fast_path_enabled() -> bool:
+    return os.getenv("FAST_PATH", "0").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _thresholds() -> Dict[str, float]:
+    return {
+        "min_chars": int(os.getenv("FAST_PATH_MIN_CHARS", "40")),
+        "max_bad_ratio": 0.05,  # replacement/control characters: broken font encodings
+        "max_image_cover": float(os.getenv("FAST_PATH_MAX_IMAGE_COVER", "0.6")),  # scan under an OCR layer
+        "max_paths": int(os.getenv("FAST_PATH_MAX_PATHS", "400")),  # vector diagrams / ruled tables
+        "merge_gap": int(os.getenv("FAST_PATH_MERGE_GAP", "2")),  # text pages absorbed between docling pages
+    }
+
+
+def _open(pdf: Union[bytes, Path]) -> Any:
+    import pypdfium2 as pdfium
+
+    return pdfium.PdfDocument(str(pdf) if isinstance(pdf, Path) else pdf)
+
+
+def classify_page(page: Any, limits: Dict[str, float]) -> Dict[str, Any]:
+    """Pre-flight for one page: {"digital": bool, "reason", "chars", "image_cover", "paths"}."""
+    width, height = page.get_size()
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+    chars = len(text.strip())
+    bad = sum(1 for ch in text if ch == "\ufffd" or (ord(ch) < 32 and ch not in "\r\n\t"))
+    image_cover, paths = 0.0, 0
+    for obj in page.get_objects():
+        if obj.type == PATH_OBJ:
+            paths += 1
+        elif obj.type == IMAGE_OBJ:
+            left, bottom, right, top = obj.get_bounds()
+            image_cover = max(image_cover, (right - left) * (top - bottom) / max(width * height, 1.0))
+
+    if chars < limits["min_chars"]:
+        reason = "no text layer"
+    elif bad / max(len(text), 1) > limits["max_bad_ratio"]:
+        reason = "garbled text layer"
+    elif image_cover > limits["max_image_cover"]:
+        reason = "scanned page"
+    elif paths > limits["max_paths"]:
+        reason = "complex vector layout"
+    else:
+        reason = ""
+    return {
+        "digital": not reason,
+        "reason": reason or "text layer",
+        "chars": chars,
+        "image_cover": round(image_cover, 3),
+        "paths": paths,
+    }
+
+
+def _text_lines(page: Any) -> List[Tuple[float, float, float, str]]:
+    """(top, bottom, left, text) per visual line; pdfium rects are runs, joined left to right."""
+    textpage = page.get_textpage()
+    try:
+        runs = []
+        for i in range(textpage.count_rects()):
+            left, bottom, right, top = textpage.get_rect(i)
+            text = textpage.get_text_bounded(left, bottom, right, top).strip()
+            if text:
+                runs.append((top, bottom, left, text))
+    finally:
+        textpage.close()
+    lines: List[List[Any]] = []
+    for top, bottom, left, text in sorted(runs, key=lambda r: (-r[0], r[2])):
+        if lines and abs(lines[-1][0] - top) < 0.5 * (top - bottom):
+            lines[-1][3].append((left, text))
+        else:
+            lines.append([top, bottom, left, [(left, text)]])
+    return [(t, b, lft, " ".join(x for _, x in sorted(parts))) for t, b, lft, parts in lines]
+
+
+def _paragraphs(lines: List[Tuple[float, float, float, str]]) -> List[Tuple[float, str]]:
+    """Group lines into blocks on vertical gaps; a step heading line is always its own block."""
+    blocks: List[Tuple[float, List[str]]] = []
+    prev_bottom, prev_height, prev_step = None, 0.0, False
+    for top, bottom, _left, text in lines:
+        is_step = detect_step_number(text) is not None
+        gap = (prev_bottom - top) if prev_bottom is not None else None
+        if not blocks or is_step or prev_step or gap is None or gap > 0.8 * max(prev_height, top - bottom):
+            blocks.append((top, [text]))
+        else:
+            blocks[-1][1].append(text)
+        prev_bottom, prev_height, prev_step = bottom, top - bottom, is_step
+    return [(top, "\n".join(texts)) for top, texts in blocks]
+
+
+def extract_page(page: Any, page_no: int, min_image_pt: float = 24.0) -> List[Dict[str, Any]]:
+    """Text blocks and picture crops of one born-digital page, top to bottom."""
+    width, height = page.get_size()
+    elements: List[Tuple[float, float, Dict[str, Any]]] = []
+    for top, text in _paragraphs(_text_lines(page)):
+        elements.append((top, 0.0, {"type": "text", "text": text, "step": detect_step_number(text)}))
+
+    boxes = []
+    for obj in page.get_objects():
+        if obj.type == IMAGE_OBJ:
+            left, bottom, right, top = obj.get_bounds()
+            if right - left >= min_image_pt and top - bottom >= min_image_pt:
+                boxes.append((max(left, 0), max(bottom, 0), min(right, width), min(top, height)))
+    if boxes:
+        rendered = page.render(scale=IMAGES_SCALE).to_pil()
+        for left, bottom, right, top in boxes:
+            crop = rendered.crop(
+                tuple(int(round(v * IMAGES_SCALE)) for v in (left, height - top, right, height - bottom))
+            )
+            elements.append((top, left, {"type": "image", "image": crop, "page": page_no, "step": None}))
+
+    elements.sort(key=lambda e: (-e[0], e[1]))
+    return [item for _, _, item in elements]
+
+
+def _routes(flags: List[bool], merge_gap: int) -> List[bool]:
+    """
+    Per-page route (True = fast path). Runs of at most merge_gap text pages between two
+    docling pages go to docling too, so docling gets a few long page ranges instead of
+    one call (and its per-call setup) for every scanned page.
+    """
+    routes = list(flags)
+    for digital, first, last in _runs(flags):
+        if digital and first > 1 and last < len(flags) and last - first + 1 <= merge_gap:
+            routes[first - 1 : last] = [False] * (last - first + 1)
+    return routes
+
+
+def _runs(flags: List[bool]) -> List[Tuple[bool, int, int]]:
+    """Consecutive pages with the same route: (digital, first, last), 1-based inclusive."""
+    runs: List[Tuple[bool, int, int]] = []
+    for page_no, digital in enumerate(flags, start=1):
+        if runs and runs[-1][0] == digital:
+            runs[-1] = (digital, runs[-1][1], page_no)
+        else:
+            runs.append((digital, page_no, page_no))
+    return runs
+
+
+def parse_hybrid(
+    pdf: Union[bytes, Path],
+    file_name: str,
+    convert_pages: Callable[[int, int], List[Dict[str, Any]]],
+) -> Tuple[int, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    (total_pages, collected, report). Born-digital pages are extracted here; every run of
+    other pages (short text runs between them included, see _routes) goes to
+    convert_pages(first, last), docling with a page range. The report has per-page
+    routes and the time spent per page on each path.
+    """
+    from .parallel_ingest import merge_ranges
+
+    limits = _thresholds()
+    start = time.perf_counter()
+    doc = _open(pdf)
+    try:
+        pages = [classify_page(doc[i], limits) for i in range(len(doc))]
+        routes = _routes([p["digital"] for p in pages], int(limits["merge_gap"]))
+        classify_s = time.perf_counter() - start
+
+        parts: List[List[Dict[str, Any]]] = []
+        timing = {"fast": 0.0, "docling": 0.0}
+        for digital, first, last in _runs(routes):
+            t0 = time.perf_counter()
+            if digital:
+                for page_no in range(first, last + 1):
+                    items = extract_page(doc[page_no - 1], page_no)
+                    parts.append([dict(itm, idx=i) for i, itm in enumerate(items)])
+                timing["fast"] += time.perf_counter() - t0
+            else:
+                parts.append(convert_pages(first, last))
+                timing["docling"] += time.perf_counter() - t0
+    finally:
+        doc.close()
+
+    fast_pages = sum(routes)
+    report = {
+        "pages": [
+            dict(p, page=i, route="fast" if fast else "docling")
+            for i, (p, fast) in enumerate(zip(pages, routes), start=1)
+        ],
+        "docling_calls": sum(not digital for digital, _, _ in _runs(routes)),
+        "fast_pages": fast_pages,
+        "docling_pages": len(pages) - fast_pages,
+        "classify_s": classify_s,
+        "fast_s": timing["fast"],
+        "docling_s": timing["docling"],
+    }
+    ts_print(
+        f"{file_name}: {fast_pages}/{len(pages)} page(s) on the text-layer fast path "
+        f"({_per_page(timing['fast'], fast_pages)}), {len(pages) - fast_pages} via docling "
+        f"({_per_page(timing['docling'], len(pages) - fast_pages)}), pre-flight {classify_s * 1000:.0f}ms"
+    )
+    return len(pages), merge_ranges(parts), report
+
+
+def _per_page(seconds: float, pages: int) -> str:
+    return f"{seconds / pages * 1000:.0f}ms/page" if pages else "-"
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import io
+import os
+from dataclasses import dataclass
+from typing import Any
+
+FORMATS = {
+    # name: (PIL format, extension, content type)
+    "png": ("PNG", "png", "image/png"),
+    "webp-lossless": ("WEBP", "webp", "image/webp"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+
+@dataclass(frozen=True)
+class FigureCodec:
+    """
+    How figure crops are encoded, once, for both blob upload and local export.
+    png / webp-lossless keep every pixel; webp / jpeg are bounded by `quality`.
+    """
+
+    fmt: str = "png"
+    quality: int = 85
+
+    def __post_init__(self) -> None:
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unsupported figure format {self.fmt!r}; expected one of {', '.join(FORMATS)}")
+
+    @property
+    def ext(self) -> str:
+        return FORMATS[self.fmt][1]
+
+    @property
+    def content_type(self) -> str:
+        return FORMATS[self.fmt][2]
+
+    def encode(self, img: Any) -> bytes:
+        buf = io.BytesIO()
+        pil_format = FORMATS[self.fmt][0]
+        if self.fmt == "png":
+            img.save(buf, format=pil_format)
+        elif self.fmt == "webp-lossless":
+            img.save(buf, format=pil_format, lossless=True, quality=self.quality, method=4)
+        elif self.fmt == "webp":
+            img.save(buf, format=pil_format, quality=self.quality, method=4)
+        else:
+            if img.mode not in ("RGB", "L"):
+                img = _flatten(img)
+            img.save(buf, format=pil_format, quality=self.quality, optimize=True)
+        return buf.getvalue()
+
+
+def _flatten(img: Any) -> Any:
+    """JPEG has no alpha: composite transparent crops onto white."""
+    from PIL import Image
+
+    rgba = img.convert("RGBA")
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def get_figure_codec() -> FigureCodec:
+    """Deployment default from FIGURE_FORMAT (png|webp-lossless|webp|jpeg) and FIGURE_QUALITY."""
+    return FigureCodec(
+        fmt=os.getenv("FIGURE_FORMAT", "png").strip().lower(),
+        quality=int(os.getenv("FIGURE_QUALITY", "85")),
+    )
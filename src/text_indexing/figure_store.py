@@ -0,0 +1,288 @@
+"""
+Content-addressed figure storage shared across manuals.
+
+Figures are stored once under `figures/<first 2 hex>/<sha256 of pixels>.<ext>`; a
+figure that is pixel-identical to one already stored reuses that blob. Matching visually
+identical figures by difference hash (re-scaled logos, repeated headers and screenshots)
+is opt-in (FIGURE_DEDUP_DISTANCE > 0). A local SQLite cache remembers what exists so
+re-ingest does not even ask Blob storage. Changing FIGURE_FORMAT only affects new
+figures: already stored pixels keep their blob.
+
+Shared blobs are not deleted with a manual; collect_garbage() (qdrant_cleanup
+--gc-figures) removes the ones no indexed manual references any more, and bumps a
+marker blob. Every FigureStore re-reads the marker at most every FIGURE_GC_CHECK_S
+seconds while it stores figures (long-running workers included) and drops its existence
+cache when it moved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import profiling
+from .figure_codec import FigureCodec, get_figure_codec
+from .storage import IMAGE_CACHE_CONTROL, AzureBlobStorage, upload_workers
+
+DHASH_SIZE = 16  # 256-bit difference hash
+DHASH_BITS = DHASH_SIZE * DHASH_SIZE
+GC_MARKER = "gc-epoch"  # blob under the prefix rewritten by every collect_garbage()
+
+
+def pixel_hash(img: Any) -> str:
+    """Exact content hash over mode, size and raw pixels (independent of PNG encoder settings)."""
+    h = hashlib.sha256(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def dhash(img: Any, size: int = DHASH_SIZE) -> int:
+    """Difference hash: sign of horizontal gradients on a size x size greyscale thumbnail."""
+    from PIL import Image
+
+    small = img.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    px = small.tobytes()
+    bits = 0
+    for row in range(size):
+        base = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits
+
+
+def mean_rgb(img: Any) -> Tuple[int, int, int]:
+    """Average colour; dHash ignores colour, so flat crops of different colours need this."""
+    return tuple(img.convert("RGB").resize((1, 1)).getpixel((0, 0)))  # type: ignore[return-value]
+
+
+def _bands(bits: int, count: int) -> List[Tuple[int, int]]:
+    """
+    Split a dHash into `count` bands: two hashes within count - 1 bits of each other share
+    at least one band exactly (pigeonhole), so candidates come from a dict lookup per band.
+    """
+    width = -(-DHASH_BITS // count)
+    return [(i, (bits >> (i * width)) & ((1 << width) - 1)) for i in range(count)]
+
+
+class FigureStore:
+    """
+    store(img) -> {"blob_name", "sas_url", "content_hash", "deduped"}.
+    max_distance is the dHash Hamming distance (of 256 bits) treated as the same image;
+    0 (the default) keeps to exact pixel matches. Aspect ratios must also agree within 2%
+    and mean colours within 8 levels per channel.
+    """
+
+    def __init__(
+        self,
+        storage: AzureBlobStorage,
+        cache_path: Optional[Path] = None,
+        max_distance: Optional[int] = None,
+        prefix: str = "figures",
+        codec: Optional[FigureCodec] = None,
+    ) -> None:
+        self.storage = storage
+        self.prefix = prefix
+        self.codec = codec or get_figure_codec()
+        self.max_distance = (
+            max_distance if max_distance is not None else int(os.getenv("FIGURE_DEDUP_DISTANCE", "0"))
+        )
+        path = Path(cache_path or os.getenv("FIGURE_CACHE_PATH", ".cache/figures.sqlite"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS figures ("
+            " container TEXT, sha256 TEXT, dhash TEXT, mean_rgb TEXT, width INTEGER, height INTEGER, blob_name TEXT,"
+            " PRIMARY KEY (container, sha256))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (container TEXT, key TEXT, value TEXT, PRIMARY KEY (container, key))"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        # In-memory perceptual index, bucketed by dHash band: (band no, band bits) -> entries
+        # of (dhash, aspect, mean colour, sha256) for this container.
+        self._bands: Dict[Tuple[int, int], List[Tuple[int, float, Tuple[int, ...], str]]] = {}
+        self.gc_check_s = float(os.getenv("FIGURE_GC_CHECK_S", "60"))
+        self._gc_checked = time.monotonic()
+        self._check_gc_epoch()
+        if self.max_distance > 0:
+            for sha, d, mean, w, h in self._db.execute(
+                "SELECT sha256, dhash, mean_rgb, width, height FROM figures WHERE container = ? AND dhash != ''",
+                (storage.container,),
+            ):
+                self._index(int(d, 16), w / max(h, 1), tuple(int(c) for c in mean.split(",")), sha)
+        self._pending: Dict[str, threading.Event] = {}  # sha256 -> upload in progress
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-check the GC marker (at most every gc_check_s seconds); True if the cache was dropped."""
+        now = time.monotonic()
+        if not force and now - self._gc_checked < self.gc_check_s:
+            return False
+        self._gc_checked = now
+        with self._lock:
+            return self._check_gc_epoch()
+
+    def _check_gc_epoch(self, clear: bool = True) -> bool:
+        """Drop the existence cache if collect_garbage() ran (on any host) since it was filled."""
+        try:
+            stamp = self.storage.last_modified(f"{self.prefix}/{GC_MARKER}")
+        except Exception:
+            return False
+        epoch = stamp.isoformat() if stamp else ""
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE container = ? AND key = 'gc_epoch'", (self.storage.container,)
+        ).fetchone()
+        if (row[0] if row else "") != epoch:
+            if clear:
+                self._db.execute("DELETE FROM figures WHERE container = ?", (self.storage.container,))
+                self._bands.clear()
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, 'gc_epoch', ?)", (self.storage.container, epoch)
+            )
+            self._db.commit()
+            return clear
+        return False
+
+    def _index(self, bits: int, aspect: float, mean: Tuple[int, ...], sha: str) -> None:
+        for band in _bands(bits, self.max_distance + 1):
+            self._bands.setdefault(band, []).append((bits, aspect, mean, sha))
+
+    def blob_name(self, sha: str) -> str:
+        return f"{self.prefix}/{sha[:2]}/{sha}.{self.codec.ext}"
+
+    def _lookup(self, sha: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT blob_name FROM figures WHERE container = ? AND sha256 = ?", (self.storage.container, sha)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _similar(self, bits: int, aspect: float, mean: Tuple[int, ...]) -> Optional[str]:
+        if self.max_distance <= 0:
+            return None
+        candidates = (entry for band in _bands(bits, self.max_distance + 1) for entry in self._bands.get(band, ()))
+        for other_bits, other_aspect, other_mean, sha in candidates:
+            if abs(aspect - other_aspect) > 0.02 * other_aspect:
+                continue
+            if max(abs(a - b) for a, b in zip(mean, other_mean)) > 8:
+                continue
+            if (bits ^ other_bits).bit_count() <= self.max_distance:
+                return sha
+        return None
+
+    def _remember(
+        self, sha: str, bits: Optional[int], mean: Tuple[int, ...], size: Tuple[int, int], blob_name: str
+    ) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.storage.container,
+                sha,
+                format(bits, "x") if bits is not None else "",
+                ",".join(str(c) for c in mean),
+                size[0],
+                size[1],
+                blob_name,
+            ),
+        )
+        self._db.commit()
+        if bits is not None:
+            self._index(bits, size[0] / max(size[1], 1), tuple(mean), sha)
+
+    def store(self, img: Any, encode: Optional[Callable[[], bytes]] = None) -> Dict[str, Any]:
+        """
+        Store one figure (or reuse an identical one). `encode` produces the upload bytes
+        (defaults to self.codec) and is only called when the figure is actually uploaded.
+        """
+        self.refresh()
+        sha = pixel_hash(img)
+        perceptual = self.max_distance > 0
+        bits = dhash(img) if perceptual else None
+        aspect = img.size[0] / max(img.size[1], 1)
+        mean = mean_rgb(img) if perceptual else ()
+        while True:
+            with self._lock:
+                blob_name = self._lookup(sha)
+                if blob_name is None and bits is not None:
+                    similar = self._similar(bits, aspect, mean)
+                    blob_name = self._lookup(similar) if similar else None
+                if blob_name is not None:
+                    return self._result(blob_name, sha, deduped=True)
+                waiter = self._pending.get(sha)
+                if waiter is None:
+                    self._pending[sha] = threading.Event()
+                    break
+            waiter.wait()  # same figure being uploaded by another thread; then re-check
+
+        try:
+            name = self.blob_name(sha)
+            deduped = self.storage.exists(name)  # uploaded by another host/cache
+            if not deduped:
+                self.storage.upload_and_get_sas(
+                    encode() if encode is not None else self.codec.encode(img),
+                    name,
+                    content_type=self.codec.content_type,
+                    cache_control=IMAGE_CACHE_CONTROL,  # content-addressed: the bytes never change
+                )
+            with self._lock:
+                self._remember(sha, bits, mean, img.size, name)
+            return self._result(name, sha, deduped=deduped)
+        finally:
+            with self._lock:
+                self._pending.pop(sha).set()
+
+    def _result(self, blob_name: str, sha: str, deduped: bool) -> Dict[str, Any]:
+        return {
+            "blob_name": blob_name,
+            "sas_url": self.storage.sas_url(blob_name),
+            "content_hash": sha,
+            "deduped": deduped,
+        }
+
+    def collect_garbage(self, referenced: Iterable[str], min_age_s: float = 86400.0) -> List[str]:
+        """
+        Delete shared figure blobs that no indexed manual references, leaving blobs younger
+        than min_age_s (figures of an ingest still in flight). Run while no ingest is
+        writing; the marker blob it rewrites makes every FigureStore drop its existence
+        cache on its next refresh(). Returns the deleted blob names.
+        """
+        keep: Set[str] = set(referenced)
+        marker = f"{self.prefix}/{GC_MARKER}"
+        cutoff = time.time() - min_age_s
+        orphans = [
+            name
+            for name, modified in self.storage.list_blobs(f"{self.prefix}/")
+            if name != marker and name not in keep and modified.timestamp() < cutoff
+        ]
+        self.storage.delete_blobs(orphans)
+        gone = {Path(name).stem for name in orphans}
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM figures WHERE container = ? AND blob_name = ?",
+                [(self.storage.container, name) for name in orphans],
+            )
+            self._db.commit()
+            for band, entries in self._bands.items():
+                self._bands[band] = [e for e in entries if e[3] not in gone]
+        self.storage.upload_and_get_sas(str(time.time()).encode(), marker, content_type="text/plain")
+        with self._lock:
+            self._check_gc_epoch(clear=False)  # this cache is already pruned
+        return orphans
+
+    def store_many(
+        self,
+        images: List[Any],
+        encoders: Optional[List[Callable[[], bytes]]] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """store() on a bounded thread pool; results in input order."""
+        if not images:
+            return []
+        workers = min(max_workers or upload_workers(), len(images))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(profiling.bind(self.store), images, encoders or [None] * len(images)))
@@ -0,0 +1,383 @@
+"""
+Long-running ingest worker: keeps the docling converter and embedding model warm and
+consumes jobs from the durable queue (src.text_indexing.job_queue). Every stage
+(download, parse, render/upload, embed, upsert) is checkpointed to disk, so a worker
+restarted after a crash resumes each document after its last completed stage.
+Jobs go through the ingest manifest like sync_folder does: a file whose content hash is
+unchanged is skipped, and the previous version's points/blobs are removed after upsert.
+
+Usage:
+  python -m src.text_indexing.ingest_worker enqueue "Shared Documents" [--recursive]
+  python -m src.text_indexing.ingest_worker run [--status-port 8770]
+  python -m src.text_indexing.ingest_worker status
+
+Endpoints (run --status-port):
+  GET /health -> {"ok": true}
+  GET /status -> JobQueue.stats() plus the worker's uptime and processed count
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+from .incremental import IngestManifest, content_hash
+from .job_queue import STAGES, JobQueue, lease_seconds
+
+# Checkpoint files the stages after a completed stage read.
+STAGE_OUTPUTS = {
+    "download": ("source.pdf",),
+    "parse": ("source.pdf", "parsed.pkl"),
+    "render": ("source.pdf", "rendered.json"),
+    "embed": ("source.pdf", "rendered.json", "vectors.json"),
+}
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def checkpoint_root() -> Path:
+    return Path(os.getenv("INGEST_CHECKPOINT_DIR", ".cache/ingest_jobs"))
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Temp file + rename: a checkpoint is either complete or absent."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _resume_stage(job_dir: Path, stage: Optional[str]) -> Optional[str]:
+    """
+    Latest completed stage at or before `stage` whose checkpoint files are all on disk.
+    A finished upsert (crash before the job was marked done) is redone: it is idempotent
+    and its result is what the manifest records.
+    """
+    if stage == "upsert":
+        stage = "embed"
+    while stage and not all((job_dir / name).exists() for name in STAGE_OUTPUTS[stage]):
+        index = STAGES.index(stage)
+        stage = STAGES[index - 1] if index else None
+    return stage
+
+
+class LeaseLost(RuntimeError):
+    """Another worker reclaimed the job: stop without completing or failing it."""
+
+
+class IngestWorker:
+    """
+    Runs queued jobs through the ingestor's stages (parse_pdf, render_parsed,
+    embed_rendered, upsert_rendered). Stage outputs live in <checkpoint_dir>/<job id>/:
+    source.pdf, parsed.pkl, rendered.json, vectors.json; they are removed once the job
+    is done or has finally failed. The manifest is re-read for every job, so workers
+    sharing a manifest file do not overwrite each other's entries.
+    """
+
+    def __init__(
+        self,
+        ingestor: Any,
+        download_fn: Callable[[str], Union[bytes, Path]],
+        queue: Optional[JobQueue] = None,
+        checkpoint_dir: Optional[Path] = None,
+        manifest_path: Optional[Path] = None,
+    ) -> None:
+        self.ingestor = ingestor
+        self.download_fn = download_fn
+        self.queue = queue or JobQueue()
+        self.checkpoint_dir = Path(checkpoint_dir or checkpoint_root())
+        self.manifest_path = manifest_path
+        self.started_at = time.time()
+        self.processed = 0
+        self.stopping = threading.Event()
+
+    def process(self, job: Dict[str, Any], lease_lost: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Run the stages after job["stage"]; returns the upsert result ({"skipped": True} if unchanged).
+        Raises LeaseLost before the next stage (or the manifest update) once lease_lost is set
+        or a checkpoint finds the job reclaimed: the new owner redoes the work.
+        """
+        job_id, file_name = job["id"], job["file_name"]
+
+        def check_lease() -> None:
+            if lease_lost is not None and lease_lost.is_set():
+                raise LeaseLost(f"Job {job_id} ({file_name}): lease lost to another worker")
+
+        job_dir = self.checkpoint_dir / str(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        source, parsed = job_dir / "source.pdf", job_dir / "parsed.pkl"
+        rendered_path, vectors_path = job_dir / "rendered.json", job_dir / "vectors.json"
+        stage = _resume_stage(job_dir, job.get("stage"))
+        if stage != job.get("stage"):
+            ts_print(f"Job {job_id} ({file_name}): no usable checkpoint after {job['stage']}")
+            self.queue.checkpoint(job_id, stage)
+        remaining = STAGES[STAGES.index(stage) + 1 :] if stage else STAGES
+        if stage:
+            ts_print(f"Job {job_id} ({file_name}): resuming after {stage}")
+        manifest = IngestManifest(self.manifest_path)
+        entry = manifest.get(job["file_id"])
+
+        result: Dict[str, Any] = {}
+        for stage in remaining:
+            check_lease()
+            start = time.perf_counter()
+            if stage == "download":
+                pdf = self.download_fn(job["file_id"])
+                if isinstance(pdf, Path):
+                    shutil.move(str(pdf), source)
+                else:
+                    _write_atomic(source, pdf)
+            elif stage == "parse":
+                if entry and entry.get("content_hash") == content_hash(source) and entry.get("file_name") == file_name:
+                    ts_print(f"Job {job_id} ({file_name}): content unchanged, skipping")
+                    return {"skipped": True, "doc_version": entry.get("doc_version")}
+                total_pages, collected = self.ingestor.parse_pdf(source, file_name)
+                _write_atomic(parsed, pickle.dumps({"total_pages": total_pages, "collected": collected}))
+            elif stage == "render":
+                data = pickle.loads(parsed.read_bytes())
+                rendered = self.ingestor.render_parsed(
+                    data["collected"],
+                    file_name,
+                    data["total_pages"],
+                    doc_id=job["file_id"],
+                    doc_version=job.get("doc_version"),
+                )
+                _write_atomic(rendered_path, json.dumps(rendered).encode("utf-8"))
+            elif stage == "embed":
+                vectors = self.ingestor.embed_rendered(json.loads(rendered_path.read_text(encoding="utf-8")))
+                _write_atomic(vectors_path, json.dumps(vectors).encode("utf-8"))
+            else:
+                result = self.ingestor.upsert_rendered(
+                    json.loads(rendered_path.read_text(encoding="utf-8")),
+                    json.loads(vectors_path.read_text(encoding="utf-8")),
+                )
+            if not self.queue.checkpoint(job_id, stage, time.perf_counter() - start) and lease_lost is not None:
+                lease_lost.set()
+
+        check_lease()
+        if entry:
+            new_points, new_blobs = set(result.get("point_ids") or []), set(result.get("blob_names") or [])
+            self.ingestor.delete_document(
+                entry.get("file_name") or file_name,
+                point_ids=[p for p in entry.get("point_ids") or [] if p not in new_points],
+                blob_names=[b for b in entry.get("blob_names") or [] if b not in new_blobs],
+                drop_card=False,  # the card is keyed by doc_id and was just replaced in place
+                doc_id=job["file_id"],
+            )
+        manifest = IngestManifest(self.manifest_path)  # re-read: other workers may have saved meanwhile
+        manifest.record(
+            job["file_id"],
+            file_name=file_name,
+            folder=job.get("folder") or "",
+            content_hash=content_hash(source),
+            doc_version=result.get("doc_version"),
+            point_ids=result.get("point_ids") or [],
+            blob_names=result.get("blob_names") or [],
+        )
+        manifest.save()
+        return result
+
+    @contextmanager
+    def _leased(self, job_id: int) -> Iterator[threading.Event]:
+        """
+        Heartbeat the job's lease from a background thread while it is processed. Yields an
+        event set once a heartbeat fails; process() checks it between stages.
+        """
+        done, lost = threading.Event(), threading.Event()
+
+        def beat() -> None:
+            while not done.wait(lease_seconds() / 3):
+                try:
+                    alive = self.queue.heartbeat(job_id)
+                except Exception as exc:  # the lease runs out unless a later beat gets through
+                    ts_print(f"Job {job_id}: heartbeat failed: {exc}")
+                    continue
+                if not alive:
+                    ts_print(f"Job {job_id}: lease lost to another worker")
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            done.set()
+            thread.join()
+
+    def run_once(self) -> bool:
+        """Claim and process one job; False when the queue is empty."""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        start = time.perf_counter()
+        try:
+            with self._leased(job["id"]) as lease_lost:
+                result = self.process(job, lease_lost)
+        except LeaseLost as exc:
+            ts_print(f"{exc}: abandoned, its new owner finishes it")
+            return True
+        except Exception as exc:
+            status = self.queue.fail(job["id"], str(exc))
+            ts_print(f"Job {job['id']} ({job['file_name']}) failed: {exc} -> {status}")
+            if status == "failed":
+                shutil.rmtree(self.checkpoint_dir / str(job["id"]), ignore_errors=True)
+            return True
+        self.queue.complete(job["id"], result)
+        shutil.rmtree(self.checkpoint_dir / str(job["id"]), ignore_errors=True)
+        self.processed += 1
+        timings = self.queue.get(job["id"])["timings"]  # type: ignore[index]
+        ts_print(
+            f"Job {job['id']} ({job['file_name']}) done in {time.perf_counter() - start:.1f}s ("
+            + ", ".join(f"{stage} {timings[stage]:.1f}s" for stage in STAGES if stage in timings)
+            + ")"
+        )
+        return True
+
+    def recover(self) -> int:
+        """Reclaim jobs whose worker stopped heartbeating; drops the checkpoints of those now failed."""
+        reclaimed = self.queue.recover()
+        for job in reclaimed:
+            if job["status"] == "failed":
+                shutil.rmtree(self.checkpoint_dir / str(job["id"]), ignore_errors=True)
+        if reclaimed:
+            failed = sum(job["status"] == "failed" for job in reclaimed)
+            ts_print(f"Reclaimed {len(reclaimed)} job(s) with an expired lease ({failed} out of attempts)")
+        return len(reclaimed)
+
+    def run_forever(self, poll_s: float = 5.0) -> None:
+        """Process jobs until stop() is called, reclaiming expired leases whenever the queue is empty."""
+        self.recover()
+        while not self.stopping.is_set():
+            if not self.run_once():
+                self.recover()
+                self.stopping.wait(poll_s)
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.queue.stats(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "processed": self.processed,
+        }
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    server: "StatusServer"
+
+    def _send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path == "/health":
+            self._send_json(200, {"ok": True})
+        elif self.path == "/status":
+            self._send_json(200, self.server.worker.status())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - http.server API
+        pass
+
+
+class StatusServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, worker: IngestWorker, host: str = "127.0.0.1", port: int = 8770) -> None:
+        super().__init__((host, port), _StatusHandler)
+        self.worker = worker
+
+
+def _connector() -> Any:
+    from src.bridge.sharepoint_connector import SharePointConnector
+    from src.config.settings import get_settings
+
+    settings = get_settings()
+    return SharePointConnector(
+        tenant_id=settings.azure_tenant_id,
+        client_id=settings.azure_client_id,
+        client_secret=settings.azure_client_secret,
+        site_id=settings.sharepoint_site_id,
+        drive_id=settings.sharepoint_drive_id,
+    )
+
+
+def enqueue_folder(sp: Any, queue: JobQueue, folder: str, recursive: bool = False) -> int:
+    """Queue every PDF of a SharePoint folder; doc_version comes from lastModified."""
+    from .incremental import _version_of
+
+    pdfs = [f for f in sp.list_files(folder_path=folder, recursive=recursive) if f["name"].lower().endswith(".pdf")]
+    for f in pdfs:
+        queue.enqueue(f["id"], f["name"], folder=folder, doc_version=_version_of(f))
+    ts_print(f"Queued {len(pdfs)} PDF(s) from {folder}")
+    return len(pdfs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Persistent ingest worker with a durable job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enqueue = sub.add_parser("enqueue", help="Queue the PDFs of a SharePoint folder")
+    enqueue.add_argument("folder", nargs="?", default="Shared Documents")
+    enqueue.add_argument("--recursive", action="store_true", help="Include PDFs in subfolders")
+    run = sub.add_parser("run", help="Process queued jobs until interrupted")
+    run.add_argument("--poll", type=float, default=5.0, help="Seconds between polls of an empty queue")
+    run.add_argument("--status-port", type=int, default=0, help="Serve GET /status on this port (0 = off)")
+    run.add_argument("--host", default="127.0.0.1")
+    sub.add_parser("status", help="Print queue counts and throughput")
+    args = parser.parse_args()
+
+    queue = JobQueue()
+    if args.command == "status":
+        print(json.dumps(queue.stats(), indent=2))
+        return
+    sp = _connector()
+    if args.command == "enqueue":
+        enqueue_folder(sp, queue, args.folder, recursive=args.recursive)
+        return
+
+    from src.text_indexing.layout_ingestor import LayoutAwareIngestor
+
+    ingestor = LayoutAwareIngestor(collection="manuals_text")
+    ingestor.converter  # warm docling once, before the first job
+    worker = IngestWorker(ingestor, sp.download_file, queue=queue)
+    server = None
+    if args.status_port:
+        server = StatusServer(worker, host=args.host, port=args.status_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ts_print(f"Status on http://{args.host}:{args.status_port}/status")
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    ts_print(f"Ingest worker started (queue {queue.path})")
+    try:
+        worker.run_forever(poll_s=args.poll)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+        ts_print(f"Ingest worker stopped after {worker.processed} job(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Durable ingest job queue (SQLite) for the long-running ingest worker
+(src.text_indexing.ingest_worker). One job per SharePoint file; `stage` is the last
+completed pipeline stage, so a job picked up again after a crash resumes from the
+next one. Per-stage timings are kept for status and throughput reporting.
+
+A claimed job is leased to its worker (`worker` + `updated_at`): the worker heartbeats
+while it runs the job, and recover() only reclaims jobs whose lease has expired, so
+several workers can share one queue file without taking each other's jobs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+STAGES = ("download", "parse", "render", "embed", "upsert")
+STATUSES = ("queued", "running", "done", "failed")
+
+
+def queue_path() -> Path:
+    return Path(os.getenv("INGEST_QUEUE_PATH", ".cache/ingest_queue.sqlite"))
+
+
+def max_attempts() -> int:
+    """Tries per job before it is marked failed (INGEST_JOB_ATTEMPTS)."""
+    return max(1, int(os.getenv("INGEST_JOB_ATTEMPTS", "3")))
+
+
+def lease_seconds() -> float:
+    """A running job whose worker has not heartbeaten for this long is reclaimed (INGEST_JOB_LEASE_S)."""
+    return max(1.0, float(os.getenv("INGEST_JOB_LEASE_S", "600")))
+
+
+class JobQueue:
+    """
+    jobs(id, file_id, file_name, folder, doc_version, status, stage, attempts, error,
+    timings, result, created_at, started_at, finished_at, updated_at, worker).
+    Claims are atomic (BEGIN IMMEDIATE), so several processes may share a queue file;
+    updates to a running job only apply while this queue's worker still holds it.
+    """
+
+    def __init__(self, path: Optional[Path] = None, worker_id: Optional[str] = None) -> None:
+        self.path = Path(path) if path else queue_path()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, file_id TEXT NOT NULL, file_name TEXT, folder TEXT,"
+            " doc_version INTEGER, status TEXT NOT NULL, stage TEXT, attempts INTEGER DEFAULT 0, error TEXT,"
+            " timings TEXT DEFAULT '{}', result TEXT, created_at REAL, started_at REAL, finished_at REAL,"
+            " updated_at REAL)"
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "worker" not in columns:  # queue files created before leases
+            self._db.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._lock = threading.RLock()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def enqueue(
+        self, file_id: str, file_name: str, folder: str = "", doc_version: Optional[int] = None
+    ) -> int:
+        """Queue one file; a file that is already queued or running keeps its existing job."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE file_id = ? AND status IN ('queued', 'running')", (file_id,)
+            ).fetchone()
+            if row:
+                return int(row["id"])
+            now = time.time()
+            cur = self._db.execute(
+                "INSERT INTO jobs (file_id, file_name, folder, doc_version, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (file_id, file_name, folder, doc_version, now, now),
+            )
+            return int(cur.lastrowid)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Oldest queued job, marked running (None when the queue is empty)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row:
+                    now = time.time()
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, error = NULL, worker = ?,"
+                        " started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                        (self.worker_id, now, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row else None
+
+    def checkpoint(self, job_id: int, stage: Optional[str], seconds: float = 0.0) -> bool:
+        """Record a completed stage (and how long it took); False if the lease was lost."""
+        with self._lock:
+            row = self._db.execute("SELECT timings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            timings = json.loads(row["timings"] or "{}")
+            if stage:
+                timings[stage] = round(timings.get(stage, 0.0) + seconds, 3)
+            cur = self._db.execute(
+                "UPDATE jobs SET stage = ?, timings = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                (stage, json.dumps(timings), time.time(), job_id, self.worker_id),
+            )
+            return cur.rowcount == 1
+
+    def heartbeat(self, job_id: int) -> bool:
+        """Extend the lease on a running job; False if another worker has reclaimed it."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND worker = ?",
+                (time.time(), job_id, self.worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: int, result: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished_at = ?, updated_at = ?, worker = NULL"
+                " WHERE id = ? AND worker = ?",
+                (json.dumps(result or {}), now, now, job_id, self.worker_id),
+            )
+
+    def fail(self, job_id: int, error: str) -> str:
+        """Back to the queue (resuming after the last completed stage) until max_attempts, then failed."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            status = "queued" if row["attempts"] < max_attempts() else "failed"
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ?, worker = NULL"
+                " WHERE id = ? AND worker = ?",
+                (status, error, now if status == "failed" else None, now, job_id, self.worker_id),
+            )
+        return status
+
+    def recover(self, lease_s: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Reclaim running jobs whose lease expired (their worker died or hung): re-queued, or
+        failed once out of attempts, so a PDF that keeps killing workers is not retried
+        forever. Returns [{"id", "status"}] of the reclaimed jobs.
+        """
+        now = time.time()
+        cutoff = now - (lease_s if lease_s is not None else lease_seconds())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, attempts FROM jobs WHERE status = 'running' AND updated_at < ?", (cutoff,)
+                ).fetchall()
+                reclaimed = []
+                for row in rows:
+                    status = "failed" if row["attempts"] >= max_attempts() else "queued"
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, worker = NULL, updated_at = ?, finished_at = ?,"
+                        " error = COALESCE(error, 'worker stopped while running the job') WHERE id = ?",
+                        (status, now, now if status == "failed" else None, row["id"]),
+                    )
+                    reclaimed.append({"id": row["id"], "status": status})
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return reclaimed
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job["timings"] = json.loads(job["timings"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        sql, args = "SELECT id FROM jobs", ()
+        if status:
+            sql, args = sql + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+        return [self.get(r["id"]) for r in rows]  # type: ignore[misc]
+
+    def stats(self, window_s: float = 3600.0) -> Dict[str, Any]:
+        """
+        {"counts": {status: n}, "running": [...], "done_in_window", "docs_per_hour",
+         "avg_stage_s": {stage: seconds}} over jobs finished in the last window_s seconds.
+        """
+        counts = {status: 0 for status in STATUSES}
+        since = time.time() - window_s
+        with self._lock:
+            for row in self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall():
+                counts[row["status"]] = row["n"]
+            finished = self._db.execute(
+                "SELECT timings FROM jobs WHERE status = 'done' AND finished_at >= ?", (since,)
+            ).fetchall()
+        totals: Dict[str, float] = {}
+        for row in finished:
+            for stage, seconds in json.loads(row["timings"] or "{}").items():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        running = [
+            {"id": j["id"], "file_name": j["file_name"], "stage": j["stage"], "attempts": j["attempts"]}
+            for j in self.jobs("running")
+        ]
+        return {
+            "counts": counts,
+            "running": running,
+            "done_in_window": len(finished),
+            "docs_per_hour": round(len(finished) * 3600.0 / window_s, 2),
+            "avg_stage_s": {s: round(totals[s] / len(finished), 2) for s in STAGES if s in totals},
+        }
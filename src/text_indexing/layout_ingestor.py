@@ -2,27 +2,60 @@ from __future__ import annotations
 
 import argparse
 import os
-import shutil
 import time
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
+from src.bridge.downloads import temporary_download
 from src.bridge.sharepoint_connector import SharePointConnector
 from src.config.settings import get_settings
-from src.text_indexing.doc_parser import parse_document
-from src.text_indexing.markdown_builder import render_markdown, write_outputs
-from src.text_indexing.qdrant_writer import upsert_markdown
+from src.embedding.backends import get_embed_model as get_local_embed_model
+from src.text_indexing.doc_cards import (
+    CARDS_COLLECTION,
+    build_document_card,
+    card_point_id,
+    card_text,
+    ensure_cards_collection,
+    upsert_card,
+)
+from src.text_indexing.doc_parser import build_converter, parse_document
+from src.text_indexing.fast_path import fast_path_enabled, parse_hybrid
+from src.text_indexing.figure_store import FigureStore
+from src.text_indexing import profiling
+from src.text_indexing.incremental import sync_folder
+from src.text_indexing.local_export import export_root, staged_export
+from src.text_indexing.markdown_builder import FigureUploader, render_markdown, split_steps, write_outputs
+from src.text_indexing.parallel_ingest import (
+    ingest_files_parallel,
+    ingest_workers,
+    parse_in_ranges,
+    parse_min_pages,
+    parse_workers,
+    pdf_page_count,
+)
+from src.text_indexing.parse_cache import cached_parse
+from src.text_indexing.qdrant_writer import (
+    BatchWriteError,
+    BatchedQdrantWriter,
+    delete_points,
+    ensure_payload_indexes,
+    markdown_point_id,
+    replace_document,
+    step_chunks,
+    upsert_markdown,
+    upsert_steps,
+)
 from src.text_indexing.step_builder import build_steps
 from src.text_indexing.storage import AzureBlobStorage
+from src.text_indexing.utils import strip_urls_for_embed
 
 # LlamaIndex embeddings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
 
 
@@ -33,7 +66,8 @@ def ts_print(msg: str) -> None:
 
 def get_embed_model(force_hf: bool = True):
     """
-    Choose an embedding model. Defaults to HF for local/dev; uses OpenAI if requested and key present.
+    Choose an embedding model. Defaults to local MiniLM (EMBED_BACKEND=hf|onnx);
+    uses OpenAI if requested and key present.
     """
     if not force_hf:
         api_key = os.getenv("OPENAI_API_KEY")
@@ -42,7 +76,7 @@ def get_embed_model(force_hf: bool = True):
                 return OpenAIEmbedding(model="text-embedding-3-small", api_key=api_key)
             except Exception:
                 pass
-    return HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    return get_local_embed_model()
 
 
 class LayoutAwareIngestor:
@@ -55,19 +89,24 @@ class LayoutAwareIngestor:
             url=os.getenv("QDRANT_URL", "http://localhost:6333"),
             check_compatibility=False,
         )
-        pipeline_options = PdfPipelineOptions()
-        pipeline_options.generate_picture_images = True  # extract UI crops
-        pipeline_options.images_scale = 2.0  # high quality crops
-        self.converter = DocumentConverter(
-            format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
-        )
+        self._converter: Optional[DocumentConverter] = None
+        self.writer: Optional[BatchedQdrantWriter] = None  # set inside batched_writes()
         self.blob_container = os.getenv("AZURE_STORAGE_CONTAINER", "manual-images")
         conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         if not conn_str:
             raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING is required for Azure blob uploads")
         self.storage = AzureBlobStorage(container=self.blob_container, connection_string=conn_str)
+        # Content-addressed figures shared across manuals (FIGURE_DEDUP=0 keeps per-manual blobs).
+        self.figures = FigureStore(self.storage) if os.getenv("FIGURE_DEDUP", "1") != "0" else None
         self._ensure_collection()
 
+    @property
+    def converter(self) -> DocumentConverter:
+        """Built on first use: parallel ingest converts in worker processes and never needs it."""
+        if self._converter is None:
+            self._converter = build_converter()
+        return self._converter
+
     def _ensure_collection(self) -> None:
         dim = None
         if hasattr(self.embed, "get_text_embedding"):
@@ -87,59 +126,274 @@ class LayoutAwareIngestor:
                 collection_name=self.collection,
                 vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
             )
+        ensure_payload_indexes(self.client, self.collection)
+        ensure_cards_collection(self.client, dim)
+
+    def index_pdf(
+        self,
+        pdf: Union[bytes, Path],
+        file_name: str,
+        doc_id: Optional[str] = None,
+        doc_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Parse, render and index one manual (PDF bytes or a downloaded file). doc_id is the
+        stable source id (SharePoint item id; defaults to file_name) and doc_version tags
+        every point written for this ingestion (defaults to the ingestion time).
+        Pages with a clean text layer are read directly (FAST_PATH); the rest go to docling.
+        Returns what was written: {"doc_version", "point_ids", "blob_names"}.
+        """
+        with profiling.document(file_name):
+            total_pages, collected = self.parse_pdf(pdf, file_name)
+            return self.index_parsed(
+                collected,
+                file_name,
+                total_pages=total_pages,
+                doc_id=doc_id,
+                doc_version=doc_version,
+            )
 
-    def index_pdf(self, pdf_bytes: bytes, file_name: str) -> None:
+    def parse_pdf(self, pdf: Union[bytes, Path], file_name: str) -> Tuple[int, List[Dict[str, Any]]]:
+        """Parse stage: (total_pages, collected items), from the parse cache for a PDF parsed before."""
+        with profiling.stage("parse"):
+            total_pages, collected = cached_parse(pdf, file_name, partial(self._parse_uncached, pdf, file_name))
+        profiling.count("pages", total_pages)
+        return total_pages, collected
+
+    def _parse_uncached(self, pdf: Union[bytes, Path], file_name: str) -> Tuple[int, List[Dict[str, Any]]]:
         ts_print(f"Parsing {file_name} with component extraction")
-        doc, collected = parse_document(self.converter, pdf_bytes, file_name)
+        if fast_path_enabled():
+            convert_pages = partial(self._convert_pages, pdf, file_name)
+            total_pages, collected, _report = parse_hybrid(pdf, file_name, convert_pages)
+        else:
+            total_pages = pdf_page_count(pdf)
+            collected = self._convert_pages(pdf, file_name, 1, total_pages)
+        return total_pages, collected
+
+    def _convert_pages(
+        self, pdf: Union[bytes, Path], file_name: str, first: int, last: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Docling for pages first..last. With PARSE_WORKERS > 1, runs of PARSE_MIN_PAGES or
+        more pages of a downloaded PDF are converted as parallel page ranges.
+        """
+        if isinstance(pdf, Path) and parse_workers() > 1 and last - first + 1 >= max(parse_min_pages(), 2):
+            return parse_in_ranges(pdf, file_name, last, first_page=first)
+        _doc, collected = parse_document(self.converter, pdf, file_name, page_range=(first, last))
+        return collected
 
-        # Prepare per-document export folder
+    def index_parsed(
+        self,
+        collected: List[Dict[str, Any]],
+        file_name: str,
+        total_pages: int = 0,
+        doc_id: Optional[str] = None,
+        doc_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Render, upload and index already-parsed items (parse_document output)."""
+        with profiling.document(file_name):
+            try:
+                rendered = self.render_parsed(
+                    collected, file_name, total_pages, doc_id=doc_id, doc_version=doc_version
+                )
+                # Inside batched_writes() chunks are embedded with other documents' chunks.
+                vectors = self.embed_rendered(rendered) if self.writer is None else None
+                return self.upsert_rendered(rendered, vectors)
+            except Exception as exc:
+                ts_print(f"Ingestion failed for {file_name}: {exc}")
+                raise
+
+    def render_parsed(
+        self,
+        collected: Iterable[Dict[str, Any]],
+        file_name: str,
+        total_pages: int = 0,
+        doc_id: Optional[str] = None,
+        doc_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Render stage: markdown export plus figure/markdown uploads. Returns a JSON-serialisable
+        {"payload", "steps", "card", "blob_names"} for embed_rendered / upsert_rendered.
+        collected is read once (a generator works) and image items lose their bitmap as
+        they are uploaded, at most FIGURE_INFLIGHT at a time.
+        """
+        doc_id = doc_id or file_name
+        doc_version = doc_version if doc_version is not None else int(time.time())
         safe_base = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in Path(file_name).stem)
-        export_root = Path("markdown_exports")
-        doc_dir = export_root / safe_base
-        fig_dir = doc_dir / "images"
-        if doc_dir.exists():
-            shutil.rmtree(doc_dir)
-        fig_dir.mkdir(parents=True, exist_ok=True)
+        doc_dir = export_root() / safe_base
 
-        try:
-            ordered_steps = build_steps(collected)
-            full_markdown, embed_markdown, sas_urls, fig_meta = render_markdown(
-                ordered_steps=ordered_steps,
-                safe_base=safe_base,
-                fig_dir=fig_dir,
-                storage=self.storage,
-            )
-            md_output_path, md_sas, meta_sas = write_outputs(
-                doc_dir=doc_dir,
-                full_markdown=full_markdown,
-                embed_markdown=embed_markdown,
-                file_name=file_name,
-                sas_urls=sas_urls,
-                fig_meta=fig_meta,
-                storage=self.storage,
-            )
-            ts_print(
-                f"Wrote markdown to {md_output_path} with {len(fig_meta)} figures and {len(sas_urls)} SAS URLs"
-            )
+        # Local export (LOCAL_EXPORT) is staged and replaces doc_dir only once complete.
+        with staged_export(doc_dir) as export:
+            fig_dir = export.fig_dir if export is not None else None
+            uploader = FigureUploader(self.storage, safe_base, fig_dir, self.figures)
+            try:
+                with profiling.stage("figures"):
+                    # Each figure is uploaded (and its bitmap dropped) as soon as its step is known.
+                    ordered_steps = build_steps(collected, on_image=uploader.submit_item)
+                    full_markdown, embed_markdown, sas_urls, fig_meta = render_markdown(
+                        ordered_steps=ordered_steps,
+                        safe_base=safe_base,
+                        fig_dir=fig_dir,
+                        storage=self.storage,
+                        figure_store=self.figures,
+                        uploader=uploader,
+                    )
+            finally:
+                uploader.close()
+            profiling.count("figures", len(fig_meta))
+            if export is not None:
+                export.relocate(fig_meta)
+            with profiling.stage("write_outputs"):
+                md_output_path, md_sas, meta_sas = write_outputs(
+                    doc_dir=export.staging if export is not None else None,
+                    full_markdown=full_markdown,
+                    embed_markdown=embed_markdown,
+                    file_name=file_name,
+                    sas_urls=sas_urls,
+                    fig_meta=fig_meta,
+                    storage=self.storage,
+                    blob_prefix=safe_base,
+                )
+            if export is not None:
+                md_output_path = export.final(md_output_path)
+        ts_print(
+            f"Wrote markdown to {md_output_path or f'{safe_base}/markdown.md (blob only)'} "
+            f"with {len(fig_meta)} figures and {len(sas_urls)} SAS URLs"
+        )
+
+        payload = {
+            "doc_id": doc_id,
+            "doc_version": doc_version,
+            "file_name": file_name,
+            "total_pages": total_pages,
+            "text": embed_markdown,  # URL-free for embeddings
+            "llm_markdown": full_markdown,  # SAS-ready for LLM context
+            "sas_urls": sas_urls,
+            "fig_images": fig_meta,
+            "markdown_path": str(md_output_path) if md_output_path is not None else None,
+            "markdown_sas": md_sas,
+            "metadata_sas": meta_sas,
+            "doc_type": "markdown_bridge",
+            "current": False,  # hidden from search until replace_document flips it
+        }
+        # Shared figures may be referenced by other manuals: never deleted with this one.
+        blob_names = [m["blob_name"] for m in fig_meta if not m.get("shared")]
+        blob_names += [f"{safe_base}/markdown.md", f"{safe_base}/metadata.json"]
+        return {
+            "payload": payload,
+            "steps": [list(step) for step in split_steps(full_markdown)],
+            "card": build_document_card(file_name, ordered_steps, doc_id=doc_id),
+            "blob_names": blob_names,
+        }
 
-            payload = {
-                "file_name": file_name,
-                "total_pages": len(getattr(doc, "pages", []) or []),
-                "text": embed_markdown,  # URL-free for embeddings
-                "llm_markdown": full_markdown,  # SAS-ready for LLM context
-                "sas_urls": sas_urls,
-                "fig_images": fig_meta,
-                "markdown_path": str(md_output_path),
-                "markdown_sas": md_sas,
-                "metadata_sas": meta_sas,
-                "doc_type": "markdown_bridge",
+    def embed_rendered(self, rendered: Dict[str, Any]) -> Dict[str, Any]:
+        """Embed stage: {"doc", "steps", "card"} vectors as plain float lists."""
+        steps = [strip_urls_for_embed(md) for _, md in rendered["steps"]]
+        with profiling.stage("embed"):
+            step_vecs = self.embed.get_text_embedding_batch(steps) if steps else []
+            return {
+                "doc": [float(x) for x in self.embed.get_text_embedding(rendered["payload"]["text"])],
+                "steps": [[float(x) for x in vec] for vec in step_vecs],
+                "card": [float(x) for x in self.embed.get_text_embedding(card_text(rendered["card"]))],
             }
-            upsert_markdown(self.client, self.collection, self.embed, embed_markdown, payload)
-        except Exception as exc:
-            ts_print(f"Ingestion failed for {file_name}: {exc}")
-            raise
+
+    def upsert_rendered(self, rendered: Dict[str, Any], vectors: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Upsert stage: write the points (current=False), swap them in for the previous version
+        and refresh the routing card. Point ids are deterministic, so a retried upsert of the
+        same version overwrites instead of duplicating. Inside batched_writes() the points
+        are queued on the writer and the swap happens at its flush.
+        Returns what was written: {"doc_version", "point_ids", "blob_names"}.
+        """
+        vectors = vectors or {}
+        if self.writer is not None:
+            return self._queue_rendered(rendered, vectors)
+        payload = rendered["payload"]
+        doc_id, doc_version, file_name = payload["doc_id"], payload["doc_version"], payload["file_name"]
+        with profiling.stage("qdrant"):
+            point_ids = [
+                upsert_markdown(
+                    self.client, self.collection, self.embed, payload["text"], payload, vec=vectors.get("doc")
+                )
+            ]
+            point_ids += upsert_steps(
+                self.client,
+                self.collection,
+                self.embed,
+                [(step_no, md) for step_no, md in rendered["steps"]],
+                {"doc_id": doc_id, "doc_version": doc_version, "file_name": file_name, "current": False},
+                vectors=vectors.get("steps"),
+            )
+            replace_document(self.client, self.collection, doc_id, doc_version, file_name=file_name)
+            upsert_card(self.client, self.embed, rendered["card"], vec=vectors.get("card"))
+        profiling.count("points", len(point_ids) + 1)
+        return {"doc_version": doc_version, "point_ids": point_ids, "blob_names": rendered["blob_names"]}
+
+    def _queue_rendered(self, rendered: Dict[str, Any], vectors: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        upsert_rendered through the batched writer: the version swap and the routing card
+        run after its flush, and only for a document whose points were all confirmed, so a
+        failed batch leaves both the previous version and its card in place.
+        """
+        payload = rendered["payload"]
+        doc_id, doc_version, file_name = payload["doc_id"], payload["doc_version"], payload["file_name"]
+        point_ids = [markdown_point_id(payload)]
+        self.writer.add(self.collection, point_ids[0], payload["text"], payload, vector=vectors.get("doc"), doc=doc_id)
+        chunks = step_chunks(
+            [(step_no, md) for step_no, md in rendered["steps"]],
+            {"doc_id": doc_id, "doc_version": doc_version, "file_name": file_name, "current": False},
+        )
+        step_vecs = vectors.get("steps") or [None] * len(chunks)
+        for (pid, text, step_payload), vec in zip(chunks, step_vecs):
+            self.writer.add(self.collection, pid, text, step_payload, vector=vec, doc=doc_id)
+            point_ids.append(pid)
+        self.writer.after_flush(
+            partial(replace_document, self.client, self.collection, doc_id, doc_version, file_name=file_name),
+            doc=doc_id,
+        )
+        self.writer.after_flush(
+            partial(upsert_card, self.client, self.embed, rendered["card"], vec=vectors.get("card")),
+            doc=doc_id,
+        )
+        return {"doc_version": doc_version, "point_ids": point_ids, "blob_names": rendered["blob_names"]}
+
+    @contextmanager
+    def batched_writes(self) -> Iterator[BatchedQdrantWriter]:
+        """
+        Bulk ingest: chunks of every document indexed inside the block are embedded and
+        upserted in batches across documents (BatchedQdrantWriter); each document becomes
+        current once the final flush has confirmed its points.
+        """
+        self.writer = BatchedQdrantWriter(self.client, self.embed)
+        try:
+            yield self.writer
+        finally:
+            writer, self.writer = self.writer, None
+            writer.close()
+
+    def delete_document(
+        self,
+        file_name: str,
+        point_ids: Optional[List[str]] = None,
+        blob_names: Optional[List[str]] = None,
+        drop_card: bool = True,
+        doc_id: Optional[str] = None,
+    ) -> None:
+        """
+        Remove indexed points, uploaded blobs and (optionally) the routing card of a manual.
+        A card from before doc ids (keyed by file_name) is always removed.
+        """
+        delete_points(self.client, self.collection, list(point_ids or []))
+        if blob_names:
+            self.storage.delete_blobs(blob_names)
+        cards = [card_point_id(doc_id or file_name)] if drop_card else []
+        if doc_id and doc_id != file_name:
+            cards.append(card_point_id(file_name))
+        if cards and self.client.collection_exists(CARDS_COLLECTION):
+            delete_points(self.client, CARDS_COLLECTION, cards)
 
 
+@profiling.profiled
 def ingest_one_pdf(file_id: Optional[str] = None, folder_path: Optional[str] = "Shared Documents") -> None:
     settings = get_settings()
     sp = SharePointConnector(
@@ -171,21 +425,29 @@ def ingest_one_pdf(file_id: Optional[str] = None, folder_path: Optional[str] = "
     pdf_name = target.get("name") if isinstance(target, dict) else getattr(target, "name", "manual.pdf")
     ts_print(f"Selected PDF {pdf_name} ({pdf_id})")
     try:
-        pdf_bytes = sp.get_file_stream(pdf_id)
+        pdf_path = sp.download_file(pdf_id)
     except Exception as exc:
         ts_print(f"Failed to download PDF: {exc}")
         return
 
     ingestor = LayoutAwareIngestor(collection="manuals_text")
-    try:
-        ingestor.index_pdf(pdf_bytes, file_name=pdf_name)
-        ts_print("Ingestion complete.")
-    except Exception as exc:
-        ts_print(f"Ingestion failed: {exc}")
+    with temporary_download(pdf_path):
+        try:
+            ingestor.index_pdf(pdf_path, file_name=pdf_name, doc_id=pdf_id)
+            ts_print("Ingestion complete.")
+        except Exception as exc:
+            ts_print(f"Ingestion failed: {exc}")
 
 
-def ingest_all_pdfs(folder_path: Optional[str] = "Shared Documents") -> None:
-    """Ingest all PDFs in the given folder using the layout-aware pipeline."""
+@profiling.profiled
+def ingest_all_pdfs(
+    folder_path: Optional[str] = "Shared Documents", workers: Optional[int] = None, recursive: bool = False
+) -> None:
+    """
+    Ingest all PDFs in the given folder (and its subfolders with recursive=True) using
+    the layout-aware pipeline. With workers > 1 (or INGEST_WORKERS) PDFs are converted
+    in parallel processes. Chunks are embedded and upserted in batches across PDFs.
+    """
     settings = get_settings()
     sp = SharePointConnector(
         tenant_id=settings.azure_tenant_id,
@@ -194,7 +456,9 @@ def ingest_all_pdfs(folder_path: Optional[str] = "Shared Documents") -> None:
         site_id=settings.sharepoint_site_id,
         drive_id=settings.sharepoint_drive_id,
     )
-    files = sp.list_files(folder_path=folder_path or settings.sharepoint_folder_path or "Documents")
+    files = sp.list_files(
+        folder_path=folder_path or settings.sharepoint_folder_path or "Documents", recursive=recursive
+    )
     pdfs = [
         f
         for f in files
@@ -205,28 +469,70 @@ def ingest_all_pdfs(folder_path: Optional[str] = "Shared Documents") -> None:
 
     ingestor = LayoutAwareIngestor(collection="manuals_text")
 
-    for f in pdfs:
-        pdf_id = f.get("id") if isinstance(f, dict) else getattr(f, "id", None)
-        pdf_name = f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf")
-        ts_print(f"Selected PDF {pdf_name} ({pdf_id})")
+    workers = workers or ingest_workers()
+    if workers > 1:
+        items = [
+            (
+                f.get("id") if isinstance(f, dict) else getattr(f, "id", None),
+                f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf"),
+            )
+            for f in pdfs
+        ]
         try:
-            pdf_bytes = sp.get_file_stream(pdf_id)
-            ingestor.index_pdf(pdf_bytes, file_name=pdf_name)
-        except Exception as exc:
-            ts_print(f"Skipping {pdf_name} due to error: {exc}")
+            with ingestor.batched_writes():
+                ingest_files_parallel(ingestor, items, sp.download_file, workers=workers)
+        except BatchWriteError as exc:
+            ts_print(f"Index write failed for {len(exc.failed)} PDF(s); their previous versions stay current: {exc}")
+        ts_print(f"Ingestion complete for {len(pdfs)} PDF(s).")
+        return
+
+    try:
+        with ingestor.batched_writes():
+            for f in pdfs:
+                pdf_id = f.get("id") if isinstance(f, dict) else getattr(f, "id", None)
+                pdf_name = f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf")
+                ts_print(f"Selected PDF {pdf_name} ({pdf_id})")
+                try:
+                    with temporary_download(sp.download_file(pdf_id)) as pdf_path:
+                        ingestor.index_pdf(pdf_path, file_name=pdf_name, doc_id=pdf_id)
+                except Exception as exc:
+                    ts_print(f"Skipping {pdf_name} due to error: {exc}")
+    except BatchWriteError as exc:
+        ts_print(f"Index write failed for {len(exc.failed)} PDF(s); their previous versions stay current: {exc}")
     ts_print(f"Ingestion complete for {len(pdfs)} PDF(s).")
 
 
+@profiling.profiled
+def sync_pdfs(folder_path: Optional[str] = "Shared Documents", use_delta: bool = True) -> None:
+    """Incremental ingest: only new/changed PDFs are processed, deleted ones are removed."""
+    settings = get_settings()
+    sp = SharePointConnector(
+        tenant_id=settings.azure_tenant_id,
+        client_id=settings.azure_client_id,
+        client_secret=settings.azure_client_secret,
+        site_id=settings.sharepoint_site_id,
+        drive_id=settings.sharepoint_drive_id,
+    )
+    ingestor = LayoutAwareIngestor(collection="manuals_text")
+    sync_folder(sp, ingestor, folder_path or settings.sharepoint_folder_path or "Documents", use_delta=use_delta)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ingest PDFs from SharePoint")
     parser.add_argument("folder", nargs="?", default="Shared Documents", help="Folder path in SharePoint")
     parser.add_argument("--file-id", dest="file_id", help="Specific file ID to ingest")
     parser.add_argument("--all", dest="ingest_all", action="store_true", help="Ingest all PDFs in folder")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel conversion processes (with --all)")
+    parser.add_argument("--recursive", action="store_true", help="With --all: include PDFs in subfolders")
+    parser.add_argument("--sync", action="store_true", help="Incremental ingest via the manifest + Graph delta")
+    parser.add_argument("--no-delta", dest="use_delta", action="store_false", help="With --sync: diff a full listing")
     args = parser.parse_args()
 
     start = time.time()
-    if args.ingest_all:
-        ingest_all_pdfs(folder_path=args.folder)
+    if args.sync:
+        sync_pdfs(folder_path=args.folder, use_delta=args.use_delta)
+    elif args.ingest_all:
+        ingest_all_pdfs(folder_path=args.folder, workers=args.workers, recursive=args.recursive)
     else:
         ingest_one_pdf(file_id=args.file_id, folder_path=args.folder)
     ts_print(f"Done in {time.time() - start:.2f}s")
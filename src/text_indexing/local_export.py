@@ -0,0 +1,129 @@
+"""
+Local markdown exports (`markdown_exports/<doc>`), swapped in atomically.
+
+An export is built in a hidden versioned sibling directory (`.<doc>.<random>`) and
+`<doc>` is a symlink to the current version. Committing points a temporary link at the
+new version and renames it over `<doc>` (one rename(2) of a symlink, atomic on POSIX):
+readers (the preview UI, answer files next to markdown.md) see the old tree or the new
+one, never a half-written or missing tree, and a crash mid-ingest keeps the previous
+export. Blob storage already holds every artefact: LOCAL_EXPORT=0 skips the local copy
+entirely.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+STALE_AFTER_S = 3600  # leftovers of a crashed export older than this are removed
+
+
+def local_export_enabled() -> bool:
+    return os.getenv("LOCAL_EXPORT", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def export_root() -> Path:
+    return Path(os.getenv("LOCAL_EXPORT_DIR", "markdown_exports"))
+
+
+class LocalExport:
+    """One document's export, staged in `.<name>.<random>`; doc_dir links to the committed version."""
+
+    def __init__(self, doc_dir: Path) -> None:
+        self.doc_dir = Path(doc_dir)
+        self.doc_dir.parent.mkdir(parents=True, exist_ok=True)
+        _restore_interrupted(self.doc_dir)
+        _remove_stale(self.doc_dir)
+        self.staging = Path(tempfile.mkdtemp(dir=self.doc_dir.parent, prefix=f".{self.doc_dir.name}.")).resolve()
+        self.fig_dir = self.staging / "images"
+        self.fig_dir.mkdir()
+
+    def final(self, path: Path) -> Path:
+        """Where a file written under staging is read once the export is committed (through the link)."""
+        return self.doc_dir.parent.resolve() / self.doc_dir.name / Path(path).relative_to(self.staging)
+
+    def relocate(self, fig_meta: List[Dict[str, Any]]) -> None:
+        for meta in fig_meta:
+            if meta.get("local_path"):
+                meta["local_path"] = str(self.final(Path(meta["local_path"])))
+
+    def commit(self) -> None:
+        """
+        Point doc_dir at the staged version with one rename of a symlink, then remove the
+        previous version. An export from before versioning (a real directory) is moved
+        aside first; only that one-time migration has a moment without doc_dir.
+        """
+        old = _live_version(self.doc_dir)
+        if self.doc_dir.exists() and not self.doc_dir.is_symlink():
+            old = Path(tempfile.mkdtemp(dir=self.doc_dir.parent, prefix=f".{self.doc_dir.name}.old-"))
+            os.replace(self.doc_dir, old / self.doc_dir.name)
+        link = self.doc_dir.parent / f".{self.doc_dir.name}.link-{uuid.uuid4().hex[:8]}"
+        os.symlink(self.staging.name, link, target_is_directory=True)
+        try:
+            os.replace(link, self.doc_dir)
+        except BaseException:
+            link.unlink(missing_ok=True)
+            raise
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def discard(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def _live_version(doc_dir: Path) -> Optional[Path]:
+    """The versioned directory doc_dir links to (None for a missing or pre-versioning export)."""
+    if not doc_dir.is_symlink():
+        return None
+    return doc_dir.parent / os.readlink(doc_dir)
+
+
+def _restore_interrupted(doc_dir: Path) -> None:
+    """Move back a pre-versioning tree when its migration died before the link went in."""
+    if doc_dir.exists() or doc_dir.is_symlink():
+        return
+    aside = sorted(doc_dir.parent.glob(f".{doc_dir.name}.old-*/{doc_dir.name}"), key=lambda p: p.stat().st_mtime)
+    if aside:
+        os.replace(aside[-1], doc_dir)
+
+
+def _remove_stale(doc_dir: Path) -> None:
+    """Remove leftovers of crashed exports (never the live version)."""
+    cutoff = time.time() - STALE_AFTER_S
+    live = _live_version(doc_dir)
+    for path in doc_dir.parent.glob(f".{doc_dir.name}.*"):
+        if live is not None and path.name == live.name:
+            continue
+        try:
+            if path.lstat().st_mtime >= cutoff:
+                continue
+            if path.is_symlink():
+                path.unlink()
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def staged_export(doc_dir: Path) -> Iterator[Optional[LocalExport]]:
+    """
+    Stage an export of doc_dir; it replaces doc_dir when the block succeeds and is
+    dropped when it raises. Yields None when LOCAL_EXPORT is off.
+    """
+    if not local_export_enabled():
+        yield None
+        return
+    export = LocalExport(doc_dir)
+    try:
+        yield export
+    except BaseException:
+        export.discard()
+        raise
+    export.commit()
@@ -1,91 +1,209 @@
 from __future__ import annotations
 
-import io
 import json
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from . import profiling
 from .step_builder import detect_step_number  # re-exported for convenience
-from .storage import AzureBlobStorage
-from .step_builder import build_steps
+from .figure_codec import FigureCodec, get_figure_codec
+from .figure_store import FigureStore
+from .storage import AzureBlobStorage, upload_workers
+from .step_builder import build_steps, step_title
 from .utils import strip_urls_for_embed
 
+STEP_HEADING_RE = re.compile(r"(?m)^### Step (\d+):")
+
+
+def figure_window() -> int:
+    return max(1, int(os.getenv("FIGURE_INFLIGHT", "16")))
+
+
+class FigureUploader:
+    """
+    Encodes and uploads figures on a thread pool as they are submitted, with at most
+    `window` figures (FIGURE_INFLIGHT) in flight: submit() blocks while the window is
+    full, so only that many decoded bitmaps are held however many figures a manual has.
+    result(ref) is the uploaded figure's {"sas_url", "local_path", "blob_name", ...}.
+    Figures are named by their running index within the document (fig_<n>_page_<page>),
+    so names never collide whatever order the steps are read in.
+    """
+
+    def __init__(
+        self,
+        storage: AzureBlobStorage,
+        safe_base: str,
+        fig_dir: Optional[Path] = None,
+        figure_store: Optional[FigureStore] = None,
+        codec: Optional[FigureCodec] = None,
+        window: Optional[int] = None,
+    ) -> None:
+        self.storage = storage
+        self.safe_base = safe_base
+        self.fig_dir = fig_dir
+        self.figure_store = figure_store
+        self.codec = codec or (figure_store.codec if figure_store is not None else get_figure_codec())
+        self.window = window or figure_window()
+        self._pool = ThreadPoolExecutor(max_workers=min(upload_workers(), self.window))
+        self._futures: List[Future] = []
+        self._inflight: Set[Future] = set()
+
+    def submit(self, img: Any, page_no: int) -> int:
+        while len(self._inflight) >= self.window:  # backpressure: bounded bitmaps in memory
+            _done, self._inflight = wait(self._inflight, return_when=FIRST_COMPLETED)
+        name = f"fig_{len(self._futures) + 1}_page_{page_no}.{self.codec.ext}"
+        local_path = self.fig_dir / name if self.fig_dir is not None else None
+        future = self._pool.submit(profiling.bind(self._upload), img, f"{self.safe_base}/images/{name}", local_path)
+        self._futures.append(future)
+        self._inflight.add(future)
+        return len(self._futures) - 1
+
+    def submit_item(self, itm: Dict[str, Any], step_no: Optional[int]) -> Dict[str, Any]:
+        """build_steps on_image hook: upload now and drop the item's bitmap."""
+        page_no = itm.get("page", 0) or 0
+        return {"type": "image", "figure": self.submit(itm.pop("image"), page_no), "page": page_no}
+
+    def _upload(self, img: Any, blob_name: str, local_path: Optional[Path]) -> Dict[str, Any]:
+        encode = partial(_encode_figure, img, local_path, self.codec)
+        fig = {"sas_url": None, "local_path": str(local_path.resolve()) if local_path is not None else None}
+        if self.figure_store is not None:
+            stored = self.figure_store.store(img, encode)
+            if stored["deduped"] and local_path is not None:
+                encode()  # nothing uploaded; the local export still needs the file
+            fig.update(sas_url=stored["sas_url"], blob_name=stored["blob_name"])
+            fig.update(content_hash=stored["content_hash"], shared=True)
+        else:
+            fig.update(
+                sas_url=self.storage.upload_and_get_sas(encode(), blob_name, content_type=self.codec.content_type),
+                blob_name=blob_name,
+            )
+        return fig
+
+    def result(self, ref: int) -> Dict[str, Any]:
+        return self._futures[ref].result()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
 
 def render_markdown(
     ordered_steps: List[Tuple[int, Dict[str, List[Dict[str, Any]]]]],
     safe_base: str,
-    fig_dir: Path,
+    fig_dir: Optional[Path],
     storage: AzureBlobStorage,
+    figure_store: Optional[FigureStore] = None,
+    codec: Optional[FigureCodec] = None,
+    uploader: Optional[FigureUploader] = None,
 ) -> tuple[str, str, List[str], List[Dict[str, Any]]]:
+    """
+    Render ordered steps to markdown with uploaded figures.
+    With a figure_store, figures are content-addressed and shared across manuals
+    (fig_meta then points at the shared blob); otherwise each manual gets its own
+    `{safe_base}/images/...` blobs. Each figure is encoded once (codec, default
+    FIGURE_FORMAT) and the same bytes are uploaded and, unless fig_dir is None, exported
+    locally. Image items already submitted to `uploader` (build_steps with
+    on_image=uploader.submit_item) carry a "figure" reference instead of the bitmap.
+    """
+    own_uploader = uploader is None
+    if uploader is None:
+        uploader = FigureUploader(storage, safe_base, fig_dir, figure_store, codec)
     md_parts: List[str] = []
-    sas_urls: List[str] = []
-    fig_meta: List[Dict[str, Any]] = []
-    fig_counters: Dict[int, int] = {}
-
-    for step_no, data in ordered_steps:
-        content = data.get("content") or []
-        texts_for_title = [c["text"] for c in content if c.get("type") == "text"]
-        title = texts_for_title[0].split("\n")[0].strip() if texts_for_title else f"Step {step_no}"
-
-        md_parts.append(f"### Step {step_no}: {title}")
-
-        for itm in content:
-            if itm["type"] == "text":
-                md_parts.append(itm["text"])
-            elif itm["type"] == "image":
-                img = itm["image"]
-                page_no = itm.get("page", 0) or 0
-                fig_counters[step_no] = fig_counters.get(step_no, 0) + 1
-                fig_idx = fig_counters[step_no]
-                blob_name = f"{safe_base}/images/fig_{fig_idx}_page_{page_no}.png"
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                sas_url = storage.upload_and_get_sas(buf.getvalue(), blob_name)
-                sas_urls.append(sas_url)
-
-                local_name = f"fig_{fig_idx}_page_{page_no}.png"
-                local_path = fig_dir / local_name
-                img.save(local_path)
-
-                md_parts.append(f"![Step {step_no} Visual]({sas_url})")
-                fig_meta.append(
-                    {
-                        "step": step_no,
-                        "page_number": page_no,
-                        "sas_url": sas_url,
-                        "local_path": str(local_path.resolve()),
-                        "blob_name": blob_name,
-                    }
-                )
-
-        md_parts.append("---")
+    image_slots: List[Tuple[int, int, int, int]] = []  # (md_parts index, step_no, page_no, figure ref)
+
+    try:
+        for step_no, data in ordered_steps:
+            content = data.get("content") or []
+            title = step_title(step_no, content)
+
+            md_parts.append(f"### Step {step_no}: {title}")
+
+            for itm in content:
+                if itm["type"] == "text":
+                    md_parts.append(itm["text"])
+                elif itm["type"] == "image":
+                    page_no = itm.get("page", 0) or 0
+                    ref = itm["figure"] if "figure" in itm else uploader.submit(itm["image"], page_no)
+                    image_slots.append((len(md_parts), step_no, page_no, ref))
+                    md_parts.append("")
+
+            md_parts.append("---")
+
+        # Figures upload concurrently while the steps render; SAS URLs are filled in figure order.
+        sas_urls: List[str] = []
+        fig_meta: List[Dict[str, Any]] = []
+        for slot, step_no, page_no, ref in image_slots:
+            fig = uploader.result(ref)
+            md_parts[slot] = f"![Step {step_no} Visual]({fig['sas_url']})"
+            sas_urls.append(fig["sas_url"])
+            fig_meta.append({"step": step_no, "page_number": page_no, **fig})
+    finally:
+        if own_uploader:
+            uploader.close()
 
     full_markdown = "\n\n".join(part for part in md_parts if part).strip()
     embed_markdown = strip_urls_for_embed(full_markdown)
     return full_markdown, embed_markdown, sas_urls, fig_meta
 
 
+def _encode_figure(img: Any, local_path: Optional[Path], codec: FigureCodec) -> bytes:
+    """Encode once; the local export is the upload payload written to disk."""
+    with profiling.stage("encode"):
+        data = codec.encode(img)
+    if local_path is not None:
+        local_path.write_bytes(data)
+    return data
+
+
+def split_steps(full_markdown: str) -> List[Tuple[int, str]]:
+    """Split render_markdown output back into (step_no, section markdown) pairs."""
+    matches = list(STEP_HEADING_RE.finditer(full_markdown or ""))
+    sections: List[Tuple[int, str]] = []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(full_markdown)
+        section = full_markdown[m.start() : end].strip()
+        if section.endswith("---"):
+            section = section[:-3].rstrip()
+        sections.append((int(m.group(1)), section))
+    return sections
+
+
 def write_outputs(
-    doc_dir: Path,
+    doc_dir: Optional[Path],
     full_markdown: str,
     embed_markdown: str,
     file_name: str,
     sas_urls: List[str],
     fig_meta: List[Dict[str, Any]],
     storage: AzureBlobStorage,
+    blob_prefix: Optional[str] = None,
 ):
-    md_output_path = doc_dir / "markdown.md"
-    md_output_path.write_text(full_markdown, encoding="utf-8")
-    meta_path = doc_dir / "metadata.json"
+    """
+    Upload markdown.md and metadata.json under `{blob_prefix}/` (default doc_dir.name) and,
+    unless doc_dir is None, write them to doc_dir. Returns (local markdown path or None, SAS, SAS).
+    """
+    blob_prefix = blob_prefix or doc_dir.name
+    md_bytes = full_markdown.encode("utf-8")
     preamble: List[str] = []
-    meta_path.write_text(
-        json.dumps(
-            {"file_name": file_name, "sas_urls": sas_urls, "figures": fig_meta, "preamble": preamble},
-            indent=2,
-        ),
-        encoding="utf-8",
+    meta_bytes = json.dumps(
+        {"file_name": file_name, "sas_urls": sas_urls, "figures": fig_meta, "preamble": preamble},
+        indent=2,
+    ).encode("utf-8")
+    md_output_path = None
+    if doc_dir is not None:
+        md_output_path = doc_dir / "markdown.md"
+        md_output_path.write_bytes(md_bytes)
+        (doc_dir / "metadata.json").write_bytes(meta_bytes)
+    # Re-written on every ingest under the same name: no long-lived caching.
+    md_sas, meta_sas = storage.upload_many(
+        [
+            (lambda: md_bytes, f"{blob_prefix}/markdown.md"),
+            (lambda: meta_bytes, f"{blob_prefix}/metadata.json"),
+        ],
+        cache_control="no-cache",
     )
-    md_sas = storage.upload_and_get_sas(md_output_path.read_bytes(), f"{doc_dir.name}/markdown.md")
-    meta_sas = storage.upload_and_get_sas(meta_path.read_bytes(), f"{doc_dir.name}/metadata.json")
     return md_output_path, md_sas, meta_sas
 
@@ -0,0 +1,353 @@
+"""
+Parallel ingest: downloads on a bounded thread pool, docling conversion in a process
+pool (one warm DocumentConverter per worker), results streamed back to the parent
+process for rendering, embedding and upsert as soon as each file is converted.
+Downloads may return bytes or a spooled file path; paths cross the process boundary
+instead of the PDF itself and are removed once their file is done.
+
+Large single PDFs can also be split into page ranges converted by a shared pool of
+warm workers (parse_in_ranges) and merged back in reading order.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from src.text_indexing import profiling
+
+PdfSource = Union[bytes, Path]
+
+_converter = None  # per-worker DocumentConverter
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def ingest_workers() -> int:
+    """Conversion processes (INGEST_WORKERS; 1 keeps the sequential path)."""
+    return max(1, int(os.getenv("INGEST_WORKERS", "1")))
+
+
+def download_workers() -> int:
+    return max(1, int(os.getenv("INGEST_DOWNLOAD_WORKERS", "4")))
+
+
+def parse_workers() -> int:
+    """Processes for page-range conversion of one large PDF (PARSE_WORKERS; 1 = whole-file)."""
+    return max(1, int(os.getenv("PARSE_WORKERS", "1")))
+
+
+def pages_per_range() -> int:
+    return max(1, int(os.getenv("PARSE_PAGES_PER_RANGE", "20")))
+
+
+def parse_min_pages() -> int:
+    """PDFs shorter than this (PARSE_MIN_PAGES) are converted whole: worker start-up would dominate."""
+    return int(os.getenv("PARSE_MIN_PAGES", "40"))
+
+
+def init_converter_worker(threads_per_worker: int = 0) -> None:
+    """Process-pool initializer: cap intra-op threads, then build the worker's converter once."""
+    global _converter
+    if threads_per_worker > 0:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(threads_per_worker)
+    from src.text_indexing.doc_parser import build_converter
+
+    _converter = build_converter()
+
+
+def convert_pdf(pdf: PdfSource, file_name: str) -> Dict[str, Any]:
+    """
+    Worker task: parse one PDF with the warm converter into picklable parse results
+    (text-layer pages via the fast path when FAST_PATH is on, the parse cache first).
+    """
+    from src.text_indexing.doc_parser import parse_document
+    from src.text_indexing.fast_path import fast_path_enabled, parse_hybrid
+    from src.text_indexing.parse_cache import cached_parse
+
+    def parse() -> Tuple[int, List[Dict[str, Any]]]:
+        if fast_path_enabled():
+            total_pages, collected, _report = parse_hybrid(
+                pdf, file_name, lambda first, last: parse_document(_converter, pdf, file_name, (first, last))[1]
+            )
+            return total_pages, collected
+        doc, collected = parse_document(_converter, pdf, file_name)
+        return len(getattr(doc, "pages", []) or []), collected
+
+    start = time.perf_counter()
+    total_pages, collected = cached_parse(pdf, file_name, parse)
+    return {"collected": collected, "total_pages": total_pages, "convert_s": time.perf_counter() - start}
+
+
+def convert_page_range(pdf: Path, file_name: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Worker task: collected items of pages start..end (1-based, inclusive)."""
+    from src.text_indexing.doc_parser import parse_document
+
+    _doc, collected = parse_document(_converter, pdf, file_name, page_range=(start, end))
+    return collected
+
+
+def page_ranges(total_pages: int, size: int, first_page: int = 1) -> List[Tuple[int, int]]:
+    """Pages first_page..total_pages in ranges of `size` (1-based, inclusive)."""
+    return [(start, min(start + size - 1, total_pages)) for start in range(first_page, total_pages + 1, size)]
+
+
+def merge_ranges(parts: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Concatenate per-range items in page order. idx is re-based so it keeps increasing
+    across ranges; step detection is per item, so build_steps sees the serial sequence.
+    """
+    merged: List[Dict[str, Any]] = []
+    offset = 0
+    for part in parts:
+        for itm in part:
+            merged.append(dict(itm, idx=itm["idx"] + offset))
+        if part:
+            offset = merged[-1]["idx"] + 1
+    return merged
+
+
+_range_pool: Optional[Tuple[int, ProcessPoolExecutor]] = None  # (workers, pool)
+_range_pool_lock = threading.Lock()
+
+
+def _shared_range_pool(workers: int) -> ProcessPoolExecutor:
+    """Warm converter processes kept for the life of the ingest process."""
+    global _range_pool
+    with _range_pool_lock:
+        if _range_pool is None or _range_pool[0] != workers:
+            _drop_range_pool_locked()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_converter_worker,
+                initargs=(threads,),
+            )
+            _range_pool = (workers, pool)
+        return _range_pool[1]
+
+
+def _drop_range_pool_locked() -> None:
+    global _range_pool
+    if _range_pool is not None:
+        _range_pool[1].shutdown(wait=False, cancel_futures=True)
+        _range_pool = None
+
+
+def pdf_page_count(pdf: PdfSource) -> int:
+    import pypdfium2 as pdfium
+
+    doc = pdfium.PdfDocument(str(pdf) if isinstance(pdf, Path) else pdf)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def parse_in_ranges(
+    pdf: Path,
+    file_name: str,
+    total_pages: int,
+    workers: Optional[int] = None,
+    size: Optional[int] = None,
+    pool: Optional[Any] = None,
+    convert_fn: Optional[Callable[[Path, str, int, int], List[Dict[str, Any]]]] = None,
+    first_page: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Convert pages first_page..total_pages of one PDF as page ranges in parallel and return
+    the merged collected items, identical in order to a single conversion. A failed range
+    fails the document.
+    """
+    workers = workers or parse_workers()
+    count = total_pages - first_page + 1
+    size = size or max(1, min(pages_per_range(), -(-count // workers)))
+    ranges = page_ranges(total_pages, size, first_page)
+    shared = pool is None
+    pool = pool or _shared_range_pool(workers)
+    convert_fn = convert_fn or convert_page_range
+    start = time.perf_counter()
+    try:
+        futures = [pool.submit(convert_fn, pdf, file_name, first, last) for first, last in ranges]
+        parts = [fut.result() for fut in futures]
+    except BrokenProcessPool:
+        if shared:  # a crashed worker poisons the pool: start fresh for the next document
+            with _range_pool_lock:
+                _drop_range_pool_locked()
+        raise
+    ts_print(
+        f"Converted {file_name}: {count} page(s) as {len(ranges)} range(s) on {workers} worker(s) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return merge_ranges(parts)
+
+
+def iter_converted(
+    items: List[Tuple[str, str]],
+    download_fn: Callable[[str], PdfSource],
+    workers: int,
+    dl_workers: int,
+    convert_fn: Optional[Callable[[PdfSource, str], Dict[str, Any]]] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Tuple[str, str, Optional[Dict[str, Any]], Optional[BaseException]]]:
+    """
+    Yield (file_id, file_name, parsed, error) for (file_id, file_name) items in completion
+    order. At most max_in_flight files (default 2 per worker) are downloaded or converting
+    at once, which bounds memory. A crashed worker breaks the pool, and every file in flight
+    on it fails with it: the pool is rebuilt for new files, and those suspects are retried
+    one at a time on a separate single-worker pool, so only a file that crashes a worker on
+    its own is reported as failed.
+    """
+    convert_fn = convert_fn or convert_pdf
+    initializer = initializer or init_converter_worker
+    max_in_flight = max_in_flight or workers * 2
+    ctx = multiprocessing.get_context("spawn")  # no forked torch/docling state
+
+    def new_pool(size: int = workers) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=size, mp_context=ctx, initializer=initializer, initargs=initargs)
+
+    pending = deque(items)
+    downloads: Dict[Future, Tuple[str, str]] = {}
+    conversions: Dict[Future, Tuple[str, str, PdfSource]] = {}
+    suspects: deque = deque()  # (file_id, file_name, pdf) in flight when a worker crashed
+    solo: Optional[Tuple[Future, Tuple[str, str, PdfSource]]] = None  # the suspect being retried alone
+    solo_pool: Optional[ProcessPoolExecutor] = None
+    pool = new_pool()
+    with ThreadPoolExecutor(max_workers=dl_workers) as dl_pool:
+        try:
+            while pending or downloads or conversions or suspects or solo:
+                in_flight = len(downloads) + len(conversions) + len(suspects) + (solo is not None)
+                while pending and in_flight < max_in_flight:
+                    file_id, name = pending.popleft()
+                    downloads[dl_pool.submit(download_fn, file_id)] = (file_id, name)
+                    in_flight += 1
+                if solo is None and suspects:
+                    solo_pool = solo_pool or new_pool(1)
+                    file_id, name, pdf = suspects.popleft()
+                    solo = (solo_pool.submit(convert_fn, pdf, name), (file_id, name, pdf))
+                watched = list(downloads) + list(conversions) + ([solo[0]] if solo else [])
+                done, _ = wait(watched, return_when=FIRST_COMPLETED)
+                broken = False
+                orphans: List[Tuple[str, str, PdfSource]] = []  # downloads that met a broken pool
+                if solo is not None and solo[0] in done:
+                    fut, (file_id, name, pdf) = solo
+                    solo = None
+                    try:
+                        parsed, error = fut.result(), None
+                    except BrokenProcessPool:
+                        parsed, error = None, RuntimeError("conversion worker crashed")
+                        solo_pool.shutdown(wait=False, cancel_futures=True)  # type: ignore[union-attr]
+                        solo_pool = None
+                    except Exception as exc:
+                        parsed, error = None, exc
+                    _discard(pdf)
+                    yield file_id, name, parsed, error
+                for fut in done:
+                    if fut in downloads:
+                        file_id, name = downloads.pop(fut)
+                        try:
+                            pdf = fut.result()
+                        except Exception as exc:
+                            yield file_id, name, None, exc
+                            continue
+                        try:
+                            conversions[pool.submit(convert_fn, pdf, name)] = (file_id, name, pdf)
+                        except BrokenProcessPool:
+                            orphans.append((file_id, name, pdf))
+                            broken = True
+                        continue
+                    if fut not in conversions:
+                        continue
+                    file_id, name, pdf = conversions[fut]
+                    try:
+                        parsed = fut.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+                    except Exception as exc:
+                        _discard(conversions.pop(fut)[2])
+                        yield file_id, name, None, exc
+                        continue
+                    _discard(conversions.pop(fut)[2])
+                    yield file_id, name, parsed, None
+                if broken:
+                    # Every in-flight future of a broken pool fails: retry each alone to find the culprit.
+                    suspects.extend(conversions.values())
+                    ts_print(f"Conversion worker crashed; retrying {len(conversions)} in-flight file(s) one at a time")
+                    conversions.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = new_pool()
+                    for file_id, name, pdf in orphans:  # never reached the crashed pool
+                        conversions[pool.submit(convert_fn, pdf, name)] = (file_id, name, pdf)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if solo_pool is not None:
+                solo_pool.shutdown(wait=True, cancel_futures=True)
+            for fut in downloads:  # generator closed early: drop what was still in flight
+                fut.add_done_callback(lambda f: f.exception() is None and _discard(f.result()))
+            leftovers = list(conversions.values()) + list(suspects) + ([solo[1]] if solo else [])
+            for _fid, _name, pdf in leftovers:
+                _discard(pdf)
+
+
+def _discard(pdf: PdfSource) -> None:
+    """Remove a spooled download once its file is finished (bytes need no cleanup)."""
+    if isinstance(pdf, Path):
+        pdf.unlink(missing_ok=True)
+
+
+def ingest_files_parallel(
+    ingestor: Any,
+    items: List[Tuple[str, str]],
+    download_fn: Callable[[str], PdfSource],
+    workers: Optional[int] = None,
+    dl_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Convert (file_id, file_name) items in parallel and index each result with
+    ingestor.index_parsed as it arrives. One file's failure never stops the batch.
+    """
+    workers = workers or ingest_workers()
+    dl_workers = dl_workers or download_workers()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ts_print(
+        f"Parallel ingest of {len(items)} PDF(s): {workers} converter process(es), {dl_workers} download thread(s)"
+    )
+
+    start = time.perf_counter()
+    ok_count, errors = 0, []
+    for file_id, name, parsed, error in iter_converted(
+        items, download_fn, workers, dl_workers, initargs=(threads,)
+    ):
+        if error is None:
+            try:
+                ts_print(f"Indexing {name} (converted in {parsed['convert_s']:.1f}s)")
+                with profiling.document(name):
+                    profiling.add_stage("parse", parsed["convert_s"])  # in a converter process: wall time only
+                    profiling.count("pages", parsed["total_pages"])
+                    ingestor.index_parsed(
+                        parsed["collected"], name, total_pages=parsed["total_pages"], doc_id=file_id
+                    )
+                ok_count += 1
+                continue
+            except Exception as exc:
+                error = exc
+        errors.append(f"{name}: {error}")
+        ts_print(f"Failed {name}: {error}")
+    elapsed = time.perf_counter() - start
+    ts_print(f"Parallel ingest done: {ok_count} ok, {len(errors)} failed in {elapsed:.1f}s")
+    return {"processed": ok_count, "failed": len(errors), "errors": errors, "elapsed_s": elapsed}
@@ -0,0 +1,180 @@
+"""
+Local cache of parse results keyed by PDF content hash + parse-options hash, so
+changes downstream of parsing (step grouping, markdown rendering, embeddings) re-run
+without a docling re-conversion. An entry is one zip: items.json (the `collected`
+items, pictures replaced by file references) plus the picture crops as PNG.
+Least recently used entries are evicted beyond PARSE_CACHE_MAX_MB. Pictures read from
+an entry are decoded lazily, when a figure is encoded for upload.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+CACHE_FORMAT = 1  # bump when the entry layout or the collected item shape changes
+
+Parsed = Tuple[int, List[Dict[str, Any]]]
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def _docling_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("docling")
+    except Exception:
+        return ""
+
+
+@lru_cache(maxsize=1)
+def _docling_options() -> Optional[Dict[str, Any]]:
+    """The PdfPipelineOptions build_converter() really uses (None without docling)."""
+    try:
+        from .doc_parser import pipeline_options
+    except ImportError:
+        return None
+    return json.loads(json.dumps(pipeline_options().model_dump(mode="json"), sort_keys=True, default=str))
+
+
+@lru_cache(maxsize=1)
+def _code_fingerprint() -> str:
+    """Source hash of the modules that produce `collected` items (docling walk + text-layer fast path)."""
+    digest = hashlib.sha256()
+    for name in ("doc_parser.py", "fast_path.py"):
+        digest.update(Path(__file__).with_name(name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def options_hash() -> str:
+    """Everything that changes parse output: docling version and options, parser code, fast-path settings."""
+    from .fast_path import IMAGES_SCALE, _thresholds, fast_path_enabled
+
+    options = {
+        "format": CACHE_FORMAT,
+        "docling": _docling_version(),
+        "pipeline": _docling_options(),
+        "code": _code_fingerprint(),
+        "fast_path": {"images_scale": IMAGES_SCALE, **_thresholds()} if fast_path_enabled() else None,
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ParseCache:
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str, options: str) -> Path:
+        return self.root / f"{digest}-{options}.zip"
+
+    def get(self, digest: str, options: Optional[str] = None) -> Optional[Parsed]:
+        path = self._path(digest, options or options_hash())
+        try:
+            with zipfile.ZipFile(path) as zf:
+                meta = json.loads(zf.read("items.json"))
+                collected = []
+                for itm in meta["items"]:
+                    if "image_file" in itm:
+                        from PIL import Image
+
+                        # Decoded lazily: only the PNG bytes are held until a figure is encoded.
+                        itm["image"] = Image.open(io.BytesIO(zf.read(itm.pop("image_file"))))
+                    collected.append(itm)
+        except (FileNotFoundError, KeyError, zipfile.BadZipFile, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)  # recency for eviction
+        except FileNotFoundError:
+            pass
+        return meta["total_pages"], collected
+
+    def put(
+        self, digest: str, total_pages: int, collected: List[Dict[str, Any]], options: Optional[str] = None
+    ) -> None:
+        path = self._path(digest, options or options_hash())
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".entry-", suffix=".zip")
+        try:
+            with os.fdopen(fd, "wb") as fh, zipfile.ZipFile(fh, "w") as zf:
+                items = []
+                for n, itm in enumerate(collected):
+                    if itm.get("image") is not None:
+                        buf = io.BytesIO()
+                        itm["image"].save(buf, format="PNG")
+                        name = f"images/{n:05d}.png"
+                        zf.writestr(name, buf.getvalue(), compress_type=zipfile.ZIP_STORED)  # already compressed
+                        itm = {**{k: v for k, v in itm.items() if k != "image"}, "image_file": name}
+                    items.append(itm)
+                zf.writestr(
+                    "items.json",
+                    json.dumps({"total_pages": total_pages, "items": items}),
+                    compress_type=zipfile.ZIP_DEFLATED,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits max_bytes; returns how many."""
+        entries = []
+        for path in self.root.glob("*.zip"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # evicted by another worker
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+@lru_cache(maxsize=1)
+def get_parse_cache() -> Optional[ParseCache]:
+    """Process-wide cache (PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB; 0 MB disables it)."""
+    max_mb = float(os.getenv("PARSE_CACHE_MAX_MB", "2048"))
+    if max_mb <= 0:
+        return None
+    return ParseCache(Path(os.getenv("PARSE_CACHE_DIR", ".cache/parsed")), int(max_mb * 1024 * 1024))
+
+
+def cached_parse(pdf: Union[bytes, Path], file_name: str, parse_fn: Callable[[], Parsed]) -> Parsed:
+    """parse_fn() result for this PDF, from the cache when the same content was parsed before."""
+    cache = get_parse_cache()
+    if cache is None:
+        return parse_fn()
+    from .incremental import content_hash
+
+    digest, options = content_hash(pdf), options_hash()
+    hit = cache.get(digest, options)
+    if hit is not None:
+        ts_print(f"Parse cache hit for {file_name} ({hit[0]} page(s), {len(hit[1])} item(s))")
+        return hit
+    total_pages, collected = parse_fn()
+    try:
+        cache.put(digest, total_pages, collected, options)
+    except OSError as exc:
+        ts_print(f"Could not cache parse of {file_name}: {exc}")
+        return total_pages, collected
+    # Re-read the entry: figures come back as PNG bytes, so the full-size bitmaps can go.
+    return cache.get(digest, options) or (total_pages, collected)
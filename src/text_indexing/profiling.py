@@ -0,0 +1,281 @@
+"""
+Per-stage ingest profiling: wall and CPU time per stage (parse, figures, encode, upload,
+sas, write_outputs, embed, qdrant), pages, figures, bytes uploaded, points written and
+the process peak RSS, per document and for the whole run. The report is written as JSON next to
+the exports; INGEST_PROFILE_CAPTURE=cprofile|pyinstrument also keeps a profile of the
+slowest document.
+
+Stages are recorded through stage()/count(), which do nothing outside profiling(), so
+the instrumented modules cost nothing when no run is being profiled. The active run and
+document are context variables, so concurrent ingests (server or worker threads) each
+get their own report. Work handed to a thread pool is attributed through bind(), which
+runs it in the submitting context: encode, upload and sas run on upload threads and
+batched qdrant upserts on writer threads, so their times are summed across threads and
+can exceed the wall time of the enclosing stage. Batched index writes count towards the
+document being indexed when a batch fills, or towards `run` when flushed at the end.
+
+ru_maxrss cannot be reset, so `process_peak_rss_mb` on a document is the process high
+water mark when that document finished, not the document's own peak.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+THREADED_STAGES = ("encode", "upload", "sas", "qdrant")
+
+_active: contextvars.ContextVar[Optional["IngestProfile"]] = contextvars.ContextVar("ingest_profile", default=None)
+_document: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("ingest_document", default=None)
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def profile_enabled() -> bool:
+    return os.getenv("INGEST_PROFILE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def profile_dir() -> Path:
+    return Path(os.getenv("INGEST_PROFILE_DIR", "markdown_exports"))
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB elsewhere
+
+
+def _new_record(name: str) -> Dict[str, Any]:
+    return {"file_name": name, "stages": {}, "counters": {}}
+
+
+def _rounded(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a record with stage times rounded for the report (the live record keeps full precision)."""
+    stages = {
+        name: {**entry, "wall_s": round(entry["wall_s"], 3), "cpu_s": round(entry["cpu_s"], 3)}
+        for name, entry in record["stages"].items()
+    }
+    return {**record, "stages": stages, "counters": dict(record["counters"])}
+
+
+class IngestProfile:
+    """Collects one run: a record per document plus `run` for work shared by documents."""
+
+    def __init__(self, out_dir: Optional[Path] = None, capture: Optional[str] = None) -> None:
+        self.out_dir = Path(out_dir or profile_dir())
+        self.capture = capture if capture is not None else (os.getenv("INGEST_PROFILE_CAPTURE") or "").lower()
+        self.documents: List[Dict[str, Any]] = []
+        self.run = _new_record("(run)")  # e.g. batched embedding/upserts flushed after the documents
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._lock = threading.Lock()
+        self._slowest: Optional[tuple] = None  # (wall_s, file_name, profiler)
+
+    @contextmanager
+    def document(self, file_name: str) -> Iterator[Dict[str, Any]]:
+        """Attribute stages to one document; nested calls (index_pdf -> index_parsed) share it."""
+        current = _document.get()
+        if current is not None:
+            yield current
+            return
+        record = _new_record(file_name)
+        profiler = self._start_capture()
+        start, cpu = time.perf_counter(), time.process_time()
+        token = _document.set(record)
+        try:
+            yield record
+            record["ok"] = True
+        except BaseException as exc:
+            record["ok"], record["error"] = False, str(exc)
+            raise
+        finally:
+            _document.reset(token)
+            record["wall_s"] = round(time.perf_counter() - start, 3)
+            record["cpu_s"] = round(time.process_time() - cpu, 3)
+            record["process_peak_rss_mb"] = peak_rss_mb()
+            if profiler is not None:
+                if self.capture == "pyinstrument":
+                    profiler.stop()
+                else:
+                    profiler.disable()
+                if self._slowest is None or record["wall_s"] > self._slowest[0]:
+                    self._slowest = (record["wall_s"], file_name, profiler)
+            with self._lock:
+                self.documents.append(record)
+
+    def _start_capture(self) -> Any:
+        if self.capture == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                ts_print("pyinstrument is not installed; falling back to cProfile")
+                self.capture = "cprofile"
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        if self.capture == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        return None
+
+    def add_stage(self, name: str, wall_s: float, cpu_s: Optional[float] = None) -> None:
+        with self._lock:
+            record = _document.get() or self.run
+            entry = record["stages"].setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            entry["wall_s"] += wall_s
+            entry["cpu_s"] += cpu_s or 0.0
+            entry["calls"] += 1
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            counters = (_document.get() or self.run)["counters"]
+            counters[name] = counters.get(name, 0) + n
+
+    def report(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {"stages": {}, "counters": {}}
+        for record in self.documents + [self.run]:
+            for name, entry in record["stages"].items():
+                total = totals["stages"].setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+                for key in total:
+                    total[key] += entry[key]
+            for name, n in record["counters"].items():
+                totals["counters"][name] = totals["counters"].get(name, 0) + n
+        totals = _rounded(totals)
+        totals.update(
+            documents=len(self.documents),
+            failed=sum(1 for d in self.documents if not d.get("ok")),
+            wall_s=round(time.perf_counter() - self._start, 3),
+            cpu_s=round(time.process_time() - self._cpu_start, 3),
+            process_peak_rss_mb=peak_rss_mb(),
+        )
+        slowest = max(self.documents, key=lambda d: d["wall_s"], default=None)
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "threaded_stages": list(THREADED_STAGES),
+            "slowest": slowest["file_name"] if slowest else None,
+            "totals": totals,
+            "run": _rounded(self.run),
+            "documents": [_rounded(d) for d in self.documents],
+        }
+
+    def write(self) -> Path:
+        """Write the JSON report (and the slowest document's profile, if captured)."""
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"ingest_profile_{stamp}.json"
+        report = self.report()
+        if self._slowest is not None:
+            _wall, file_name, profiler = self._slowest
+            if self.capture == "pyinstrument":
+                capture = path.with_suffix(".html")
+                capture.write_text(profiler.output_html(), encoding="utf-8")
+            else:
+                capture = path.with_suffix(".prof")
+                profiler.dump_stats(str(capture))
+            report["slowest_profile"] = {"file_name": file_name, "path": str(capture)}
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        return path
+
+    def summary(self) -> str:
+        totals = self.report()["totals"]
+        stages = ", ".join(
+            f"{name} {entry['wall_s']:.1f}s"
+            for name, entry in sorted(totals["stages"].items(), key=lambda kv: -kv[1]["wall_s"])
+        )
+        return (
+            f"{totals['documents']} document(s) in {totals['wall_s']:.1f}s "
+            f"(cpu {totals['cpu_s']:.1f}s, process peak RSS {totals['process_peak_rss_mb']} MB): "
+            f"{stages or 'no stages'}"
+        )
+
+
+@contextmanager
+def profiling(out_dir: Optional[Path] = None, capture: Optional[str] = None) -> Iterator[Optional[IngestProfile]]:
+    """Profile an ingest run (INGEST_PROFILE=0 turns it off); the report is written on exit."""
+    if not profile_enabled() or _active.get() is not None:
+        yield _active.get()
+        return
+    profile = IngestProfile(out_dir, capture)
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+        try:
+            path = profile.write()
+            ts_print(f"Ingest profile: {profile.summary()} -> {path}")
+        except OSError as exc:
+            ts_print(f"Could not write ingest profile: {exc}")
+
+
+def profiled(fn: Callable) -> Callable:
+    """Run an ingest entry point inside profiling() (nested entry points share the outer run)."""
+
+    @wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with profiling():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def bind(fn: Callable) -> Callable:
+    """fn running in the caller's profiling context, for work submitted to another thread."""
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(fn, *args, **kwargs)  # one copy per call: pools run calls concurrently
+
+    return run
+
+
+def document(file_name: str) -> Any:
+    profile = _active.get()
+    return profile.document(file_name) if profile is not None else nullcontext()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage. Threaded stages (upload/writer threads) measure the thread's own CPU time."""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    clock = time.thread_time if name in THREADED_STAGES else time.process_time
+    start, cpu = time.perf_counter(), clock()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - start, clock() - cpu)
+
+
+def add_stage(name: str, wall_s: float, cpu_s: Optional[float] = None) -> None:
+    profile = _active.get()
+    if profile is not None:
+        profile.add_stage(name, wall_s, cpu_s)
+
+
+def count(name: str, n: float = 1) -> None:
+    profile = _active.get()
+    if profile is not None:
+        profile.count(name, n)
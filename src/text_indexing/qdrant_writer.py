@@ -1,18 +1,336 @@
 from __future__ import annotations
 
+import os
+import threading
+import time
 import uuid
-from typing import Dict, Any
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
+from . import profiling
+from .utils import strip_urls_for_embed
 
-def upsert_markdown(client: QdrantClient, collection: str, embed_model, embed_markdown: str, payload: Dict[str, Any]):
-    vec = embed_model.get_text_embedding(embed_markdown)
-    point = models.PointStruct(
-        id=str(uuid.uuid4()),
-        vector=vec,
-        payload=payload,
-    )
+# Payload fields used in filters (routing, per-document lookups, neighbour steps).
+PAYLOAD_INDEXES = {
+    "doc_id": models.PayloadSchemaType.KEYWORD,
+    "file_name": models.PayloadSchemaType.KEYWORD,
+    "doc_type": models.PayloadSchemaType.KEYWORD,
+    "doc_version": models.PayloadSchemaType.INTEGER,
+    "step": models.PayloadSchemaType.INTEGER,
+    "current": models.PayloadSchemaType.BOOL,
+}
+POINT_NAMESPACE = uuid.UUID("0c5bd6f2-7f0e-4a55-9d3c-1440a7e0b9d4")
+
+
+def ts_print(msg: str) -> None:
+    """Timestamped stdout helper."""
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def embed_batch_size() -> int:
+    """Texts per embedding call when chunks are accumulated across documents (INGEST_EMBED_BATCH)."""
+    return max(1, int(os.getenv("INGEST_EMBED_BATCH", "64")))
+
+
+def upsert_batch_size() -> int:
+    return max(1, int(os.getenv("QDRANT_UPSERT_BATCH", "256")))
+
+
+def upsert_parallel() -> int:
+    """Upsert requests in flight at once (QDRANT_UPSERT_PARALLEL)."""
+    return max(1, int(os.getenv("QDRANT_UPSERT_PARALLEL", "4")))
+
+
+def point_id(doc_id: str, chunk_index: int, doc_version: int) -> str:
+    """Deterministic point id: re-writing the same chunk of the same version overwrites it."""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{doc_id}:{doc_version}:{chunk_index}"))
+
+
+def ensure_payload_indexes(client: QdrantClient, collection: str) -> None:
+    """Create the keyword/integer payload indexes that filtered searches rely on (idempotent)."""
+    info = client.get_collection(collection)
+    existing = set((getattr(info, "payload_schema", None) or {}).keys())
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            client.create_payload_index(collection_name=collection, field_name=field, field_schema=schema)
+
+
+def upsert_markdown(
+    client: QdrantClient,
+    collection: str,
+    embed_model,
+    embed_markdown: str,
+    payload: Dict[str, Any],
+    vec: Optional[List[float]] = None,
+) -> str:
+    """
+    Whole-document point (chunk 0); id derived from payload doc_id (or file_name) + doc_version.
+    Pass vec to reuse an embedding computed earlier (checkpointed ingest jobs).
+    """
+    vec = vec if vec is not None else embed_model.get_text_embedding(embed_markdown)
+    point = models.PointStruct(id=markdown_point_id(payload), vector=vec, payload=payload)
     client.upsert(collection_name=collection, points=[point])
+    return str(point.id)
+
+
+def markdown_point_id(payload: Dict[str, Any]) -> str:
+    return point_id(payload.get("doc_id") or payload["file_name"], 0, payload.get("doc_version") or 0)
+
+
+def upsert_steps(
+    client: QdrantClient,
+    collection: str,
+    embed_model,
+    steps: List[Tuple[int, str]],
+    base_payload: Dict[str, Any],
+    vectors: Optional[List[List[float]]] = None,
+) -> List[str]:
+    """
+    One "markdown_step" point per step section (chunks 1..n), carrying the document
+    identity from base_payload (doc_id, file_name, doc_version) so steps can be
+    filtered and fetched as neighbours of a hit. vectors, when given, are the
+    precomputed embeddings of the steps in order.
+    """
+    if not steps:
+        return []
+    chunks = step_chunks(steps, base_payload)
+    vecs = vectors if vectors is not None else embed_model.get_text_embedding_batch([t for _, t, _ in chunks])
+    points = [models.PointStruct(id=pid, vector=vec, payload=payload) for (pid, _, payload), vec in zip(chunks, vecs)]
+    client.upsert(collection_name=collection, points=points)
+    return [str(p.id) for p in points]
+
+
+def step_chunks(steps: List[Tuple[int, str]], base_payload: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(point id, text to embed, payload) per step section, chunk indexes 1..n."""
+    doc_id = base_payload.get("doc_id") or base_payload["file_name"]
+    version = base_payload.get("doc_version") or 0
+    chunks = []
+    for idx, (step_no, md) in enumerate(steps, start=1):
+        text = strip_urls_for_embed(md)
+        payload = {**base_payload, "doc_type": "markdown_step", "step": step_no, "text": text, "llm_markdown": md}
+        chunks.append((point_id(doc_id, idx, version), text, payload))
+    return chunks
+
+
+def _doc_condition(doc_id: str, file_name: Optional[str] = None) -> models.Filter:
+    """Points of one document, including legacy points of the same file written without doc_id."""
+    should: List[Any] = [models.FieldCondition(key="doc_id", match=models.MatchValue(value=doc_id))]
+    if file_name:
+        should.append(
+            models.Filter(
+                must=[
+                    models.FieldCondition(key="file_name", match=models.MatchValue(value=file_name)),
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key="doc_id")),
+                ]
+            )
+        )
+    return models.Filter(should=should)
+
+
+def replace_document(
+    client: QdrantClient, collection: str, doc_id: str, doc_version: int, file_name: Optional[str] = None
+) -> None:
+    """
+    Atomic swap to a freshly written version: its points (written with current=False,
+    invisible to search) are flipped to current=True, then every other version of the
+    document is deleted in one filtered request. Readers never see zero copies; for the
+    instant between the two calls they may see both, which per-file dedupe absorbs.
+    """
+    version_match = models.FieldCondition(key="doc_version", match=models.MatchValue(value=doc_version))
+    client.set_payload(
+        collection_name=collection,
+        payload={"current": True},
+        points=models.Filter(
+            must=[models.FieldCondition(key="doc_id", match=models.MatchValue(value=doc_id)), version_match]
+        ),
+        wait=True,
+    )
+    client.delete(
+        collection_name=collection,
+        points_selector=models.FilterSelector(
+            filter=models.Filter(must=[_doc_condition(doc_id, file_name)], must_not=[version_match])
+        ),
+        wait=True,
+    )
+
+
+def delete_points(client: QdrantClient, collection: str, point_ids: List[str]) -> None:
+    if point_ids:
+        client.delete(collection_name=collection, points_selector=models.PointIdsList(points=point_ids))
+
+
+class BatchWriteError(RuntimeError):
+    """Some batched writes failed; `failed` holds the affected document keys (None: unknown)."""
+
+    def __init__(self, failed: Set[Optional[str]], errors: List[BaseException]) -> None:
+        names = ", ".join(sorted(str(doc) for doc in failed)) or "unknown"
+        super().__init__(f"{len(errors)} batched write(s) failed for {names}: {errors[0]}")
+        self.failed = failed
+        self.errors = errors
+
+
+class BatchedQdrantWriter:
+    """
+    Bulk writes across documents. Chunks are embedded in batches of embed_batch texts and
+    upserted in batches of upsert_batch points with wait=False, at most `parallel` requests
+    in flight. flush() is the consistency barrier: it waits until every request has been
+    acknowledged, confirms each collection with a wait=True write (applied in order after
+    the acknowledged ones), then runs the after_flush callbacks, e.g. replace_document
+    for documents whose points are now all in place.
+
+    Points and callbacks carry the key of their document (`doc`). A failed embedding or
+    upsert marks the documents in that batch as failed: their callbacks never run, so
+    their previous versions stay current, while the other documents are swapped in as
+    usual. Failures never surface from add(); flush() raises BatchWriteError at the end.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embed_model: Any,
+        embed_batch: Optional[int] = None,
+        upsert_batch: Optional[int] = None,
+        parallel: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.embed_model = embed_model
+        self.embed_batch = embed_batch or embed_batch_size()
+        self.upsert_batch = upsert_batch or upsert_batch_size()
+        self.parallel = parallel or upsert_parallel()
+        # (collection, id, text, payload, doc)
+        self._pending: List[Tuple[str, str, str, Dict[str, Any], Optional[str]]] = []
+        self._ready: Dict[str, List[Tuple[models.PointStruct, Optional[str]]]] = {}
+        self._last: Dict[str, models.PointStruct] = {}  # last acknowledged point per collection
+        self._inflight: Dict[Future, Set[Optional[str]]] = {}
+        self._callbacks: List[Tuple[Callable[[], Any], Optional[str]]] = []
+        self._failed: Set[Optional[str]] = set()
+        self._errors: List[BaseException] = []  # sticky until flush() reports them
+        self._pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="qdrant-upsert")
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self.stats = {"chunks": 0, "requests": 0, "embed_s": 0.0, "upsert_s": 0.0}
+
+    def add(
+        self,
+        collection: str,
+        pid: str,
+        text: str,
+        payload: Dict[str, Any],
+        vector: Optional[List[float]] = None,
+        doc: Optional[str] = None,
+    ) -> None:
+        """Queue one point of document `doc`; text is embedded with the next batch unless vector is given."""
+        if self._started is None:
+            self._started = time.perf_counter()
+        if vector is not None:
+            self._queue_point(collection, models.PointStruct(id=pid, vector=vector, payload=payload), doc)
+            return
+        self._pending.append((collection, pid, text, payload, doc))
+        if len(self._pending) >= self.embed_batch:
+            self._embed_pending()
+
+    def after_flush(self, fn: Callable[[], Any], doc: Optional[str] = None) -> None:
+        """Run fn after the flush that confirms document `doc` (skipped if any of its writes failed)."""
+        self._callbacks.append((fn, doc))
+
+    def _fail(self, docs: Set[Optional[str]], exc: BaseException) -> None:
+        ts_print(f"Batched write failed for {', '.join(sorted(str(d) for d in docs))}: {exc}")
+        self._failed |= docs
+        self._errors.append(exc)
+
+    def _embed_pending(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            with profiling.stage("embed"):
+                vecs = self.embed_model.get_text_embedding_batch([text for _, _, text, _, _ in batch])
+        except Exception as exc:
+            self._fail({doc for *_, doc in batch}, exc)
+            return
+        self.stats["embed_s"] += time.perf_counter() - start
+        for (collection, pid, _text, payload, doc), vec in zip(batch, vecs):
+            point = models.PointStruct(id=pid, vector=[float(x) for x in vec], payload=payload)
+            self._queue_point(collection, point, doc)
+
+    def _queue_point(self, collection: str, point: models.PointStruct, doc: Optional[str]) -> None:
+        ready = self._ready.setdefault(collection, [])
+        ready.append((point, doc))
+        if len(ready) >= self.upsert_batch:
+            self._send(collection)
+
+    def _send(self, collection: str) -> None:
+        batch = self._ready.pop(collection, [])
+        if not batch:
+            return
+        while len(self._inflight) >= self.parallel:  # backpressure: bounded requests (and memory)
+            done, _rest = wait(list(self._inflight), return_when=FIRST_COMPLETED)
+            self._collect(done)
+        points = [point for point, _ in batch]
+        self._inflight[self._pool.submit(profiling.bind(self._upsert), collection, points)] = {doc for _, doc in batch}
+
+    def _collect(self, done: Any) -> None:
+        for fut in done:
+            docs = self._inflight.pop(fut)
+            exc = fut.exception()
+            if exc is not None:
+                self._fail(docs, exc)
+
+    def _upsert(self, collection: str, points: List[models.PointStruct]) -> None:
+        start = time.perf_counter()
+        with profiling.stage("qdrant"):
+            self.client.upsert(collection_name=collection, points=points, wait=False)
+        profiling.count("points", len(points))
+        with self._lock:
+            self._last[collection] = points[-1]
+            self.stats["upsert_s"] += time.perf_counter() - start
+            self.stats["requests"] += 1
+            self.stats["chunks"] += len(points)
+
+    def flush(self) -> Dict[str, Any]:
+        """
+        Embed and send everything queued, wait for it to be applied and run the callbacks
+        of the documents written in full. Raises BatchWriteError if any write failed.
+        """
+        self._embed_pending()
+        for collection in list(self._ready):
+            self._send(collection)
+        self._collect(list(self._inflight))  # Future.exception() waits for completion
+        last, self._last = self._last, {}
+        for collection, point in last.items():
+            try:
+                self.client.upsert(collection_name=collection, points=[point], wait=True)
+            except Exception as exc:  # nothing in this collection is confirmed
+                self._fail({doc for _fn, doc in self._callbacks}, exc)
+        failed, errors = self._failed, self._errors
+        callbacks, self._callbacks, self._failed, self._errors = self._callbacks, [], set(), []
+        for fn, doc in callbacks:
+            if doc in failed or (doc is None and errors):
+                continue
+            try:
+                fn()
+            except Exception as exc:
+                failed.add(doc)
+                errors.append(exc)
+
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        report = dict(self.stats, elapsed_s=elapsed, chunks_per_s=self.stats["chunks"] / elapsed if elapsed else 0.0)
+        if self.stats["chunks"]:
+            ts_print(
+                f"Wrote {report['chunks']} chunk(s) in {report['requests']} request(s): "
+                f"{report['chunks_per_s']:.0f} chunks/s "
+                f"(embed {report['embed_s']:.1f}s, upsert {report['upsert_s']:.1f}s)"
+            )
+        if errors:
+            raise BatchWriteError(failed, errors)
+        return report
 
+    def close(self) -> Dict[str, Any]:
+        try:
+            return self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 STEP_WORDS = {
     "one": 1,
@@ -16,6 +16,7 @@ STEP_WORDS = {
     "ten": 10,
 }
 STEP_RE = re.compile(r"\bstep\s*(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b", re.IGNORECASE)
+OnImage = Callable[[Dict[str, Any], Optional[int]], Dict[str, Any]]  # (item, step_no) -> item
 
 
 def detect_step_number(text: str) -> Optional[int]:
@@ -28,8 +29,20 @@ def detect_step_number(text: str) -> Optional[int]:
     return STEP_WORDS.get(value)
 
 
-def build_steps(collected: List[Dict[str, Any]]):
-    """Group collected items into ordered steps preserving encounter order."""
+def step_title(step_no: int, content: List[Dict[str, Any]]) -> str:
+    """Title used for a step heading: first line of its first text item."""
+    texts = [c["text"] for c in content if c.get("type") == "text"]
+    return texts[0].split("\n")[0].strip() if texts else f"Step {step_no}"
+
+
+def build_steps(collected: Iterable[Dict[str, Any]], on_image: Optional[OnImage] = None):
+    """
+    Group collected items into ordered steps preserving encounter order. Items are read
+    once, so collected may be a generator. on_image(itm, step_no) is called for each
+    image as it is read (step_no None for preamble images, which are prefixed to the
+    lowest step) and its return value replaces the item, e.g. a reference to the already
+    uploaded figure.
+    """
     preamble_content: List[Dict[str, Any]] = []
     steps: Dict[int, Dict[str, List[Dict[str, Any]]]] = {}
     current_step: Optional[int] = None
@@ -49,6 +62,8 @@ def build_steps(collected: List[Dict[str, Any]]):
                     steps[current_step]["content"].append({"type": "text", "text": itm["text"]})
         elif itm["type"] == "image":
             assoc = itm["step"] if itm.get("step") is not None else current_step
+            if on_image is not None:
+                itm = on_image(itm, assoc)
             if assoc is None:
                 preamble_content.append(itm)
             else:
@@ -67,4 +82,3 @@ def build_steps(collected: List[Dict[str, Any]]):
 
     ordered_steps = sorted(steps.items(), key=lambda kv: kv[0])
     return ordered_steps
-
@@ -1,8 +1,25 @@
 from __future__ import annotations
 
+import mimetypes
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from azure.storage.blob import BlobServiceClient, BlobSasPermissions, ContentSettings, generate_blob_sas
+
+from . import profiling
+
+# Content-addressed blobs (shared figures named by the hash of their bytes) never change
+# under their name, so they can be cached for as long as the SAS is valid.
+IMAGE_CACHE_CONTROL = os.getenv("AZURE_BLOB_CACHE_CONTROL", "public, max-age=2592000, immutable")
+# Any other name may be overwritten with new bytes (per-manual figures with FIGURE_DEDUP=0,
+# the figure GC marker): caches must revalidate.
+MUTABLE_CACHE_CONTROL = os.getenv("AZURE_BLOB_MUTABLE_CACHE_CONTROL", "no-cache")
+
+
+def upload_workers() -> int:
+    return max(1, int(os.getenv("AZURE_UPLOAD_WORKERS", "8")))
 
 
 class AzureBlobStorage:
@@ -18,24 +35,91 @@ class AzureBlobStorage:
         except Exception:
             pass
 
-    def upload_and_get_sas(self, data: bytes, blob_name: str, days: int = 30) -> str:
+    def upload_and_get_sas(
+        self,
+        data: bytes,
+        blob_name: str,
+        days: int = 30,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = MUTABLE_CACHE_CONTROL,
+    ) -> str:
+        """Upload (overwriting) and sign a SAS URL. Pass IMAGE_CACHE_CONTROL only for content-addressed names."""
+        blob_client = self.service.get_blob_client(container=self.container, blob=blob_name)
+        content_type = content_type or mimetypes.guess_type(blob_name)[0] or "application/octet-stream"
+        with profiling.stage("upload"):
+            blob_client.upload_blob(
+                data,
+                overwrite=True,
+                content_settings=ContentSettings(content_type=content_type, cache_control=cache_control),
+            )
+        profiling.count("bytes_uploaded", len(data))
+        return self.sas_url(blob_name, days=days)
+
+    def sas_url(self, blob_name: str, days: int = 30) -> str:
+        """Read-only SAS URL for an existing blob (signed locally, no round trip)."""
+        with profiling.stage("sas"):
+            blob_client = self.service.get_blob_client(container=self.container, blob=blob_name)
+            sas = generate_blob_sas(
+                account_name=self.service.account_name,
+                account_key=self._account_key(),
+                container_name=self.container,
+                blob_name=blob_name,
+                permission=BlobSasPermissions(read=True),
+                expiry=datetime.utcnow() + timedelta(days=days),
+                start=datetime.utcnow() - timedelta(minutes=5),
+            )
+        return f"{blob_client.url}?{sas}"
+
+    def exists(self, blob_name: str) -> bool:
+        return self.service.get_blob_client(container=self.container, blob=blob_name).exists()
+
+    def last_modified(self, blob_name: str) -> Optional[datetime]:
+        """Last-Modified of a blob, None when it does not exist."""
+        from azure.core.exceptions import ResourceNotFoundError
+
         blob_client = self.service.get_blob_client(container=self.container, blob=blob_name)
-        blob_client.upload_blob(data, overwrite=True)
-        account_name = self.service.account_name
-        account_key = self._account_key()
-        sas = generate_blob_sas(
-            account_name=account_name,
-            account_key=account_key,
-            container_name=self.container,
-            blob_name=blob_name,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(days=days),
-            start=datetime.utcnow() - timedelta(minutes=5),
-        )
-        return (
-            f"https://{self.service.account_name}.blob.core.windows.net/"
-            f"{self.container}/{blob_name}?{sas}"
-        )
+        try:
+            return blob_client.get_blob_properties().last_modified
+        except ResourceNotFoundError:
+            return None
+
+    def list_blobs(self, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        """(name, last modified) of every blob whose name starts with prefix."""
+        container = self.service.get_container_client(self.container)
+        for blob in container.list_blobs(name_starts_with=prefix):
+            yield blob.name, blob.last_modified
+
+    def upload_many(
+        self,
+        jobs: Sequence[Tuple[Callable[[], bytes], str]],
+        max_workers: Optional[int] = None,
+        **upload_kwargs,
+    ) -> List[str]:
+        """
+        Upload (produce_bytes, blob_name) jobs on a bounded thread pool; the byte producer
+        (e.g. image encoding) runs in the worker too. SAS URLs come back in job order.
+        """
+        if not jobs:
+            return []
+
+        def run(job: Tuple[Callable[[], bytes], str]) -> str:
+            produce, blob_name = job
+            return self.upload_and_get_sas(produce(), blob_name, **upload_kwargs)
+
+        workers = min(max_workers or upload_workers(), len(jobs))
+        if workers == 1:
+            return [run(job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(profiling.bind(run), jobs))
+
+    def delete_blobs(self, blob_names: Sequence[str]) -> None:
+        """Best-effort delete (missing blobs are ignored)."""
+        container = self.service.get_container_client(self.container)
+        for name in blob_names:
+            try:
+                container.delete_blob(name)
+            except Exception:
+                pass
 
     def _account_key(self) -> str:
         # 1) explicit env var
@@ -4,31 +4,55 @@ import asyncio
 from typing import Any, Dict
 from datetime import datetime
 
-from src.orchestration.agent import build_1440_agent
+from src.orchestration.agent import get_1440_agent
 
 
 def ts_print(msg: str) -> None:
     print(f"[{datetime.now().isoformat()}] {msg}")
 
 
+def _to_payload(result: Any) -> Dict[str, Any]:
+    if hasattr(result, "model_dump"):
+        return result.model_dump()
+    if isinstance(result, dict):
+        return result
+    return {"answer_markdown": str(result)}
+
+
 def run_query(user_query: str) -> Dict[str, Any]:
     """
     Thin wrapper to run the orchestration agent end-to-end.
     """
     try:
         ts_print(f"Running agent for query: {user_query}")
-        agent = build_1440_agent()
+        agent = get_1440_agent()
         # Use the inline run_query helper (no tool-calls)
         result = agent.run_query(user_query)  # type: ignore[attr-defined]
-        payload: Dict[str, Any] = {}
-        if hasattr(result, "model_dump"):
-            payload = result.model_dump()
-        elif isinstance(result, dict):
-            payload = result
-        else:
-            payload = {"answer_markdown": str(result)}
-        return {"ok": True, "message": "Success", **payload}
+        return {"ok": True, "message": "Success", **_to_payload(result)}
     except Exception as exc:
         ts_print(f"Agent error: {exc}")
         return {"ok": False, "message": f"Agent error: {exc}"}
 
+
+async def run_query_async(user_query: str) -> Dict[str, Any]:
+    """
+    Async variant of run_query; many calls can be awaited concurrently against the
+    single process-wide agent (e.g. ``asyncio.gather(*(run_query_async(q) for q in qs))``).
+    """
+    try:
+        ts_print(f"Running agent (async) for query: {user_query}")
+        agent = get_1440_agent()
+        result = await agent.run_query_async(user_query)  # type: ignore[attr-defined]
+        return {"ok": True, "message": "Success", **_to_payload(result)}
+    except Exception as exc:
+        ts_print(f"Agent error: {exc}")
+        return {"ok": False, "message": f"Agent error: {exc}"}
+
+
+def run_queries(user_queries: list[str]) -> list[Dict[str, Any]]:
+    """Answer a batch of queries concurrently from one agent instance."""
+
+    async def _gather() -> list[Dict[str, Any]]:
+        return await asyncio.gather(*(run_query_async(q) for q in user_queries))
+
+    return asyncio.run(_gather())
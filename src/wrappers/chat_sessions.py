@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Explicit continuations of the current manual ("and what about step 3?", "what's next?",
+# "explain that"). A bare pronoun is not enough: "how do I reset it on a Mac" is a new
+# question and goes through retrieval, which keeps the context if it finds the same manual.
+FOLLOW_UP_RE = re.compile(
+    r"^\s*(?:(?:and|also|so|ok(?:ay)?),?\s+)?(?:what|how) about\b"
+    r"|^\s*(?:and\s+|then\s+)?(?:step\s*\d+|the (?:next|previous|last) step)\s*\??\s*$"
+    r"|^\s*(?:and |ok(?:ay)?,? |so )?(?:then what|what(?:'s| is| comes) next|what now)\b"
+    r"|\b(?:next|previous|last|same|that|this) step\b"
+    r"|^\s*(?:can you |could you |please )?(?:explain|repeat|clarify|elaborate on|say more about)"
+    r" (?:it|that|this|those|these|the (?:last|previous) (?:answer|step))\b"
+    r"|^\s*(?:what|why) (?:does|did|is|was) (?:it|that|this) (?:mean|for|needed|required)\b",
+    re.IGNORECASE,
+)
+MAX_FOLLOW_UP_WORDS = 14
+
+
+@dataclass
+class ChatSession:
+    """Conversation memory for one chat session (one UI tab / user)."""
+
+    session_id: str
+    retrieval: Optional[Dict[str, Any]] = None  # hybrid_search result for the active manual
+    prefix: Optional[List[Dict[str, Any]]] = None  # packed system+context input (cache-friendly)
+    last_response_id: Optional[str] = None
+    turns: Deque[Tuple[str, str]] = field(default_factory=lambda: deque(maxlen=4))
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def active_file(self) -> Optional[str]:
+        text_hit = (self.retrieval or {}).get("text") or {}
+        return (text_hit.get("metadata") or {}).get("file_name")
+
+    def reset_context(self, retrieval: Dict[str, Any]) -> None:
+        self.retrieval = retrieval
+        self.prefix = None
+        self.last_response_id = None
+        self.turns.clear()
+
+
+def context_id(retrieval: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Digest of the packed context (manual, sections, sources): equal ids mean the same prompt prefix."""
+    text_hit = (retrieval or {}).get("text")
+    if not text_hit:
+        return None
+    key = [
+        (text_hit.get("metadata") or {}).get("file_name"),
+        text_hit.get("markdown") or "",
+        list(text_hit.get("sources") or []),
+        list((retrieval or {}).get("sas_urls") or []),
+    ]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def is_follow_up(query: str, session: ChatSession) -> bool:
+    """
+    Heuristic: a short question with an explicit continuation cue (FOLLOW_UP_RE), asked
+    while a manual is active, refers to that manual and can skip retrieval.
+    """
+    if not session.retrieval or not session.active_file:
+        return False
+    words = query.split()
+    if not words or len(words) > MAX_FOLLOW_UP_WORDS:
+        return False
+    return bool(FOLLOW_UP_RE.search(query))
+
+
+class SessionStore:
+    """
+    Bounded, thread-safe session memory: least-recently-used sessions are evicted beyond
+    `max_sessions`, idle ones after `ttl_s`, and each keeps at most `max_turns` turns.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        ttl_s: float = 1800.0,
+        max_turns: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_turns = max_turns
+        self._clock = clock
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        expired = [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl_s]
+        for sid in expired:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> ChatSession:
+        """Return the live session for session_id, creating it if missing or expired."""
+        with self._lock:
+            now = self._clock()
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id=session_id, turns=deque(maxlen=self.max_turns))
+                self._sessions[session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return session
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+@lru_cache(maxsize=1)
+def get_session_store() -> SessionStore:
+    """Process-wide store sized by CHAT_SESSION_MAX / CHAT_SESSION_TTL_S / CHAT_SESSION_TURNS."""
+    return SessionStore(
+        max_sessions=int(os.getenv("CHAT_SESSION_MAX", "256")),
+        ttl_s=float(os.getenv("CHAT_SESSION_TTL_S", "1800")),
+        max_turns=int(os.getenv("CHAT_SESSION_TURNS", "4")),
+    )
@@ -4,15 +4,21 @@ from typing import Any, Dict, Optional
 
 from datetime import datetime
 
+from src.bridge.downloads import temporary_download
 from src.bridge.sharepoint_connector import SharePointConnector
 from src.config.settings import get_settings
+from src.text_indexing.incremental import sync_folder
 from src.text_indexing.layout_ingestor import LayoutAwareIngestor
+from src.text_indexing.parallel_ingest import ingest_files_parallel, ingest_workers
+from src.text_indexing.profiling import profiled
+from src.text_indexing.qdrant_writer import BatchWriteError
 
 
 def ts_print(msg: str) -> None:
     print(f"[{datetime.now().isoformat()}] {msg}")
 
 
+@profiled
 def ingest_one(file_id: Optional[str] = None, folder_path: Optional[str] = "Shared Documents") -> Dict[str, Any]:
     """
     Thin wrapper to ingest a single PDF from SharePoint into Qdrant + Azure.
@@ -54,25 +60,31 @@ def ingest_one(file_id: Optional[str] = None, folder_path: Optional[str] = "Shar
 
     try:
         ts_print(f"Downloading {pdf_name} ({pdf_id})")
-        pdf_bytes = sp.get_file_stream(pdf_id)
+        pdf_path = sp.download_file(pdf_id)
     except Exception as exc:
         ts_print(f"Download failed: {exc}")
         return {"ok": False, "message": f"Download failed: {exc}", "file": pdf_name}
 
     ingestor = LayoutAwareIngestor(collection="manuals_text")
-    try:
-        ts_print(f"Ingesting {pdf_name}")
-        ingestor.index_pdf(pdf_bytes, file_name=pdf_name)
-        ts_print(f"Ingested {pdf_name}")
-        return {"ok": True, "message": f"Ingested {pdf_name}", "file": pdf_name}
-    except Exception as exc:
-        ts_print(f"Ingestion failed: {exc}")
-        return {"ok": False, "message": f"Ingestion failed: {exc}", "file": pdf_name}
+    with temporary_download(pdf_path):
+        try:
+            ts_print(f"Ingesting {pdf_name}")
+            ingestor.index_pdf(pdf_path, file_name=pdf_name, doc_id=pdf_id)
+            ts_print(f"Ingested {pdf_name}")
+            return {"ok": True, "message": f"Ingested {pdf_name}", "file": pdf_name}
+        except Exception as exc:
+            ts_print(f"Ingestion failed: {exc}")
+            return {"ok": False, "message": f"Ingestion failed: {exc}", "file": pdf_name}
 
 
-def ingest_all(folder_path: Optional[str] = "Shared Documents") -> Dict[str, Any]:
+@profiled
+def ingest_all(
+    folder_path: Optional[str] = "Shared Documents", workers: Optional[int] = None, recursive: bool = False
+) -> Dict[str, Any]:
     """
-    Thin wrapper to ingest all PDFs in a SharePoint folder.
+    Thin wrapper to ingest all PDFs in a SharePoint folder (recursive=True includes subfolders).
+    With workers > 1 (or INGEST_WORKERS) PDFs are converted in parallel processes.
+    Chunks are embedded and upserted in batches across PDFs (see BatchedQdrantWriter).
     Returns a summary dict with counts.
     """
     ts_print(f"Starting ingest_all (folder={folder_path})")
@@ -84,7 +96,9 @@ def ingest_all(folder_path: Optional[str] = "Shared Documents") -> Dict[str, Any
         site_id=settings.sharepoint_site_id,
         drive_id=settings.sharepoint_drive_id,
     )
-    files = sp.list_files(folder_path=folder_path or settings.sharepoint_folder_path or "Documents")
+    files = sp.list_files(
+        folder_path=folder_path or settings.sharepoint_folder_path or "Documents", recursive=recursive
+    )
     pdfs = [
         f
         for f in files
@@ -99,21 +113,63 @@ def ingest_all(folder_path: Optional[str] = "Shared Documents") -> Dict[str, Any
         return {"ok": False, "message": "No PDFs found in SharePoint folder.", "processed": 0, "failed": 0}
 
     ingestor = LayoutAwareIngestor(collection="manuals_text")
-    ok_count, fail_count = 0, 0
-    errors = []
-    for f in pdfs:
-        pdf_id = f.get("id") if isinstance(f, dict) else getattr(f, "id", None)
-        pdf_name = f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf")
+    workers = workers or ingest_workers()
+    if workers > 1:
+        items = [
+            (
+                f.get("id") if isinstance(f, dict) else getattr(f, "id", None),
+                f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf"),
+            )
+            for f in pdfs
+        ]
+        summary: Dict[str, Any] = {"processed": 0, "failed": 0, "errors": []}
         try:
-            ts_print(f"Downloading {pdf_name} ({pdf_id})")
-            pdf_bytes = sp.get_file_stream(pdf_id)
-            ts_print(f"Ingesting {pdf_name}")
-            ingestor.index_pdf(pdf_bytes, file_name=pdf_name)
-            ok_count += 1
+            with ingestor.batched_writes():
+                summary = ingest_files_parallel(ingestor, items, sp.download_file, workers=workers)
+        except BatchWriteError as exc:
+            ts_print(f"Final index write failed: {exc}")
+            names = dict(items)
+            summary["processed"] -= len(exc.failed)
+            summary["failed"] += len(exc.failed)
+            summary["errors"] += [f"{names.get(doc, doc)}: index write failed" for doc in sorted(exc.failed, key=str)]
         except Exception as exc:
-            fail_count += 1
-            errors.append(f"{pdf_name}: {exc}")
-            ts_print(f"Failed {pdf_name}: {exc}")
+            ts_print(f"Final index write failed: {exc}")
+            return {"ok": False, "message": f"Final index write failed: {exc}", "processed": 0, "failed": len(items)}
+        return {
+            "ok": summary["failed"] == 0,
+            "message": f"Ingestion complete: {summary['processed']} succeeded, {summary['failed']} failed.",
+            "processed": summary["processed"],
+            "failed": summary["failed"],
+            "errors": summary["errors"],
+        }
+
+    ok_count, fail_count = 0, 0
+    errors = []
+    names: Dict[Any, str] = {}
+    try:
+        with ingestor.batched_writes():
+            for f in pdfs:
+                pdf_id = f.get("id") if isinstance(f, dict) else getattr(f, "id", None)
+                pdf_name = f.get("name") if isinstance(f, dict) else getattr(f, "name", "manual.pdf")
+                names[pdf_id] = pdf_name
+                try:
+                    ts_print(f"Downloading {pdf_name} ({pdf_id})")
+                    with temporary_download(sp.download_file(pdf_id)) as pdf_path:
+                        ts_print(f"Ingesting {pdf_name}")
+                        ingestor.index_pdf(pdf_path, file_name=pdf_name, doc_id=pdf_id)
+                    ok_count += 1
+                except Exception as exc:
+                    fail_count += 1
+                    errors.append(f"{pdf_name}: {exc}")
+                    ts_print(f"Failed {pdf_name}: {exc}")
+    except BatchWriteError as exc:
+        ts_print(f"Final index write failed: {exc}")
+        ok_count -= len(exc.failed)
+        fail_count += len(exc.failed)
+        errors += [f"{names.get(doc, doc)}: index write failed" for doc in sorted(exc.failed, key=str)]
+    except Exception as exc:
+        ts_print(f"Final index write failed: {exc}")
+        return {"ok": False, "message": f"Final index write failed: {exc}", "processed": 0, "failed": len(pdfs)}
     return {
         "ok": fail_count == 0,
         "message": f"Ingestion complete: {ok_count} succeeded, {fail_count} failed.",
@@ -122,3 +178,36 @@ def ingest_all(folder_path: Optional[str] = "Shared Documents") -> Dict[str, Any
         "errors": errors,
     }
 
+
+@profiled
+def sync(folder_path: Optional[str] = "Shared Documents", use_delta: bool = True) -> Dict[str, Any]:
+    """
+    Incremental ingest of a SharePoint folder: skips unchanged PDFs, re-ingests changed
+    ones and removes deleted ones (see src.text_indexing.incremental).
+    Returns a summary dict with counts.
+    """
+    ts_print(f"Starting sync (folder={folder_path}, delta={use_delta})")
+    settings = get_settings()
+    sp = SharePointConnector(
+        tenant_id=settings.azure_tenant_id,
+        client_id=settings.azure_client_id,
+        client_secret=settings.azure_client_secret,
+        site_id=settings.sharepoint_site_id,
+        drive_id=settings.sharepoint_drive_id,
+    )
+    ingestor = LayoutAwareIngestor(collection="manuals_text")
+    try:
+        summary = sync_folder(
+            sp, ingestor, folder_path or settings.sharepoint_folder_path or "Documents", use_delta=use_delta
+        )
+    except Exception as exc:
+        ts_print(f"Sync failed: {exc}")
+        return {"ok": False, "message": f"Sync failed: {exc}"}
+    return {
+        "ok": summary["failed"] == 0,
+        "message": (
+            f"Sync complete: {summary['ingested']} ingested, {summary['skipped']} unchanged, "
+            f"{summary['deleted']} deleted, {summary['failed']} failed."
+        ),
+        **summary,
+    }
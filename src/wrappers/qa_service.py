@@ -1,19 +1,35 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from datetime import datetime
 
-from src.retrieval.multimodal_service import get_1440_response, hybrid_search
+from src.retrieval.multimodal_service import answer_with_context, get_1440_response, hybrid_search
+from src.wrappers.chat_sessions import context_id, get_session_store, is_follow_up
 
 
 def ts_print(msg: str) -> None:
     print(f"[{datetime.now().isoformat()}] {msg}")
 
 
-def answer_question(user_query: str) -> Dict[str, Any]:
+def answer_question(
+    user_query: str,
+    session_id: Optional[str] = None,
+    previous_response_id: Optional[str] = None,
+    previous_context_id: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Thin wrapper to perform retrieval + inference and return a structured dict.
+
+    With a session_id (e.g. one per Streamlit session), follow-ups about the active manual
+    skip retrieval and reuse the session's packed context / previous response. Other
+    questions are re-retrieved; the cached prefix and response chain are kept only when
+    the newly packed context is identical. The caller may also pass back the last result's
+    response_id and context_id: they continue the response chain when the server-side
+    session was evicted or the process restarted.
     """
+    if session_id is not None:
+        return _answer_in_session(user_query, session_id, previous_response_id, previous_context_id)
+
     ts_print(f"Answering query: {user_query}")
     try:
         retrieval_data = hybrid_search(user_query)
@@ -55,6 +71,104 @@ def answer_question(user_query: str) -> Dict[str, Any]:
         "message": "Success",
         "answer_markdown": grounded_answer,
         "source_file": retrieval_data["text"]["metadata"].get("file_name"),
+        "sources": retrieval_data["text"].get("sources") or [],
         "confidence_score": retrieval_data["text"].get("score", 0.0),
     }
 
+
+def _answer_in_session(
+    user_query: str,
+    session_id: str,
+    previous_response_id: Optional[str] = None,
+    previous_context_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    session = get_session_store().get(session_id)
+    fresh = session.retrieval is None
+    follow_up = is_follow_up(user_query, session)
+    ts_print(f"Answering query in session {session_id} (follow_up={follow_up}): {user_query}")
+
+    if not follow_up:
+        try:
+            retrieval_data = hybrid_search(user_query)
+        except Exception as exc:
+            ts_print(f"Retrieval error: {exc}")
+            return {
+                "ok": False,
+                "message": f"Retrieval error: {exc}",
+                "answer_markdown": None,
+                "source_file": None,
+                "confidence_score": 0.0,
+                "reused_context": False,
+            }
+        if not retrieval_data.get("text"):
+            ts_print("No relevant manual found.")
+            return {
+                "ok": False,
+                "message": retrieval_data.get("error") or "No relevant manual found for this query.",
+                "answer_markdown": None,
+                "source_file": None,
+                "confidence_score": 0.0,
+                "reused_context": False,
+            }
+        new_context = context_id(retrieval_data)
+        if not fresh and new_context == context_id(session.retrieval):
+            # Same sections packed again: keep the existing context prefix and response chain.
+            follow_up = True
+        else:
+            session.reset_context(retrieval_data)
+            if fresh and previous_response_id and new_context == previous_context_id:
+                # Session lost server-side (evicted / restarted): the caller's id still chains the same context.
+                session.last_response_id = previous_response_id
+                follow_up = True
+
+    retrieval_data = session.retrieval or {}
+    text_hit = retrieval_data.get("text") or {}
+    try:
+        ts_print("Running multimodal inference")
+        result = answer_with_context(
+            user_query,
+            retrieval_data,
+            prefix=session.prefix,
+            history=list(session.turns),
+            previous_response_id=session.last_response_id,
+        )
+    except Exception as exc:
+        ts_print(f"Inference error: {exc}")
+        return {
+            "ok": False,
+            "message": f"Inference error: {exc}",
+            "answer_markdown": None,
+            "source_file": session.active_file,
+            "confidence_score": text_hit.get("score", 0.0),
+            "reused_context": follow_up,
+            "response_id": session.last_response_id,
+            "context_id": context_id(retrieval_data),
+        }
+    if not result.get("ok", True):
+        # Not a model answer (retries exhausted, not configured): keep it out of the turn history.
+        ts_print(f"Inference error: {result['answer']}")
+        return {
+            "ok": False,
+            "message": result["answer"],
+            "answer_markdown": None,
+            "source_file": session.active_file,
+            "confidence_score": text_hit.get("score", 0.0),
+            "reused_context": follow_up,
+            "response_id": session.last_response_id,
+            "context_id": context_id(retrieval_data),
+        }
+
+    session.prefix = result.get("prefix") or session.prefix
+    session.last_response_id = result.get("response_id")
+    session.turns.append((user_query, result["answer"]))
+    return {
+        "ok": True,
+        "message": "Success",
+        "answer_markdown": result["answer"],
+        "source_file": session.active_file,
+        "sources": text_hit.get("sources") or [],
+        "confidence_score": text_hit.get("score", 0.0),
+        "reused_context": follow_up,
+        "response_id": session.last_response_id,
+        "context_id": context_id(retrieval_data),
+    }
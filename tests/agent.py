@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Dict, Any
 
 from pydantic import BaseModel
@@ -12,6 +13,7 @@ class DiagnosticResponse(BaseModel):
     markdown: str
 
 
+@lru_cache(maxsize=1)
 def build_agent() -> Agent[DiagnosticResponse]:
     system_prompt = (
         "You are a technical guide. You will be provided with a Markdown representation of a manual and associated "
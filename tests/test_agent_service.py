@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from src.wrappers import agent_service
+
+
+class _FakeAgent:
+    def __init__(self):
+        self.calls = 0
+
+    def run_query(self, user_query):
+        self.calls += 1
+        return {"answer_markdown": user_query}
+
+    async def run_query_async(self, user_query):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return {"answer_markdown": user_query}
+
+
+def test_run_queries_share_one_agent_and_run_concurrently(monkeypatch):
+    fake = _FakeAgent()
+    monkeypatch.setattr(agent_service, "get_1440_agent", lambda: fake)
+
+    start = time.perf_counter()
+    results = agent_service.run_queries([f"q{i}" for i in range(5)])
+    elapsed = time.perf_counter() - start
+
+    assert [r["answer_markdown"] for r in results] == [f"q{i}" for i in range(5)]
+    assert all(r["ok"] for r in results)
+    assert fake.calls == 5
+    assert elapsed < 0.2 * 5
+
+
+def test_run_query_reports_agent_errors(monkeypatch):
+    def boom():
+        raise RuntimeError("no agent")
+
+    monkeypatch.setattr(agent_service, "get_1440_agent", boom)
+    res = agent_service.run_query("q")
+    assert res["ok"] is False
+    assert "no agent" in res["message"]
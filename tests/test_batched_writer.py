@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.text_indexing.qdrant_writer import BatchedQdrantWriter, BatchWriteError, step_chunks
+
+
+class _Embed:
+    def __init__(self):
+        self.batches = []
+
+    def get_text_embedding_batch(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(t)), 1.0, 0.5, 0.25] for t in texts]
+
+
+def _client():
+    client = QdrantClient(":memory:")
+    for name in ("chunks", "cards"):
+        client.create_collection(name, vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    return client
+
+
+def test_chunks_of_many_documents_share_embed_and_upsert_batches():
+    client, embed = _client(), _Embed()
+    writer = BatchedQdrantWriter(client, embed, embed_batch=32, upsert_batch=40, parallel=3)
+    seen_at_callback = []
+    for doc in range(3):
+        steps = [(i, f"## Step {i}\nOpen https://example.com/x.png panel {doc}") for i in range(1, 51)]
+        base = {"doc_id": f"doc-{doc}", "doc_version": 7, "file_name": "m.pdf"}
+        for pid, text, payload in step_chunks(steps, base):
+            writer.add("chunks", pid, text, payload)
+        writer.add("cards", f"{doc:08d}-0000-0000-0000-000000000000", "", {"doc": doc}, vector=[1.0, 0, 0, 0])
+        writer.after_flush(lambda: seen_at_callback.append(client.count("chunks", exact=True).count))
+    report = writer.close()
+
+    assert embed.batches == [32, 32, 32, 32, 22]  # 150 chunks; vectors given for the cards
+    assert seen_at_callback == [150, 150, 150]  # version swaps only after the barrier
+    assert client.count("chunks").count == 150 and client.count("cards").count == 3
+    # 150 chunks in upsert batches of 40 (the last one at flush), plus the cards
+    assert report["chunks"] == 153 and report["requests"] == 5 and report["chunks_per_s"] > 0
+    point = client.scroll("chunks", limit=1, with_payload=True)[0][0]
+    assert "https://" not in point.payload["text"] and point.payload["doc_type"] == "markdown_step"
+
+
+class _SlowFlakyClient:
+    """Records concurrent upserts; the batch containing `bad` fails."""
+
+    def __init__(self, bad):
+        self.bad, self.active, self.peak, self.waits = bad, 0, 0, []
+        self.lock = threading.Lock()
+
+    def upsert(self, collection_name, points, wait=True):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.waits.append(wait)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if any(p.id == self.bad for p in points):
+            raise RuntimeError("upsert rejected")
+
+
+def test_in_flight_requests_bounded_and_failed_flush_skips_callbacks():
+    client = _SlowFlakyClient(bad=17)
+    writer = BatchedQdrantWriter(client, _Embed(), upsert_batch=2, parallel=2)
+    swapped = []
+    for i in range(20):
+        writer.add("chunks", i, "", {}, vector=[1.0])
+    writer.after_flush(lambda: swapped.append(True))
+
+    with pytest.raises(BatchWriteError, match="rejected"):
+        writer.close()
+    assert client.peak == 2
+    assert swapped == []
+
+
+def test_failed_batch_only_blocks_its_own_document_swap():
+    client = _SlowFlakyClient(bad=1)
+    writer = BatchedQdrantWriter(client, _Embed(), upsert_batch=2, parallel=1)
+    swapped = []
+    for doc, ids in (("A", range(0, 4)), ("B", range(4, 10)), ("C", range(10, 12))):
+        for i in ids:  # A's first batch fails while B is being added (backpressure)
+            writer.add("chunks", i, "", {}, vector=[1.0], doc=doc)
+        writer.after_flush(lambda doc=doc: swapped.append(doc), doc=doc)
+
+    with pytest.raises(BatchWriteError) as err:
+        writer.close()
+    assert err.value.failed == {"A"}
+    assert swapped == ["B", "C"]
+    assert client.waits[-1] is True  # the barrier still confirms the documents that made it
@@ -0,0 +1,257 @@
+import io
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from PIL import Image, ImageDraw
+
+from src.text_indexing.figure_codec import FigureCodec
+from src.text_indexing.figure_store import FigureStore
+from src.text_indexing.markdown_builder import render_markdown
+from src.text_indexing.storage import AzureBlobStorage
+
+ACCOUNT = "devstoreaccount1"
+KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+
+class _BlobStandIn(BaseHTTPRequestHandler):
+    """Just enough of the Blob REST API (create container, Put Blob) to record uploads."""
+
+    blobs = {}
+    delay_s = 0.05
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("ETag", '"0x1"')
+        self.send_header("Last-Modified", formatdate(usegmt=True))
+        self.send_header("x-ms-request-id", "1")
+        self.send_header("x-ms-version", self.headers.get("x-ms-version", ""))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        name = unquote(urlparse(self.path).path).split("/", 3)[3]
+        if name not in self.blobs:
+            self.send_response(404)
+            self.send_header("x-ms-error-code", "BlobNotFound")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._reply(200)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlparse(self.path)
+        if "restype=container" in url.query:
+            return self._reply(201)
+        time.sleep(self.delay_s)  # network round trip
+        name = unquote(url.path).split("/", 3)[3]
+        self.blobs[name] = {
+            "data": body,
+            "content_type": self.headers.get("x-ms-blob-content-type"),
+            "cache_control": self.headers.get("x-ms-blob-cache-control"),
+            "started": time.monotonic(),
+        }
+        self._reply(201)
+
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BlobStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    conn = (
+        f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT};AccountKey={KEY};"
+        f"BlobEndpoint=http://127.0.0.1:{port}/{ACCOUNT};"
+    )
+    return server, conn
+
+
+def test_render_markdown_uploads_concurrently_in_order(tmp_path, monkeypatch):
+    _BlobStandIn.blobs = {}
+    server, conn = _serve()
+    try:
+        storage = AzureBlobStorage(container="manual-images", connection_string=conn)
+        steps = [
+            (
+                n,
+                {
+                    "content": [{"type": "text", "text": f"Do thing {n}"}]
+                    + [{"type": "image", "image": Image.new("RGB", (8, 8), (n, i, 0)), "page": n} for i in range(4)]
+                },
+            )
+            for n in range(1, 4)
+        ]
+        timings = {}
+        for workers in ("1", "8"):  # sequential baseline first (also warms the client)
+            monkeypatch.setenv("AZURE_UPLOAD_WORKERS", workers)
+            start = time.monotonic()
+            full_md, embed_md, sas_urls, fig_meta = render_markdown(steps, "manual", tmp_path, storage)
+            timings[workers] = time.monotonic() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(sas_urls) == 12 and len(_BlobStandIn.blobs) == 12
+    assert timings["8"] < timings["1"] / 2  # round trips overlapped
+    assert [m["sas_url"] for m in fig_meta] == sas_urls
+    assert full_md.index(sas_urls[0]) < full_md.index(sas_urls[4]) < full_md.index(sas_urls[11])
+    assert fig_meta[4]["step"] == 2 and "manual/images/fig_5_page_2.png" in sas_urls[4]
+    blob = _BlobStandIn.blobs["manual/images/fig_5_page_2.png"]
+    assert blob["content_type"] == "image/png"
+    assert "immutable" not in blob["cache_control"]  # per-manual names are overwritten on re-ingest
+    assert blob["data"][:8] == b"\x89PNG\r\n\x1a\n"
+    assert "http" not in embed_md
+
+
+def _pattern(seed, size=(64, 32)):
+    img = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for i in range(6):
+        x = (seed * 7 + i * 11) % size[0]
+        draw.rectangle([x, i * 5, x + 8, i * 5 + 4], fill=(20 * seed % 255, 0, 120))
+    return img
+
+
+def test_figure_store_shares_identical_and_rescaled_figures(tmp_path):
+    _BlobStandIn.blobs = {}
+    server, conn = _serve()
+    cache = tmp_path / "figures.sqlite"
+    logo, screenshot = _pattern(1), _pattern(5)
+    try:
+        storage = AzureBlobStorage(container="manual-images", connection_string=conn)
+        store = FigureStore(storage, cache_path=cache, max_distance=4)  # perceptual matching is opt-in
+        manual_a = [(1, {"content": [{"type": "image", "image": logo, "page": 1}] * 3})]
+        manual_b = [
+            (1, {"content": [{"type": "image", "image": logo.resize((128, 64)), "page": 1}]}),
+            (2, {"content": [{"type": "image", "image": screenshot, "page": 2}]}),
+        ]
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        _, _, _, meta_a = render_markdown(manual_a, "a", tmp_path / "a", storage, figure_store=store)
+        _, _, _, meta_b = render_markdown(manual_b, "b", tmp_path / "b", storage, figure_store=store)
+        assert len(_BlobStandIn.blobs) == 2  # logo once, screenshot once
+        assert {m["blob_name"] for m in meta_a} == {meta_b[0]["blob_name"]}
+        assert meta_b[1]["blob_name"] != meta_a[0]["blob_name"]
+        assert all(m["shared"] and m["blob_name"].startswith("figures/") for m in meta_a + meta_b)
+        assert len(list((tmp_path / "a").glob("*.png"))) == 3  # local export is still per manual
+
+        # Re-ingest with a fresh process: the cache answers, nothing is uploaded or probed.
+        _BlobStandIn.blobs = {}
+        again = FigureStore(storage, cache_path=cache, max_distance=4)
+        _, _, _, meta_again = render_markdown(manual_b, "b", tmp_path / "b", storage, figure_store=again)
+        assert _BlobStandIn.blobs == {}
+        assert [m["blob_name"] for m in meta_again] == [m["blob_name"] for m in meta_b]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_figures_encoded_once_and_exported_byte_identical(tmp_path, monkeypatch):
+    _BlobStandIn.blobs = {}
+    server, conn = _serve()
+    calls = []
+    encode = FigureCodec.encode
+    monkeypatch.setattr(FigureCodec, "encode", lambda self, img: calls.append(img) or encode(self, img))
+    try:
+        storage = AzureBlobStorage(container="manual-images", connection_string=conn)
+        steps = [(1, {"content": [{"type": "image", "image": _pattern(n), "page": 1} for n in range(3)]})]
+        _, _, _, meta = render_markdown(steps, "m", tmp_path, storage, codec=FigureCodec("webp-lossless"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(calls) == 3
+    for n, m in enumerate(meta):
+        blob = _BlobStandIn.blobs[m["blob_name"]]
+        assert m["blob_name"].endswith(".webp") and blob["content_type"] == "image/webp"
+        assert Path(m["local_path"]).read_bytes() == blob["data"]
+        assert Image.open(m["local_path"]).convert("RGB").tobytes() == _pattern(n).tobytes()  # lossless
+
+
+def test_jpeg_codec_flattens_alpha():
+    rgba = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    data = FigureCodec("jpeg", quality=90).encode(rgba)
+    assert data[:2] == b"\xff\xd8"
+    assert Image.open(io.BytesIO(data)).getpixel((4, 4))[0] > 240  # transparent -> white
+
+
+class _MemoryStorage:
+    """In-memory AzureBlobStorage: blobs with a last-modified time."""
+
+    container = "manual-images"
+
+    def __init__(self):
+        self.blobs = {}
+        self.cache_control = {}
+
+    def upload_and_get_sas(self, data, blob_name, **kwargs):
+        self.blobs[blob_name] = (data, datetime.now(timezone.utc))
+        self.cache_control[blob_name] = kwargs.get("cache_control")
+        return self.sas_url(blob_name)
+
+    def sas_url(self, blob_name, days=30):
+        return f"https://blob/{blob_name}?sas"
+
+    def exists(self, blob_name):
+        return blob_name in self.blobs
+
+    def last_modified(self, blob_name):
+        return self.blobs[blob_name][1] if blob_name in self.blobs else None
+
+    def list_blobs(self, prefix):
+        return [(name, modified) for name, (_, modified) in self.blobs.items() if name.startswith(prefix)]
+
+    def delete_blobs(self, blob_names):
+        for name in blob_names:
+            self.blobs.pop(name, None)
+
+
+def test_exact_dedup_by_default_skips_encoding_and_unreferenced_figures_collected(tmp_path, monkeypatch):
+    monkeypatch.delenv("FIGURE_DEDUP_DISTANCE", raising=False)
+    storage, cache = _MemoryStorage(), tmp_path / "figures.sqlite"
+    store = FigureStore(storage, cache_path=cache)
+    encodes = []
+
+    def encoder(img):
+        return lambda: encodes.append(img) or FigureCodec("png").encode(img)
+
+    logo, screenshot = _pattern(1), _pattern(5)
+    kept = store.store(logo, encoder(logo))
+    assert store.store(logo.copy(), encoder(logo))["deduped"] and len(encodes) == 1  # duplicate never encoded
+    assert not store.store(logo.resize((128, 64)))["deduped"]  # re-scaled: only matched when opted in
+    orphan = store.store(screenshot)["blob_name"]
+
+    assert store.collect_garbage({kept["blob_name"]}) == []  # too young: may belong to an ingest in flight
+    deleted = store.collect_garbage({kept["blob_name"]}, min_age_s=0)
+    assert orphan in deleted and kept["blob_name"] not in deleted
+    assert set(storage.blobs) == {kept["blob_name"], "figures/gc-epoch"}
+    assert "immutable" in storage.cache_control[kept["blob_name"]]
+    assert storage.cache_control["figures/gc-epoch"] is None  # overwritten by every GC: storage default
+
+    # Another host's cache still lists the deleted blobs: the GC marker makes it start over.
+    other = FigureStore(storage, cache_path=tmp_path / "other.sqlite")
+    other._db.execute("INSERT INTO figures VALUES (?, ?, '', '', 1, 1, ?)", (storage.container, "x", orphan))
+    other._db.execute("DELETE FROM meta")
+    other._db.commit()
+    restarted = FigureStore(storage, cache_path=tmp_path / "other.sqlite")
+    assert restarted._lookup("x") is None
+    assert not store.store(screenshot)["deduped"] and orphan in storage.blobs  # this host re-uploads it
+
+
+def test_long_lived_store_drops_its_cache_after_gc_elsewhere(tmp_path, monkeypatch):
+    monkeypatch.setenv("FIGURE_GC_CHECK_S", "0")
+    storage = _MemoryStorage()
+    worker = FigureStore(storage, cache_path=tmp_path / "worker.sqlite")  # e.g. the ingest worker's store
+    figure = worker.store(_pattern(3))["blob_name"]
+
+    FigureStore(storage, cache_path=tmp_path / "gc.sqlite").collect_garbage(set(), min_age_s=0)
+    assert figure not in storage.blobs
+
+    assert not worker.store(_pattern(3))["deduped"] and figure in storage.blobs  # re-uploaded, not a dead link
@@ -0,0 +1,111 @@
+from src.wrappers import qa_service
+from src.wrappers.chat_sessions import ChatSession, SessionStore, is_follow_up
+
+
+def _retrieval(file_name, markdown=None):
+    text = {"markdown": markdown or f"# {file_name}", "metadata": {"file_name": file_name}, "score": 0.9}
+    return {"text": text, "sas_urls": []}
+
+
+def test_session_store_evicts_lru_and_idle_sessions():
+    now = [0.0]
+    store = SessionStore(max_sessions=2, ttl_s=10, clock=lambda: now[0])
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")  # evicts b (least recently used)
+    assert len(store) == 2
+    now[0] = 11.0
+    store.get("c")  # a is idle past ttl
+    assert len(store) == 1
+
+
+def test_follow_up_requires_active_manual_and_cue():
+    session = ChatSession(session_id="s")
+    assert not is_follow_up("and what about step 3?", session)
+    session.retrieval = _retrieval("Backup.pdf")
+    assert is_follow_up("and what about step 3?", session)
+    assert not is_follow_up("How do I request external SharePoint access for a vendor", session)
+    assert is_follow_up("what's next?", session) and is_follow_up("can you explain that", session)
+    assert not is_follow_up("How do I reset it on the HP printer", session)  # a bare pronoun is no cue
+    assert not is_follow_up("Is this the right way to install Teams on Mac", session)
+
+
+def test_follow_up_skips_retrieval_and_chains_response(monkeypatch):
+    searches, calls = [], []
+    store = SessionStore()
+    monkeypatch.setattr(qa_service, "get_session_store", lambda: store)
+    monkeypatch.setattr(qa_service, "hybrid_search", lambda q: searches.append(q) or _retrieval("Backup.pdf"))
+
+    def fake_answer(user_query, retrieved_context, prefix=None, history=None, previous_response_id=None):
+        calls.append({"prefix": prefix, "previous_response_id": previous_response_id, "history": history})
+        return {"answer": f"A:{user_query}", "response_id": f"resp_{len(calls)}", "prefix": ["PREFIX"]}
+
+    monkeypatch.setattr(qa_service, "answer_with_context", fake_answer)
+
+    first = qa_service.answer_question("How do I configure the backup schedule?", session_id="s1")
+    second = qa_service.answer_question("and what about step 3?", session_id="s1")
+
+    assert first["ok"] and second["ok"]
+    assert searches == ["How do I configure the backup schedule?"]
+    assert second["reused_context"] is True
+    assert calls[1]["prefix"] == ["PREFIX"]
+    assert calls[1]["previous_response_id"] == "resp_1"
+
+
+def test_client_response_id_resumes_chain_after_session_eviction(monkeypatch):
+    store = SessionStore()
+    monkeypatch.setattr(qa_service, "get_session_store", lambda: store)
+    monkeypatch.setattr(qa_service, "hybrid_search", lambda q: _retrieval("Backup.pdf"))
+    calls = []
+
+    def fake_answer(user_query, retrieved_context, prefix=None, history=None, previous_response_id=None):
+        calls.append(previous_response_id)
+        return {"answer": "A", "response_id": f"resp_{len(calls)}", "prefix": ["PREFIX"]}
+
+    monkeypatch.setattr(qa_service, "answer_with_context", fake_answer)
+    first = qa_service.answer_question("How do I configure the backup schedule?", session_id="s1")
+    store.drop("s1")  # evicted between two Streamlit reruns
+    resumed = qa_service.answer_question(
+        "How do I change the backup retention?",
+        session_id="s1",
+        previous_response_id=first["response_id"],
+        previous_context_id=first["context_id"],
+    )
+    store.drop("s1")
+    other = qa_service.answer_question(
+        "How do I change the backup retention?",
+        session_id="s1",
+        previous_response_id=resumed["response_id"],
+        previous_context_id="other-context",
+    )
+
+    assert calls == [None, "resp_1", None]
+    assert resumed["reused_context"] is True and other["reused_context"] is False
+
+
+def test_same_manual_with_other_sections_rebuilds_prefix_and_failed_turns_are_not_kept(monkeypatch):
+    store = SessionStore()
+    monkeypatch.setattr(qa_service, "get_session_store", lambda: store)
+    packed = iter(["## Step 1", "## Step 1", "## Step 7"])
+    monkeypatch.setattr(qa_service, "hybrid_search", lambda q: _retrieval("Backup.pdf", next(packed)))
+    calls, fail = [], [False]
+
+    def fake_answer(user_query, retrieved_context, prefix=None, history=None, previous_response_id=None):
+        calls.append({"prefix": prefix, "previous_response_id": previous_response_id, "history": history})
+        if fail[0]:
+            return {"ok": False, "answer": "OpenAI primary error after retries: boom", "response_id": None}
+        return {"ok": True, "answer": "A", "response_id": f"resp_{len(calls)}", "prefix": ["PREFIX"]}
+
+    monkeypatch.setattr(qa_service, "answer_with_context", fake_answer)
+    qa_service.answer_question("How do I configure the backup schedule?", session_id="s1")
+    fail[0] = True
+    failed = qa_service.answer_question("How do I pick the backup target?", session_id="s1")
+    fail[0] = False
+    other = qa_service.answer_question("How do I restore a backup?", session_id="s1")
+
+    assert failed["ok"] is False and failed["message"].startswith("OpenAI primary error")
+    assert calls[1]["previous_response_id"] == "resp_1" and len(calls[1]["history"]) == 1  # identical sections
+    assert other["reused_context"] is False
+    assert calls[2] == {"prefix": None, "previous_response_id": None, "history": []}
+    assert [q for q, _ in store.get("s1").turns] == ["How do I restore a backup?"]
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+from src.retrieval.router import DocumentRouter
+from src.text_indexing.doc_cards import build_document_card, card_point_id, card_text
+
+
+def _steps():
+    return [
+        (1, {"content": [{"type": "text", "text": "Configure VPN access\nOpen the portal"}]}),
+        (2, {"content": [{"type": "text", "text": "Install the VPN client"}, {"type": "image", "image": None}]}),
+    ]
+
+
+def test_build_document_card_summarises_steps():
+    card = build_document_card("vpn_setup.pdf", _steps())
+    assert card["title"] == "Configure VPN access"
+    assert card["step_titles"] == ["Step 1: Configure VPN access", "Step 2: Install the VPN client"]
+    assert card["keywords"][0] == "vpn"
+    assert card["step_count"] == 2
+    assert "vpn_setup" in card_text(card)
+    assert card_point_id("vpn_setup.pdf") == card_point_id("vpn_setup.pdf")
+
+
+class _FakeCardsClient:
+    def __init__(self, cards):
+        self.cards = cards
+        self.filters = []
+
+    def collection_exists(self, _name):
+        return True
+
+    def scroll(self, collection_name, scroll_filter=None, limit=256, offset=None, **_):
+        self.filters.append(scroll_filter)
+        since = scroll_filter.must[0].range.gt if scroll_filter else None
+        points = [
+            SimpleNamespace(vector=card[0], payload={"file_name": name, "updated_at": card[1], **dict(card[2:])})
+            for name, card in self.cards.items()
+            if since is None or card[1] > since
+        ]
+        return points, None
+
+
+def test_router_ranks_cards_and_syncs_incrementally():
+    client = _FakeCardsClient({"vpn.pdf": ([1.0, 0.0], 1.0), "mfa.pdf": ([0.0, 1.0], 2.0)})
+    router = DocumentRouter(client, refresh_s=0, rebuild_s=3600)
+    assert router.route([0.9, 0.1], k=1) == ["vpn.pdf"]
+    assert client.filters[0] is None
+
+    client.cards["printer.pdf"] = ([0.7, 0.7], 3.0)
+    assert router.route([0.6, 0.6], k=3)[0] == "printer.pdf"
+    assert client.filters[-1].must[0].range.gt == 2.0
+
+    router.forget("printer.pdf")
+    assert len(router) == 2
+
+
+def test_same_named_manuals_in_different_folders_keep_separate_cards():
+    a = build_document_card("setup.pdf", _steps(), doc_id="item-a")
+    b = build_document_card("setup.pdf", _steps(), doc_id="item-b")
+    assert card_point_id(a["doc_id"]) != card_point_id(b["doc_id"])
+
+    client = _FakeCardsClient(
+        {
+            "a/setup.pdf": ([1.0, 0.0], 1.0, ("doc_id", "item-a"), ("file_name", "setup.pdf")),
+            "b/setup.pdf": ([0.0, 1.0], 1.0, ("doc_id", "item-b"), ("file_name", "setup.pdf")),
+        }
+    )
+    router = DocumentRouter(client, refresh_s=0, rebuild_s=3600)
+    assert router.route([0.1, 0.9], k=2) == ["item-b", "item-a"]
+    assert len(router) == 2
+    assert router.file_names(["item-b"]) == ["setup.pdf"]
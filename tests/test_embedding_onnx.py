@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.embedding import onnx_minilm
+from src.embedding.onnx_minilm import plan_batches
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "hello": 2, "world": 3, "reset": 4, "printer": 5}
+# Token id -> hidden state; padding gets a huge vector so any leak into the mean shows.
+HIDDEN = [[100.0, 100.0, 100.0], [0.0, 0.0, 1.0], [3.0, 0.0, 0.0], [0.0, 4.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 2.0]]
+
+
+def test_plan_batches_covers_inputs_within_limits():
+    lengths = [5, 120, 7, 64, 3, 250, 9, 11]
+    batches = plan_batches(lengths, max_batch_size=3, max_batch_tokens=256)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    for b in batches:
+        assert len(b) <= 3
+        assert len(b) == 1 or len(b) * max(lengths[i] for i in b) <= 256
+
+
+def test_onnx_int8_vectors_agree_with_sentence_transformers():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("onnxruntime")
+    st = pytest.importorskip("sentence_transformers")
+    from src.embedding.onnx_minilm import MODEL_NAME, OnnxMiniLMEmbedding
+
+    try:
+        onnx_model = OnnxMiniLMEmbedding()
+        ref_model = st.SentenceTransformer(MODEL_NAME)
+    except Exception as exc:  # pragma: no cover - needs model download
+        pytest.skip(f"MiniLM weights unavailable: {exc}")
+
+    texts = [
+        "How do I enable MFA on my account?",
+        "### Step 3: Open the Barracuda Backup dashboard and select Retention Policies",
+        "External users must be invited from the SharePoint site settings page.",
+        "reset printer",
+    ]
+    ours = onnx_model.encode(texts)
+    ref = ref_model.encode(texts, normalize_embeddings=True)
+    cosines = (ours * ref).sum(axis=1)
+    assert ours.shape == ref.shape
+    assert float(np.min(cosines)) > 0.99
+
+
+class _StubSession:
+    """InferenceSession stand-in: last_hidden_state looks up HIDDEN per token id."""
+
+    def __init__(self, path, sess_options=None, providers=None):
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name=n) for n in ("input_ids", "attention_mask", "token_type_ids")]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name="last_hidden_state", shape=["batch", "sequence", "hidden"])]
+
+    def run(self, _outputs, feeds):
+        import numpy as np
+
+        self.feeds.append(feeds)
+        return [np.asarray(HIDDEN, dtype=np.float32)[feeds["input_ids"]]]
+
+
+def test_onnx_backend_tokenizes_pads_mean_pools_and_normalises(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    ort = pytest.importorskip("onnxruntime")
+    tokenizers = pytest.importorskip("tokenizers")
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(tmp_path / onnx_minilm.TOKENIZER_FILE))
+    (tmp_path / onnx_minilm.INT8_FILE).write_bytes(b"")  # prepare_model() finds the model in place
+    monkeypatch.setattr(ort, "InferenceSession", _StubSession)
+
+    model = onnx_minilm.OnnxMiniLMEmbedding(model_dir=tmp_path, max_length=3)
+    assert model.get_sentence_embedding_dimension() == 3  # symbolic output shape: probed once
+
+    vectors = model.encode(["hello world reset printer", "printer", "unknown"])
+    feeds = model.session.feeds[-1]  # one length-sorted batch, padded to the longest (truncated) text
+    assert feeds["input_ids"].tolist() == [[5, 0, 0], [1, 0, 0], [2, 3, 4]]
+    assert feeds["attention_mask"].tolist() == [[1, 0, 0], [1, 0, 0], [1, 1, 1]]
+    assert not feeds["token_type_ids"].any()
+
+    mean = np.mean([HIDDEN[2], HIDDEN[3], HIDDEN[4]], axis=0)  # "printer" truncated away
+    assert np.allclose(vectors[0], mean / np.linalg.norm(mean))
+    assert np.allclose(vectors[1], [0.0, 0.0, 1.0]) and np.allclose(vectors[2], [0.0, 0.0, 1.0])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+    model.max_batch_size, runs = 1, len(model.session.feeds)
+    assert np.allclose(model.get_text_embedding_batch(["hello", "printer"]), [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    assert len(model.session.feeds) == runs + 2  # one batch per text, results back in input order
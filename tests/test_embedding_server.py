@@ -0,0 +1,84 @@
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.embedding.client import EmbeddingMismatch, RemoteEmbedding
+from src.embedding.server import EmbeddingServer, MicroBatcher
+
+
+class _FakeModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def get_text_embedding_batch(self, texts, **_):
+        self.batch_sizes.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def get_text_embedding(self, text):
+        return self.get_text_embedding_batch([text])[0]
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    model = _FakeModel()
+    batcher = MicroBatcher(model.get_text_embedding_batch, max_batch_size=64, max_wait_ms=50)
+    try:
+        texts = ["a" * (i + 1) for i in range(16)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda t: batcher.embed([t], timeout=5), texts))
+    finally:
+        batcher.close()
+    assert [r[0][0] for r in results] == [float(len(t)) for t in texts]
+    assert sum(model.batch_sizes) == 16
+    assert len(model.batch_sizes) < 16
+
+
+def test_remote_embedding_round_trip_and_fallback():
+    model = _FakeModel()
+    server = EmbeddingServer(model, port=0, max_wait_ms=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        remote = RemoteEmbedding(f"http://{host}:{port}")
+        assert remote.health()["dim"] == 2
+        assert remote.get_text_embedding("abc") == [3.0, 1.0]
+        assert remote.get_text_embedding_batch(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        free_port = s.getsockname()[1]
+    fallback = _FakeModel()
+    absent = RemoteEmbedding(f"http://127.0.0.1:{free_port}", fallback_factory=lambda: fallback, timeout=1)
+    assert absent.health() is None
+    assert absent.get_text_embedding("abcd") == [4.0, 1.0]
+    assert fallback.batch_sizes == [1]
+
+
+class _WideModel(_FakeModel):
+    def get_text_embedding_batch(self, texts, **_):
+        return [vec + [0.0] for vec in super().get_text_embedding_batch(texts)]
+
+
+def test_remote_embedding_refuses_a_different_model():
+    server = EmbeddingServer(_FakeModel(), port=0, max_wait_ms=1, model_id="mini-lm")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    try:
+        assert RemoteEmbedding(url, model_id="mini-lm", dim=2).health()["model"] == "mini-lm"
+        with pytest.raises(EmbeddingMismatch, match="other-model"):
+            RemoteEmbedding(url, model_id="other-model").health()
+        with pytest.raises(EmbeddingMismatch, match="384"):
+            RemoteEmbedding(url, model_id="mini-lm", dim=384).health()
+
+        remote = RemoteEmbedding(url, fallback_factory=_WideModel, timeout=1, retry_after=0)
+        assert remote.health()["dim"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    with pytest.raises(EmbeddingMismatch, match="3-d"):  # service gone: a 3-d fallback must not stand in
+        remote.get_text_embedding("abc")
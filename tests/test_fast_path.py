@@ -0,0 +1,115 @@
+from src.text_indexing.fast_path import parse_hybrid
+from src.text_indexing.step_builder import build_steps
+
+
+def _pdf(pages):
+    """Minimal PDF; each page is {"lines": [(x, y, text)], "images": [(x, y, w, h, rgb)]}."""
+    objs = []
+
+    def add(body):
+        objs.append(body)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    contents = []
+    for page in pages:
+        stream, xobjects = b"", b""
+        if page.get("lines"):
+            shows = b"".join(b"1 0 0 1 %d %d Tm (%s) Tj " % (x, y, t.encode()) for x, y, t in page["lines"])
+            stream += b"BT /F1 12 Tf " + shows + b"ET "
+        for i, (x, y, w, h, rgb) in enumerate(page.get("images", [])):
+            data = bytes(rgb) * 400
+            im = add(
+                b"<< /Type /XObject /Subtype /Image /Width 20 /Height 20 /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n%s\nendstream" % (len(data), data)
+            )
+            xobjects += b"/Im%d %d 0 R " % (i, im)
+            stream += b"q %d 0 0 %d %d %d cm /Im%d Do Q " % (w, h, x, y, i)
+        contents.append((add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)), xobjects))
+    pages_id = len(objs) + len(contents) + 1
+    kids = [
+        add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> /XObject << %s>> >> >>" % (pages_id, cs, font, xo)
+        )
+        for cs, xo in contents
+    ]
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    root = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    out, offsets = b"%PDF-1.4\n", []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    return out + b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, root, xref)
+
+
+MANUAL = [
+    {
+        "lines": [
+            (72, 720, "Step 1: Open the panel"),
+            (72, 690, "Click Save to continue"),
+            (72, 676, "then press OK"),
+        ],
+        "images": [(72, 400, 200, 100, (200, 30, 30)), (300, 300, 8, 8, (0, 0, 0))],  # screenshot + bullet icon
+    },
+    {"images": [(0, 0, 612, 792, (240, 240, 240))]},  # scanned page: no text layer
+    {"lines": [(72, 720, "Review the summary before closing the dialog"), (72, 680, "Step 2: Close it")]},
+]
+
+
+def test_hybrid_routes_scanned_pages_to_docling_and_keeps_page_order(tmp_path):
+    pdf = tmp_path / "sop.pdf"
+    pdf.write_bytes(_pdf(MANUAL))
+    calls = []
+
+    def docling(first, last):
+        calls.append((first, last))
+        return [{"idx": 7, "type": "text", "text": "Scanned wiring diagram notes", "step": None}]
+
+    total, collected, report = parse_hybrid(pdf, "sop.pdf", docling)
+
+    assert total == 3 and calls == [(2, 2)]
+    assert [p["reason"] for p in report["pages"]] == ["text layer", "no text layer", "text layer"]
+    assert report["fast_pages"] == 2 and report["docling_pages"] == 1
+    assert [(c["type"], c.get("text"), c["step"]) for c in collected] == [
+        ("text", "Step 1: Open the panel", 1),
+        ("text", "Click Save to continue\nthen press OK", None),
+        ("image", None, None),
+        ("text", "Scanned wiring diagram notes", None),
+        ("text", "Review the summary before closing the dialog", None),
+        ("text", "Step 2: Close it", 2),
+    ]
+    image = collected[2]
+    assert set(image) == {"idx", "type", "image", "page", "step"} and image["page"] == 1
+    assert image["image"].size == (400, 200)  # 200x100pt at the docling crop scale
+    assert image["image"].getpixel((200, 100))[:3] == (200, 30, 30)
+    assert [c["idx"] for c in collected] == sorted({c["idx"] for c in collected})
+    steps = build_steps(collected)
+    assert [no for no, _ in steps] == [1, 2] and len(steps[0][1]["content"]) == 5
+
+
+def test_bytes_input_and_all_digital_never_calls_docling():
+    total, collected, report = parse_hybrid(_pdf([MANUAL[0], MANUAL[2]]), "sop.pdf", lambda *_: 1 / 0)
+    assert total == 2 and report["docling_pages"] == 0
+    assert sum(c["type"] == "image" for c in collected) == 1
+
+
+def test_short_text_runs_between_scanned_pages_join_one_docling_range(monkeypatch):
+    monkeypatch.delenv("FAST_PATH_MERGE_GAP", raising=False)
+    scanned = MANUAL[1]
+    calls = []
+
+    def docling(first, last):
+        calls.append((first, last))
+        return [{"idx": 0, "type": "text", "text": f"pages {first}-{last}", "step": None}]
+
+    pages = [MANUAL[0], scanned, MANUAL[2], scanned, MANUAL[2], MANUAL[2], MANUAL[2], scanned]
+    total, collected, report = parse_hybrid(_pdf(pages), "sop.pdf", docling)
+
+    assert calls == [(2, 4), (8, 8)]  # page 3 joins its neighbours; a run of three stays on the fast path
+    assert [p["route"] for p in report["pages"]] == ["fast"] + ["docling"] * 3 + ["fast"] * 3 + ["docling"]
+    assert report["pages"][2]["reason"] == "text layer" and report["docling_calls"] == 2
+    assert report["fast_pages"] == 4 and report["docling_pages"] == 4
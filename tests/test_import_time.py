@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Cold-import budget for a QA entry point (seconds); override on slow CI runners.
+STARTUP_BUDGET_S = float(os.getenv("QA_IMPORT_BUDGET_S", "1.5"))
+
+# Must not be imported until the first query/ingest actually needs them.
+DEFERRED_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "llama_index",
+    "docling",
+    "azure.storage.blob",
+    "openai",
+    "qdrant_client",
+    "pydantic_ai",
+]
+
+QA_ENTRY_POINTS = [
+    "src.wrappers.qa_service",
+    "src.wrappers.agent_service",
+    "src.retrieval",
+    "src.cli.mfa_markdown_rag",
+]
+
+
+def _cold_import(module: str) -> dict:
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", QA_ENTRY_POINTS)
+def test_qa_entry_point_defers_heavy_imports(module):
+    res = _cold_import(module)
+    assert res["loaded"] == [], f"{module} eagerly imports {res['loaded']}"
+    assert res["elapsed"] < STARTUP_BUDGET_S, f"{module} took {res['elapsed']:.2f}s to import"
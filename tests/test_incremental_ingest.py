@@ -0,0 +1,170 @@
+import requests
+
+from src.bridge.downloads import spool_path
+from src.text_indexing.incremental import IngestManifest, sync_folder
+
+
+def _item(fid, f):
+    return {
+        "id": fid,
+        "name": f["name"],
+        "eTag": f["eTag"],
+        "lastModified": f["eTag"],
+        "parentPath": f["parentPath"],
+        "deleted": False,
+    }
+
+
+class _FakeDrive:
+    def __init__(self):
+        self.files = {}  # id -> {name, eTag, data, parentPath}
+        self.changes = []
+        self.downloads = []
+        self.expired = False
+
+    def put(self, fid, name, data, etag, path="/drive/root:/Manuals"):
+        self.files[fid] = {"name": name, "data": data, "eTag": etag, "parentPath": path}
+        self.changes.append(_item(fid, self.files[fid]))
+
+    def remove(self, fid):
+        del self.files[fid]
+        self.changes.append({"id": fid, "deleted": True})
+
+    def delta(self, link):
+        if link and self.expired:
+            self.expired = False
+            resp = requests.Response()
+            resp.status_code = 410
+            raise requests.HTTPError(response=resp)
+        if link is None:
+            items = [_item(fid, f) for fid, f in self.files.items()]
+        else:
+            items = list(self.changes)
+        self.changes = []
+        return items, f"link-{len(self.downloads)}"
+
+    def list_files(self, folder_path, recursive=False):
+        return [_item(fid, f) for fid, f in self.files.items()]
+
+    def download_file(self, fid):
+        self.downloads.append(fid)
+        path = spool_path()
+        path.write_bytes(self.files[fid]["data"])
+        return path
+
+
+class _FakeIngestor:
+    def __init__(self):
+        self.indexed = []
+        self.deleted = []
+
+    def index_pdf(self, pdf, file_name, doc_id=None, doc_version=None):
+        self.indexed.append(file_name)
+        n = len(self.indexed)
+        blobs = [f"{file_name}/fig{n}.png", f"{file_name}/markdown.md"]
+        return {"doc_version": n, "point_ids": [f"p{n}"], "blob_names": blobs}
+
+    def delete_document(self, file_name, point_ids=None, blob_names=None, drop_card=True, doc_id=None):
+        self.deleted.append((file_name, list(point_ids or []), list(blob_names or []), drop_card))
+
+
+def test_sync_skips_unchanged_reprocesses_changed_and_tombstones_deleted(tmp_path):
+    drive, ingestor = _FakeDrive(), _FakeIngestor()
+    drive.put("a", "a.pdf", b"A1", "e1")
+    drive.put("b", "b.pdf", b"B1", "e1")
+    drive.put("n", "notes.txt", b"x", "e1")
+    drive.put("o", "other.pdf", b"O", "e1", path="/drive/root:/Elsewhere")
+    path = tmp_path / "manifest.json"
+
+    first = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert first["ingested"] == 2 and sorted(ingestor.indexed) == ["a.pdf", "b.pdf"]
+
+    # Nothing changed: no downloads at all.
+    drive.downloads.clear()
+    again = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert again["ingested"] == 0 and drive.downloads == []
+
+    drive.put("a", "a.pdf", b"A2", "e2")  # content change
+    drive.put("b", "b.pdf", b"B1", "e2")  # touched, same bytes
+    drive.remove("o")  # not ours: ignored
+    drive.expired = True  # stored link rejected -> full re-enumeration
+    third = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert third["ingested"] == 1 and third["skipped"] == 1
+    old_a = ingestor.deleted[-1]
+    assert old_a[0] == "a.pdf" and old_a[1] == ["p1"] and old_a[3] is False
+    assert old_a[2] == ["a.pdf/fig1.png"]  # markdown.md was overwritten in place
+
+    drive.remove("b")
+    fourth = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert fourth["deleted"] == 1
+    manifest = IngestManifest(path)
+    assert manifest.files["b"]["status"] == "deleted"
+    assert manifest.get("a")["content_hash"] and manifest.get("a")["point_ids"] == ["p3"]
+    assert manifest.delta_links["Manuals"]
+
+
+def test_listing_mode_detects_deletions(tmp_path):
+    drive, ingestor = _FakeDrive(), _FakeIngestor()
+    drive.put("a", "a.pdf", b"A1", "e1")
+    drive.put("b", "b.pdf", b"B1", "e1")
+    path = tmp_path / "manifest.json"
+    sync_folder(drive, ingestor, "Manuals", IngestManifest(path), use_delta=False)
+    drive.remove("a")
+    summary = sync_folder(drive, ingestor, "Manuals", IngestManifest(path), use_delta=False)
+    assert summary == {"ingested": 0, "skipped": 1, "deleted": 1, "failed": 0, "errors": []}
+
+
+class _TreeDrive(_FakeDrive):
+    """Delta items as Graph sends them: parentReference.id only, no path; folders included."""
+
+    def __init__(self):
+        super().__init__()
+        self.folders = {}  # id -> parent id
+
+    def folder_id(self, folder_path):
+        return {"Manuals": "M"}[folder_path]
+
+    def mkdir(self, fid, parent):
+        self.folders[fid] = parent
+        self.changes.append({"id": fid, "name": fid, "isFolder": True, "parentId": parent, "deleted": False})
+
+    def put(self, fid, name, data, etag, path="M"):
+        self.files[fid] = {"name": name, "data": data, "eTag": etag, "parentPath": path}
+        self.changes.append(self._file(fid))
+
+    def _file(self, fid):
+        f = self.files[fid]
+        return {**_item(fid, f), "parentPath": None, "parentId": f["parentPath"], "isFolder": False}
+
+    def delta(self, link):
+        if link is None:
+            folders = [
+                {"id": i, "name": i, "isFolder": True, "parentId": p, "deleted": False} for i, p in self.folders.items()
+            ]
+            self.changes = folders + [self._file(fid) for fid in self.files]
+        items, self.changes = self.changes, []
+        return items, f"link-{len(self.downloads)}"
+
+
+def test_subfolder_delta_follows_parent_ids(tmp_path):
+    drive, ingestor = _TreeDrive(), _FakeIngestor()
+    drive.mkdir("M", "root")
+    drive.mkdir("S", "M")
+    drive.mkdir("E", "root")
+    drive.put("a", "a.pdf", b"A1", "e1", path="S")
+    drive.put("b", "b.pdf", b"B1", "e1", path="M")
+    drive.put("o", "o.pdf", b"O1", "e1", path="E")
+    path = tmp_path / "manifest.json"
+
+    first = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert first["ingested"] == 2 and sorted(ingestor.indexed) == ["a.pdf", "b.pdf"]
+
+    drive.put("a", "a.pdf", b"A2", "e2", path="S")  # edited in a subfolder
+    edited = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    assert edited["ingested"] == 1 and edited["deleted"] == 0
+    assert IngestManifest(path).get("a")["content_hash"]
+
+    drive.mkdir("S", "E")  # subfolder moved out: its files leave the index without being listed
+    moved = sync_folder(drive, ingestor, "Manuals", IngestManifest(path))
+    manifest = IngestManifest(path)
+    assert moved["deleted"] == 1 and manifest.files["a"]["status"] == "deleted" and manifest.get("b")
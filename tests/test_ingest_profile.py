@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.text_indexing import profiling
+
+
+def _upload(n):
+    with profiling.stage("upload"):
+        time.sleep(0.02)
+    profiling.count("bytes_uploaded", n)
+
+
+def test_stages_and_counters_attributed_per_document_and_written(tmp_path, monkeypatch):
+    monkeypatch.delenv("INGEST_PROFILE", raising=False)
+    with profiling.profiling(out_dir=tmp_path, capture="cprofile") as profile:
+        for name, pages in (("a.pdf", 3), ("b.pdf", 5)):
+            with profiling.document(name):
+                with profiling.document(name):  # index_pdf -> index_parsed share one record
+                    with profiling.stage("parse"):
+                        time.sleep(0.01 * pages)
+                    profiling.count("pages", pages)
+                    threads = [threading.Thread(target=profiling.bind(_upload), args=(100,)) for _ in range(2)]
+                    for t in threads:
+                        t.start()
+                    for t in threads:
+                        t.join()
+        with pytest.raises(ValueError):
+            with profiling.document("broken.pdf"):
+                raise ValueError("bad pdf")
+        profiling.count("points", 7)  # e.g. a batched flush after the documents
+
+    report = json.loads(next(tmp_path.glob("ingest_profile_*.json")).read_text())
+    docs = {d["file_name"]: d for d in report["documents"]}
+    assert [d["ok"] for d in report["documents"]] == [True, True, False]
+    assert docs["broken.pdf"]["error"] == "bad pdf"
+    assert docs["b.pdf"]["counters"] == {"pages": 5, "bytes_uploaded": 200}
+    assert docs["b.pdf"]["stages"]["upload"]["calls"] == 2
+    assert docs["b.pdf"]["stages"]["parse"]["wall_s"] >= 0.05
+    assert report["run"]["counters"] == {"points": 7}
+    assert report["totals"]["counters"] == {"pages": 8, "bytes_uploaded": 400, "points": 7}
+    assert report["totals"]["documents"] == 3 and report["totals"]["failed"] == 1
+    assert report["slowest"] == "b.pdf" and report["slowest_profile"]["file_name"] == "b.pdf"
+    assert (tmp_path / report["slowest_profile"]["path"].split("/")[-1]).exists()
+    assert profile is not None and profiling._active.get() is None
+
+
+def test_instrumentation_is_inert_when_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_PROFILE", "0")
+    with profiling.profiling(out_dir=tmp_path) as profile:
+        with profiling.document("a.pdf"), profiling.stage("parse"):
+            profiling.count("pages", 1)
+    assert profile is None and list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_runs_keep_separate_reports(tmp_path, monkeypatch):
+    monkeypatch.delenv("INGEST_PROFILE", raising=False)
+    barrier, profiles = threading.Barrier(2), {}
+
+    def ingest(name, pages):
+        with profiling.profiling(out_dir=tmp_path / name) as profile, profiling.document(name):
+            barrier.wait()  # both runs are active at once
+            profiling.count("pages", pages)
+            barrier.wait()
+        profiles[name] = profile
+
+    threads = [threading.Thread(target=ingest, args=args) for args in (("a.pdf", 3), ("b.pdf", 5))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert profiles["a.pdf"] is not profiles["b.pdf"]
+    assert [d["counters"] for d in profiles["a.pdf"].documents] == [{"pages": 3}]
+    assert [d["counters"] for d in profiles["b.pdf"].documents] == [{"pages": 5}]
+    assert "process_peak_rss_mb" in profiles["a.pdf"].documents[0]
+
+
+def test_report_rounds_copies_not_the_live_records(tmp_path, monkeypatch):
+    monkeypatch.delenv("INGEST_PROFILE", raising=False)
+    with profiling.profiling(out_dir=tmp_path) as profile:
+        profiling.add_stage("embed", 0.0004, 0.0004)
+        assert profile.report()["run"]["stages"]["embed"]["wall_s"] == 0.0  # e.g. a progress log mid-run
+        profiling.add_stage("embed", 0.0004, 0.0004)
+    assert profile.run["stages"]["embed"]["wall_s"] == pytest.approx(0.0008)
+    assert profile.report()["totals"]["stages"]["embed"]["cpu_s"] == 0.001
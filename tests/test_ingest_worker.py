@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+import urllib.request
+
+from PIL import Image
+
+from src.text_indexing.ingest_worker import IngestWorker, StatusServer
+from src.text_indexing.job_queue import JobQueue
+
+
+class _Ingestor:
+    """Stage methods of LayoutAwareIngestor; `crash_in` raises once in that stage."""
+
+    def __init__(self, crash_in=None):
+        self.calls = []
+        self.crash_in = crash_in
+        self.deleted = []
+
+    def _stage(self, name):
+        self.calls.append(name)
+        if self.crash_in == name:
+            self.crash_in = None
+            raise RuntimeError(f"{name} crashed")
+
+    def parse_pdf(self, pdf, file_name):
+        self._stage("parse")
+        img = Image.new("RGB", (4, 4), (1, 2, 3))
+        text = {"idx": 0, "type": "text", "text": pdf.read_text(), "step": 1}
+        return 2, [text, {"idx": 1, "type": "image", "image": img}]
+
+    def render_parsed(self, collected, file_name, total_pages, doc_id=None, doc_version=None):
+        self._stage("render")
+        assert collected[1]["image"].getpixel((0, 0)) == (1, 2, 3)
+        payload = {"doc_id": doc_id, "doc_version": doc_version, "text": collected[0]["text"]}
+        card = {"file_name": file_name}
+        return {"payload": payload, "steps": [[1, "## Step 1"]], "card": card, "blob_names": ["b"]}
+
+    def embed_rendered(self, rendered):
+        self._stage("embed")
+        return {"doc": [0.5], "steps": [[0.25]], "card": [1.0]}
+
+    def upsert_rendered(self, rendered, vectors):
+        self._stage("upsert")
+        version = rendered["payload"]["doc_version"]
+        return {"doc_version": version, "point_ids": [f"p{version}", "card"], "blob_names": ["b"], "vectors": vectors}
+
+    def delete_document(self, file_name, point_ids=None, blob_names=None, drop_card=True, doc_id=None):
+        self.deleted.append((file_name, point_ids, blob_names, drop_card))
+
+
+def _download(file_id):
+    return f"pdf of {file_id}".encode()
+
+
+def test_restarted_worker_resumes_after_last_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_JOB_ATTEMPTS", "2")
+    queue = JobQueue(tmp_path / "q.sqlite")
+    job_id = queue.enqueue("item-1", "manual.pdf", folder="Docs", doc_version=1714557600)
+    assert queue.enqueue("item-1", "manual.pdf") == job_id  # already queued
+
+    crashing = _Ingestor(crash_in="embed")
+    worker = IngestWorker(
+        crashing, _download, queue=queue, checkpoint_dir=tmp_path / "ckpt", manifest_path=tmp_path / "m.json"
+    )
+    assert worker.run_once()
+    job = queue.get(job_id)
+    assert (job["status"], job["stage"], job["error"]) == ("queued", "render", "embed crashed")
+
+    # A fresh process (new queue connection, new models) picks the job up again.
+    resumed = _Ingestor()
+    worker = IngestWorker(
+        resumed,
+        _download,
+        queue=JobQueue(tmp_path / "q.sqlite"),
+        checkpoint_dir=tmp_path / "ckpt",
+        manifest_path=tmp_path / "m.json",
+    )
+    assert worker.run_once() and not worker.run_once()
+
+    assert crashing.calls == ["parse", "render", "embed"] and resumed.calls == ["embed", "upsert"]
+    job = queue.get(job_id)
+    assert job["status"] == "done" and job["attempts"] == 2
+    assert job["result"]["doc_version"] == 1714557600 and job["result"]["vectors"]["card"] == [1.0]
+    assert set(job["timings"]) == {"download", "parse", "render", "embed", "upsert"}
+    assert not (tmp_path / "ckpt" / str(job_id)).exists()
+
+    # Same content again: skipped via the manifest. A new revision replaces the old points.
+    manifest = json.loads((tmp_path / "m.json").read_text())["files"]["item-1"]
+    assert manifest["point_ids"] == ["p1714557600", "card"] and manifest["folder"] == "Docs"
+    queue.enqueue("item-1", "manual.pdf", folder="Docs", doc_version=1714557600)
+    assert worker.run_once() and resumed.calls[-1] == "upsert" and resumed.calls.count("parse") == 0
+    queue.enqueue("item-1", "manual.pdf", folder="Docs", doc_version=1714560000)
+    changed = IngestWorker(
+        resumed,
+        lambda fid: b"new revision",
+        queue=queue,
+        checkpoint_dir=tmp_path / "ckpt",
+        manifest_path=tmp_path / "m.json",
+    )
+    assert changed.run_once()
+    assert resumed.deleted == [("manual.pdf", ["p1714557600"], [], False)]
+
+
+def test_stage_with_missing_checkpoint_is_redone(tmp_path):
+    queue = JobQueue(tmp_path / "q.sqlite")
+    job_id = queue.enqueue("item-1", "manual.pdf")
+    ingestor = _Ingestor(crash_in="upsert")
+    worker = IngestWorker(
+        ingestor, _download, queue=queue, checkpoint_dir=tmp_path / "ckpt", manifest_path=tmp_path / "m.json"
+    )
+    assert worker.run_once() and queue.get(job_id)["stage"] == "embed"
+    (tmp_path / "ckpt" / str(job_id) / "rendered.json").unlink()  # e.g. a cleaned-up scratch disk
+
+    assert worker.run_once() and queue.get(job_id)["status"] == "done"
+    assert ingestor.calls == ["parse", "render", "embed", "upsert", "render", "embed", "upsert"]
+
+
+def test_only_expired_leases_are_reclaimed_and_attempts_capped(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_JOB_ATTEMPTS", "2")
+    queue = JobQueue(tmp_path / "q.sqlite", worker_id="w1")
+    job_id = queue.enqueue("a", "a.pdf")
+    assert queue.claim()["worker"] == "w1"
+    other = JobQueue(tmp_path / "q.sqlite", worker_id="w2")
+    assert other.recover() == [] and queue.get(job_id)["status"] == "running"  # w1 is alive
+
+    assert other.recover(lease_s=0) == [{"id": job_id, "status": "queued"}]  # w1 stopped heartbeating
+    assert not queue.heartbeat(job_id)
+    assert other.claim()["worker"] == "w2"
+    queue.complete(job_id, {"late": True})  # w1 waking up must not overwrite w2's job
+    assert queue.get(job_id)["status"] == "running"
+
+    assert other.recover(lease_s=0) == [{"id": job_id, "status": "failed"}]  # 2 attempts, both died
+    assert queue.get(job_id)["finished_at"] is not None
+
+
+def test_worker_that_lost_its_lease_abandons_the_job(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_JOB_LEASE_S", "1")
+    queue = JobQueue(tmp_path / "q.sqlite", worker_id="w1")
+    other = JobQueue(tmp_path / "q.sqlite", worker_id="w2")
+    job_id = queue.enqueue("item-1", "manual.pdf")
+
+    class _Stalled(_Ingestor):
+        def parse_pdf(self, pdf, file_name):
+            assert other.recover(lease_s=0) and other.claim()["worker"] == "w2"  # e.g. a long GC pause
+            time.sleep(0.5)  # the next heartbeat finds the job gone
+            return super().parse_pdf(pdf, file_name)
+
+    ingestor = _Stalled()
+    worker = IngestWorker(
+        ingestor, _download, queue=queue, checkpoint_dir=tmp_path / "ckpt", manifest_path=tmp_path / "m.json"
+    )
+    assert worker.run_once()
+
+    assert ingestor.calls == ["parse"]  # no further stage
+    job = queue.get(job_id)
+    assert (job["status"], job["worker"], job["error"]) == ("running", "w2", None)  # neither completed nor failed
+    assert not (tmp_path / "m.json").exists() and (tmp_path / "ckpt" / str(job_id)).exists()
+
+
+def test_interrupted_jobs_recovered_failures_capped_and_status_served(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_JOB_ATTEMPTS", "2")
+    queue = JobQueue(tmp_path / "q.sqlite")
+    stuck = queue.enqueue("a", "a.pdf")
+    broken = queue.enqueue("b", "b.pdf")
+    assert queue.claim()["id"] == stuck  # the worker holding it died
+    assert queue.recover(lease_s=0) == [{"id": stuck, "status": "queued"}]
+    monkeypatch.setenv("INGEST_JOB_ATTEMPTS", "1")
+
+    def download(file_id):
+        if file_id == "b":
+            raise OSError("gone")
+        return b"ok"
+
+    worker = IngestWorker(
+        _Ingestor(), download, queue=queue, checkpoint_dir=tmp_path / "ckpt", manifest_path=tmp_path / "m.json"
+    )
+    while worker.run_once():
+        pass
+    assert queue.get(broken)["status"] == "failed" and not (tmp_path / "ckpt" / str(broken)).exists()
+
+    server = StatusServer(worker, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/status"
+        status = json.loads(urllib.request.urlopen(url, timeout=5).read())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert status["counts"] == {"queued": 0, "running": 0, "done": 1, "failed": 1}
+    assert status["processed"] == 1 and status["done_in_window"] == 1 and status["docs_per_hour"] > 0
+    assert set(status["avg_stage_s"]) == {"download", "parse", "render", "embed", "upsert"}
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from PIL import Image
+
+from src.text_indexing.local_export import staged_export
+from src.text_indexing.markdown_builder import render_markdown, write_outputs
+
+
+class _Storage:
+    def __init__(self):
+        self.blobs = {}
+
+    def upload_and_get_sas(self, data, blob_name, **kwargs):
+        self.blobs[blob_name] = data
+        return f"https://blob/{blob_name}?sas"
+
+    def upload_many(self, jobs, **kwargs):
+        return [self.upload_and_get_sas(produce(), name) for produce, name in jobs]
+
+
+def _steps(shade):
+    image = {"type": "image", "image": Image.new("RGB", (4, 4), shade)}
+    return [(1, {"content": [{"type": "text", "text": "Open"}, image]})]
+
+
+def _export(doc_dir, shade, storage):
+    with staged_export(doc_dir) as export:
+        full_md, embed_md, sas_urls, fig_meta = render_markdown(_steps(shade), "m", export.fig_dir, storage)
+        export.relocate(fig_meta)
+        write_outputs(export.staging, full_md, embed_md, "m.pdf", sas_urls, fig_meta, storage, blob_prefix="m")
+    return fig_meta
+
+
+def test_export_swapped_in_whole_and_kept_when_regeneration_fails(tmp_path, monkeypatch):
+    monkeypatch.delenv("LOCAL_EXPORT", raising=False)
+    doc_dir, storage = tmp_path / "m", _Storage()
+    _export(doc_dir, (1, 2, 3), storage)
+    (doc_dir / "answer.md").write_text("stale")
+    fig_meta = _export(doc_dir, (9, 9, 9), storage)
+
+    with pytest.raises(RuntimeError):
+        with staged_export(doc_dir) as export:
+            (export.fig_dir / "fig_1_page_0.png").write_bytes(b"partial")
+            raise RuntimeError("crashed mid-render")
+
+    assert sorted(p.name for p in doc_dir.iterdir()) == ["images", "markdown.md", "metadata.json"]
+    assert fig_meta[0]["local_path"] == str(tmp_path.resolve() / "m" / "images" / "fig_1_page_0.png")
+    assert Image.open(fig_meta[0]["local_path"]).getpixel((0, 0)) == (9, 9, 9)
+    # doc_dir links to the live version; no staging, previous-version or link leftovers
+    assert doc_dir.is_symlink() and sorted(p.name for p in tmp_path.iterdir()) == sorted(["m", os.readlink(doc_dir)])
+
+
+def test_disabled_local_export_uploads_without_touching_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCAL_EXPORT", "0")
+    monkeypatch.chdir(tmp_path)
+    storage = _Storage()
+    with staged_export(tmp_path / "m") as export:
+        full_md, embed_md, sas_urls, fig_meta = render_markdown(_steps((5, 5, 5)), "m", None, storage)
+        md_path, md_sas, _ = write_outputs(
+            None, full_md, embed_md, "m.pdf", sas_urls, fig_meta, storage, blob_prefix="m"
+        )
+
+    assert export is None and md_path is None and fig_meta[0]["local_path"] is None
+    assert storage.blobs["m/markdown.md"] == full_md.encode() and md_sas.startswith("https://blob/m/markdown.md")
+    assert set(storage.blobs) == {"m/images/fig_1_page_0.png", "m/markdown.md", "m/metadata.json"}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pre_versioning_export_migrates_and_link_flip_is_atomic(tmp_path, monkeypatch):
+    monkeypatch.delenv("LOCAL_EXPORT", raising=False)
+    doc_dir = tmp_path / "m"
+    (doc_dir / "images").mkdir(parents=True)  # export written before versioned directories
+    (doc_dir / "markdown.md").write_text("legacy")
+    replaced = []
+    real_replace = os.replace
+
+    def watch(src, dst):
+        replaced.append((os.path.islink(src), os.path.exists(dst)))
+        real_replace(src, dst)
+
+    _export(doc_dir, (1, 2, 3), _Storage())
+    monkeypatch.setattr(os, "replace", watch)
+    _export(doc_dir, (4, 5, 6), _Storage())
+
+    assert replaced == [(True, True)]  # one rename of a link over the live one: doc_dir never missing
+    assert Image.open(doc_dir / "images" / "fig_1_page_0.png").getpixel((0, 0)) == (4, 5, 6)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["m", os.readlink(doc_dir)])
+
+
+def test_tree_moved_aside_by_an_interrupted_migration_is_restored(tmp_path, monkeypatch):
+    monkeypatch.delenv("LOCAL_EXPORT", raising=False)
+    aside = tmp_path / ".m.old-crashed" / "m"
+    aside.mkdir(parents=True)
+    (aside / "markdown.md").write_text("legacy")  # died between moving the old tree aside and linking
+
+    with pytest.raises(RuntimeError):
+        with staged_export(tmp_path / "m"):
+            raise RuntimeError("crashed mid-render")
+
+    assert (tmp_path / "m" / "markdown.md").read_text() == "legacy"
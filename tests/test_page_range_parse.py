@@ -0,0 +1,70 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from src.text_indexing.parallel_ingest import page_ranges, parse_in_ranges
+from src.text_indexing.step_builder import build_steps, detect_step_number
+
+TOTAL_PAGES = 45
+STEP_STARTS = {2: 1, 9: 2, 19: 3, 27: 4, 40: 5}  # with 7-page ranges, steps 2-5 cross range boundaries
+
+
+def _write_manual(path):
+    pages = []
+    for page in range(1, TOTAL_PAGES + 1):
+        texts = [f"Step {STEP_STARTS[page]}: Open panel {page}"] if page in STEP_STARTS else []
+        texts += [f"Click Next on page {page}", ""]
+        pages.append({"page": page, "texts": texts, "image": page % 3 == 0})
+    path.write_text(json.dumps([{"page": 0, "texts": ["Safety notice"], "image": False}] + pages))
+
+
+def _fake_convert(pdf, file_name, start, end):
+    """Stands in for docling with page_range: idx restarts per conversion, pages stay absolute."""
+    collected = []
+    idx = 0
+    for page in json.loads(pdf.read_text()):
+        if not (start <= max(page["page"], 1) <= end):
+            continue
+        for text in page["texts"]:
+            idx += 1
+            if text:
+                collected.append({"idx": idx, "type": "text", "text": text, "step": detect_step_number(text)})
+        if page["image"]:
+            idx += 1
+            img = Image.new("RGB", (4, 4), (page["page"], 0, 0))
+            collected.append({"idx": idx, "type": "image", "image": img, "page": page["page"], "step": None})
+    return collected
+
+
+def _comparable(items):
+    return [(i["type"], i.get("text") or i["image"].tobytes(), i.get("page"), i["step"]) for i in items]
+
+
+def _steps(collected):
+    return [
+        (no, [c.get("text") or c["image"].tobytes() for c in data["content"]]) for no, data in build_steps(collected)
+    ]
+
+
+def test_page_ranges_cover_every_page_once():
+    assert page_ranges(45, 20) == [(1, 20), (21, 40), (41, 45)]
+    assert page_ranges(3, 20) == [(1, 3)]
+
+
+def test_parallel_ranges_match_serial_conversion(tmp_path):
+    pdf = tmp_path / "manual.pdf"
+    _write_manual(pdf)
+    serial = _fake_convert(pdf, "manual.pdf", 1, TOTAL_PAGES)
+
+    with ProcessPoolExecutor(max_workers=3, mp_context=multiprocessing.get_context("spawn")) as pool:
+        parallel = parse_in_ranges(
+            pdf, "manual.pdf", TOTAL_PAGES, workers=3, size=7, pool=pool, convert_fn=_fake_convert
+        )
+
+    assert _comparable(parallel) == _comparable(serial)
+    assert _steps(parallel) == _steps(serial)
+    assert [no for no, _ in _steps(parallel)] == [1, 2, 3, 4, 5]
+    idx = [i["idx"] for i in parallel]
+    assert idx == sorted(set(idx))  # still unique and increasing across ranges
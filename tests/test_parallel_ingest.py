@@ -0,0 +1,98 @@
+import os
+import time
+
+from src.text_indexing.parallel_ingest import ingest_files_parallel, iter_converted
+
+
+def _noop_init(*_):
+    pass
+
+
+def _fake_convert(pdf_bytes, file_name):
+    if file_name == "crash.pdf":
+        os._exit(1)  # simulate a segfaulting converter
+    if file_name == "bad.pdf":
+        raise ValueError("unparseable")
+    return {"collected": [{"type": "text", "text": pdf_bytes.decode()}], "total_pages": 1, "convert_s": 0.0}
+
+
+def _download(file_id):
+    if file_id == "missing":
+        raise IOError("404")
+    return f"content of {file_id}".encode()
+
+
+def test_iter_converted_streams_results_and_isolates_failures():
+    items = [(f"id{i}", f"doc{i}.pdf") for i in range(6)] + [("missing", "gone.pdf"), ("idx", "bad.pdf")]
+    results = {
+        name: (parsed, error)
+        for _fid, name, parsed, error in iter_converted(
+            items, _download, workers=2, dl_workers=2, convert_fn=_fake_convert, initializer=_noop_init
+        )
+    }
+    assert set(results) == {name for _, name in items}
+    assert results["doc3.pdf"][0]["collected"][0]["text"] == "content of id3"
+    assert isinstance(results["gone.pdf"][1], IOError)
+    assert isinstance(results["bad.pdf"][1], ValueError)
+
+
+def test_crashed_worker_does_not_sink_the_batch():
+    items = [("id0", "doc0.pdf"), ("idc", "crash.pdf"), ("id1", "doc1.pdf")]
+    results = {
+        name: error
+        for _fid, name, _parsed, error in iter_converted(
+            items,
+            _download,
+            workers=1,
+            dl_workers=1,
+            convert_fn=_fake_convert,
+            initializer=_noop_init,
+            max_in_flight=1,
+        )
+    }
+    assert results["doc0.pdf"] is None and results["doc1.pdf"] is None
+    assert results["crash.pdf"] is not None
+
+
+def _slow_convert(pdf_bytes, file_name):
+    time.sleep(0.3)  # still converting when crash.pdf takes the pool down
+    return _fake_convert(pdf_bytes, file_name)
+
+
+def test_only_the_crashing_file_fails_when_it_shares_the_pool():
+    items = [(f"id{i}", f"doc{i}.pdf") for i in range(4)] + [("idc", "crash.pdf")] + [("id9", "doc9.pdf")]
+    results = {
+        name: error
+        for _fid, name, _parsed, error in iter_converted(
+            items,
+            _download,
+            workers=3,
+            dl_workers=3,
+            convert_fn=_slow_convert,
+            initializer=_noop_init,
+            max_in_flight=6,
+        )
+    }
+    assert set(results) == {name for _, name in items}
+    assert {name for name, error in results.items() if error is not None} == {"crash.pdf"}
+
+
+class _FakeIngestor:
+    def __init__(self):
+        self.indexed = []
+
+    def index_parsed(self, collected, file_name, total_pages=0, doc_id=None, doc_version=None):
+        if file_name == "doc1.pdf":
+            raise RuntimeError("qdrant down")
+        self.indexed.append((doc_id, file_name, total_pages))
+
+
+def test_ingest_files_parallel_counts_failures(monkeypatch):
+    import src.text_indexing.parallel_ingest as pi
+
+    monkeypatch.setattr(pi, "convert_pdf", _fake_convert)
+    monkeypatch.setattr(pi, "init_converter_worker", _noop_init)
+    ingestor = _FakeIngestor()
+    summary = ingest_files_parallel(ingestor, [("id0", "doc0.pdf"), ("id1", "doc1.pdf")], _download, workers=2)
+    assert summary["processed"] == 1 and summary["failed"] == 1
+    assert ingestor.indexed == [("id0", "doc0.pdf", 1)]
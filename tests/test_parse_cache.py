@@ -0,0 +1,67 @@
+import os
+
+from PIL import Image
+
+from src.text_indexing import parse_cache
+from src.text_indexing.parse_cache import ParseCache, cached_parse
+
+
+def _collected(seed):
+    img = Image.new("RGB", (64, 48), (seed, 120, 30))
+    return [
+        {"idx": 0, "type": "text", "text": "Step 1: Open the panel", "step": 1},
+        {"idx": 3, "type": "image", "image": img, "page": 2, "step": None},
+    ]
+
+
+def test_second_parse_of_same_content_is_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("PARSE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("FAST_PATH", raising=False)
+    parse_cache.get_parse_cache.cache_clear()
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4 same bytes")
+    calls = []
+
+    def parse():
+        calls.append(1)
+        return 4, _collected(200)
+
+    try:
+        first = cached_parse(pdf, "manual.pdf", parse)
+        renamed = tmp_path / "renamed.pdf"
+        renamed.write_bytes(pdf.read_bytes())
+        total, collected = cached_parse(renamed, "renamed.pdf", parse)
+        monkeypatch.setenv("FAST_PATH", "1")  # different parse options: a different entry
+        cached_parse(pdf.read_bytes(), "manual.pdf", parse)
+    finally:
+        parse_cache.get_parse_cache.cache_clear()
+
+    assert len(calls) == 2 and total == first[0] == 4
+    assert [{k: v for k, v in c.items() if k != "image"} for c in collected] == [
+        {k: v for k, v in c.items() if k != "image"} for c in first[1]
+    ]
+    assert collected[1]["image"].tobytes() == first[1][1]["image"].tobytes()
+    assert len(list((tmp_path / "cache").glob("*.zip"))) == 2
+
+
+def test_least_recently_used_entries_evicted_beyond_size_cap(tmp_path):
+    cache = ParseCache(tmp_path, max_bytes=10**9)
+    for n, digest in enumerate(["a", "b", "c"]):
+        cache.put(digest, 1, _collected(n), options="o")
+        os.utime(tmp_path / f"{digest}-o.zip", (1000 + n, 1000 + n))
+    assert cache.get("a", "o") is not None  # touched: now the most recent
+    entry = (tmp_path / "a-o.zip").stat().st_size
+    cache.max_bytes = 2 * entry + entry // 2
+
+    assert cache.evict() == 1
+    assert cache.get("b", "o") is None and cache.get("a", "o") and cache.get("c", "o")
+
+
+def test_options_hash_tracks_pipeline_options_and_parser_code(monkeypatch):
+    monkeypatch.delenv("FAST_PATH", raising=False)
+    base = parse_cache.options_hash()
+    monkeypatch.setattr(parse_cache, "_docling_options", lambda: {"images_scale": 3.0})
+    scaled = parse_cache.options_hash()
+    monkeypatch.setattr(parse_cache, "_code_fingerprint", lambda: "edited")
+
+    assert len({base, scaled, parse_cache.options_hash()}) == 3
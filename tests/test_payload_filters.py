@@ -0,0 +1,51 @@
+import warnings
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.retrieval import multimodal_service as mms
+from src.retrieval.filters import merge_filters, payload_filter
+from src.text_indexing.markdown_builder import split_steps
+from src.text_indexing.qdrant_writer import ensure_payload_indexes
+
+
+def test_payload_filter_maps_scalars_lists_and_ranges():
+    flt = payload_filter(
+        {"file_name": ["a.pdf", "b.pdf"]}, doc_type="markdown_step", step={"gte": 2, "lte": 4}, doc_version=None
+    )
+    by_key = {c.key: c for c in flt.must}
+    assert by_key["file_name"].match.any == ["a.pdf", "b.pdf"]
+    assert by_key["doc_type"].match.value == "markdown_step"
+    assert (by_key["step"].range.gte, by_key["step"].range.lte) == (2, 4)
+    assert "doc_version" not in by_key
+    assert payload_filter() is None
+    assert len(merge_filters(flt, None, payload_filter(doc_id="x")).must) == 4
+
+
+def test_split_steps_round_trips_render_markdown_sections():
+    md = "### Step 1: Open\n\nOpen the app\n\n---\n\n### Step 2: Save\n\n![Step 2 Visual](https://x/y.png)\n\n---"
+    assert split_steps(md) == [
+        (1, "### Step 1: Open\n\nOpen the app"),
+        (2, "### Step 2: Save\n\n![Step 2 Visual](https://x/y.png)"),
+    ]
+
+
+def test_neighbor_steps_returns_latest_version_in_step_order(monkeypatch):
+    client = QdrantClient(":memory:")
+    client.create_collection("manuals_text", vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ensure_payload_indexes(client, "manuals_text")
+
+    points = []
+    for pid, (name, step, version) in enumerate(
+        [("a.pdf", s, 1) for s in range(1, 6)] + [("a.pdf", 3, 2), ("b.pdf", 3, 1)]
+    ):
+        payload = {"file_name": name, "doc_type": "markdown_step", "step": step, "doc_version": version}
+        points.append(models.PointStruct(id=pid, vector=[1.0, 0.0], payload=payload))
+    client.upsert("manuals_text", points=points)
+    monkeypatch.setattr(mms, "_text_client_model", lambda: (client, None))
+
+    steps = mms.neighbor_steps("a.pdf", 3)
+    assert [(p["step"], p["doc_version"]) for p in steps] == [(2, 1), (3, 2), (4, 1)]
+    assert [p["step"] for p in mms.neighbor_steps("a.pdf", 1, doc_version=1)] == [1, 2]
@@ -0,0 +1,80 @@
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.cli.qdrant_cleanup import dedupe_collection
+from src.text_indexing.qdrant_writer import point_id, replace_document
+
+
+def _client():
+    client = QdrantClient(":memory:")
+    client.create_collection("c", vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE))
+    return client
+
+
+def _put(client, pid, **payload):
+    client.upsert("c", points=[models.PointStruct(id=pid, vector=[1.0, 0.0], payload=payload)])
+
+
+def _payloads(client):
+    points, _ = client.scroll("c", limit=100, with_payload=True)
+    rows = [
+        (p.payload.get("file_name"), p.payload.get("doc_version"), p.payload.get("current"), p.payload.get("step"))
+        for p in points
+    ]
+    return sorted(rows, key=str)
+
+
+def test_point_ids_are_deterministic():
+    assert point_id("doc", 0, 1) == point_id("doc", 0, 1)
+    assert len({point_id("doc", 0, 1), point_id("doc", 1, 1), point_id("doc", 0, 2)}) == 3
+
+
+def test_replace_document_flips_new_version_and_drops_old_ones():
+    client = _client()
+    _put(client, 1, file_name="a.pdf", doc_type="markdown_bridge")  # legacy, no doc_id
+    _put(client, 2, doc_id="A", file_name="a.pdf", doc_version=1, current=True, doc_type="markdown_bridge")
+    _put(client, 3, doc_id="A", file_name="a.pdf", doc_version=2, current=False, doc_type="markdown_bridge")
+    _put(client, 4, doc_id="A", file_name="a.pdf", doc_version=2, current=False, doc_type="markdown_step", step=1)
+    _put(client, 5, doc_id="B", file_name="b.pdf", doc_version=1, current=True, doc_type="markdown_bridge")
+
+    replace_document(client, "c", "A", 2, file_name="a.pdf")
+    assert _payloads(client) == [
+        ("a.pdf", 2, True, 1),
+        ("a.pdf", 2, True, None),
+        ("b.pdf", 1, True, None),
+    ]
+
+
+def test_dedupe_keeps_newest_complete_version_and_one_copy_per_chunk():
+    client = _client()
+    _put(client, 1, file_name="a.pdf", doc_type="markdown_bridge")
+    _put(client, 2, file_name="a.pdf", doc_type="markdown_bridge")
+    _put(client, 3, doc_id="B", file_name="b.pdf", doc_version=1, current=True, doc_type="markdown_bridge")
+    _put(client, 4, doc_id="B", file_name="b.pdf", doc_version=2, current=False, doc_type="markdown_bridge")
+    _put(client, 5, doc_id="C", file_name="c.pdf", doc_version=3, current=False, doc_type="markdown_bridge")
+    _put(client, 6, source_md="guide.md", step=1)
+    _put(client, 7, source_md="guide.md", step=1)
+    _put(client, 8, source_md="guide.md", step=2)
+
+    assert dedupe_collection(client, "c", dry_run=True)["deleted"] == 3
+    assert len(client.scroll("c", limit=100)[0]) == 8
+
+    stats = dedupe_collection(client, "c")
+    assert stats == {"points": 8, "deleted": 3, "activated": 1}
+    remaining = {p.id: p.payload for p in client.scroll("c", limit=100, with_payload=True)[0]}
+    assert set(remaining) == {1, 3, 5, 6, 8}
+    assert remaining[5]["current"] is True
+
+
+def test_dedupe_folds_legacy_points_into_the_ingest_doc_id():
+    client = _client()
+    _put(client, 1, file_name="a.pdf", doc_type="markdown_bridge")  # written before doc_id existed
+    _put(client, 2, doc_id="A", file_name="a.pdf", doc_version=2, current=True, doc_type="markdown_bridge")
+    _put(client, 3, source_md="guide.md", step=1)
+    _put(client, 4, doc_id="guide.md", source_md="guide.md", doc_version=5, step=1)
+    _put(client, 5, file_name="same.pdf", doc_type="markdown_bridge")  # ambiguous: two doc_ids share the name
+    _put(client, 6, doc_id="S1", file_name="same.pdf", doc_version=1, current=True, doc_type="markdown_bridge")
+    _put(client, 7, doc_id="S2", file_name="same.pdf", doc_version=1, current=True, doc_type="markdown_bridge")
+
+    dedupe_collection(client, "c")
+    assert sorted(p.id for p in client.scroll("c", limit=100)[0]) == [2, 4, 5, 6, 7]
@@ -18,3 +18,90 @@ def test_interleave_uses_sas_urls_when_missing_images():
     assert len(imgs) == len(sas)
 
 
+class _Hit:
+    def __init__(self, id, score, payload):
+        self.id, self.score, self.payload = id, score, payload
+
+
+class _Embed:
+    def get_text_embedding_batch(self, texts):
+        return [[1.0 if "printer" in t.lower() else 0.0] for t in texts]
+
+
+def test_dedupe_hits_keeps_best_per_file_within_score_gap():
+    from src.retrieval.multimodal_service import _dedupe_hits
+
+    hits = [
+        _Hit(1, 0.80, {"file_name": "a.pdf"}),
+        _Hit(2, 0.75, {"file_name": "a.pdf"}),
+        _Hit(3, 0.74, {"file_name": "b.pdf"}),
+        _Hit(4, 0.40, {"file_name": "c.pdf"}),
+    ]
+    kept = _dedupe_hits(hits, top_k=5, score_gap=0.1)
+    assert [h.payload["file_name"] for h in kept] == ["a.pdf", "b.pdf"]
+
+
+def test_pack_documents_injects_small_docs_and_chunks_the_rest():
+    from src.retrieval.multimodal_service import _pack_documents
+
+    small = "### Step 1: Backup\n\nOpen the dashboard."
+    big = "\n\n".join(
+        [f"### Step {i}: Misc\n\n" + "filler text " * 200 for i in range(1, 6)]
+        + ["### Step 6: Printer\n\nReset the printer ![v](http://x/p.png?sig)"]
+    )
+    hits = [
+        _Hit(1, 0.9, {"file_name": "small.pdf", "total_pages": 2, "llm_markdown": small, "sas_urls": []}),
+        _Hit(2, 0.85, {"file_name": "big.pdf", "total_pages": 40, "llm_markdown": big, "sas_urls": ["http://x/p.png?sig"]}),
+    ]
+    docs = _pack_documents(hits, [1.0], _Embed(), token_budget=700)
+    assert [(d["file_name"], d["mode"]) for d in docs] == [("small.pdf", "full_doc"), ("big.pdf", "chunk")]
+    assert "Reset the printer" in docs[1]["markdown"]
+    assert docs[1]["sas_urls"] == ["http://x/p.png?sig"]
+    assert sum(d["tokens"] for d in docs) <= 700
+
+
+class _NoEmbed:
+    def get_text_embedding_batch(self, texts):
+        raise AssertionError("sections must not be re-embedded per query")
+
+
+def test_sections_ranked_from_stored_step_vectors():
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    from src.retrieval.multimodal_service import _pack_documents
+
+    client = QdrantClient(":memory:")
+    client.create_collection("manuals_text", vectors_config=models.VectorParams(size=2, distance=models.Distance.DOT))
+    steps = {1: ("Misc ", [0.0, 1.0]), 2: ("Reset the printer ", [1.0, 0.0]), 3: ("Misc ", [0.0, 1.0])}
+    client.upsert(
+        "manuals_text",
+        [
+            models.PointStruct(
+                id=step,
+                vector=vec,
+                payload={
+                    "doc_id": "big",
+                    "doc_version": 2,
+                    "doc_type": "markdown_step",
+                    "step": step,
+                    "llm_markdown": f"### Step {step}: {text}\n\n" + text * 150,
+                },
+            )
+            for step, (text, vec) in steps.items()
+        ],
+    )
+    payload = {"doc_id": "big", "doc_version": 2, "file_name": "big.pdf", "total_pages": 40, "llm_markdown": "x"}
+    docs = _pack_documents([_Hit(9, 0.8, payload)], [1.0, 0.0], _NoEmbed(), token_budget=500, client=client)
+
+    assert docs[0]["mode"] == "chunk" and docs[0]["markdown"].startswith("### Step 2: Reset the printer")
+    assert "Step 1" not in docs[0]["markdown"] and docs[0]["tokens"] <= 500
+
+
+def test_single_section_over_budget_is_truncated():
+    from src.retrieval.multimodal_service import _select_sections, estimate_tokens
+
+    section = "### Step 1: Printer\n\n" + "reset the printer tray " * 300 + "\n![v](http://x/p.png?sig)"
+    packed = _select_sections(section, [1.0], _Embed(), budget=100)
+    assert packed.startswith("### Step 1: Printer") and estimate_tokens(packed) <= 100
+    assert "http://x/p.png" not in packed
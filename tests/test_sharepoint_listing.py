@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+from azure.core.credentials import AccessToken
+
+from src.bridge.sharepoint_connector import SharePointConnector
+from src.text_indexing.incremental import IngestManifest, sync_folder
+
+DRIVE = "drive-0123456789"
+TREE = {
+    "root": [f"manual_{i:03d}.pdf" for i in range(450)] + ["sub1/", "sub2/"],
+    "sub1": ["a.pdf", "b.pdf", "notes.txt", "sub1a/"],
+    "sub1a": ["deep_1.pdf", "deep_2.pdf"],
+    "sub2": [f"s2_{i}.pdf" for i in range(5)],
+}
+PARENTS = {"root": "Manuals", "sub1": "Manuals/sub1", "sub1a": "Manuals/sub1/sub1a", "sub2": "Manuals/sub2"}
+FOLDER_PARENT = {"root": "drive-root", "sub1": "root", "sub1a": "sub1", "sub2": "root"}
+
+
+def _file(folder, name):
+    return {
+        "id": f"{folder}-{name}",
+        "name": name,
+        "eTag": '"1"',
+        "lastModifiedDateTime": "2024-05-01T10:00:00Z",
+        "file": {},
+        "parentReference": {"id": folder, "path": f"/drive/root:/{PARENTS[folder]}"},
+    }
+
+
+def _delta_items():
+    """Graph delta items carry parentReference.id but never parentReference.path."""
+    folders = [{"id": f, "name": f, "folder": {}, "parentReference": {"id": p}} for f, p in FOLDER_PARENT.items()]
+    files = [dict(f, parentReference={"id": f["parentReference"]["id"]}) for f in FILES.values()]
+    return folders + files
+
+
+FILES = {f["id"]: f for folder, names in TREE.items() for f in (_file(folder, n) for n in names if "/" not in n)}
+
+
+class _MockGraph(BaseHTTPRequestHandler):
+    """
+    Drives, paged children ($top / $skiptoken), item metadata, delta, downloads and $batch.
+    Paths listed in `throttle` answer 429 once (inside a batch: as that sub-response).
+    """
+
+    protocol_version = "HTTP/1.1"
+    log = []
+    batches = []
+    throttle = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if isinstance(body, bytes) else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, raw_url):
+        url = urlparse(raw_url)
+        path, query = unquote(url.path), parse_qs(url.query)
+        with self.lock:
+            type(self).log.append((path, query))
+            if path in self.throttle:
+                self.throttle.discard(path)
+                return 429, {"error": {"code": "TooManyRequests"}}, {"Retry-After": "0"}
+        host = f"http://{self.headers['Host']}"
+        if path.endswith("/sites/site-1/drives"):
+            return 200, {"value": [{"id": "other", "name": "Site Assets"}, {"id": DRIVE, "name": "Documents"}]}, {}
+        if path.startswith("/dl/"):
+            return 200, path[4:].encode(), {}
+        if path.endswith("/root/delta"):
+            return 200, {"value": _delta_items(), "@odata.deltaLink": f"{host}/v1.0/delta-next"}, {}
+        if "/root:/" in path and not path.endswith("/children"):
+            folder = next(f for f, p in PARENTS.items() if path.endswith(f"/root:/{p}"))
+            return 200, {"id": folder}, {}
+        if path.endswith("/content"):
+            return 200, path.split("/items/", 1)[1][: -len("/content")].encode(), {}
+        if path.endswith("/root:/Manuals:/children") or path.endswith("/children"):
+            folder = "root" if ":/children" in path else path.split("/items/", 1)[1].split("/", 1)[0]
+            top = int(query.get("$top", ["200"])[0])
+            skip = int(query.get("$skiptoken", ["0"])[0])
+            names = TREE[folder]
+            value = [
+                {"id": n.rstrip("/"), "name": n.rstrip("/"), "folder": {}} if n.endswith("/") else _file(folder, n)
+                for n in names[skip : skip + top]
+            ]
+            body = {"value": value}
+            if skip + top < len(names):
+                body["@odata.nextLink"] = f"{host}{url.path}?$top={top}&$skiptoken={skip + top}"
+            return 200, body, {}
+        item_id = path.split("/items/", 1)[1]
+        if item_id not in FILES:
+            return 404, {"error": {"code": "itemNotFound"}}, {}
+        return 200, dict(FILES[item_id], **{"@microsoft.graph.downloadUrl": f"{host}/dl/{item_id}"}), {}
+
+    def do_GET(self):
+        self._send(*self._route(self.path))
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        subs = payload["requests"]
+        with self.lock:
+            type(self).batches.append(len(subs))
+        responses = []
+        for sub in reversed(subs):  # Graph does not promise response order
+            status, body, headers = self._route("/v1.0" + sub["url"])
+            responses.append({"id": sub["id"], "status": status, "headers": headers, "body": body})
+        self._send(200 if len(subs) <= 20 else 400, {"responses": responses})
+
+
+class _Credential:
+    def __init__(self):
+        self.calls = 0
+
+    def get_token(self, *scopes):
+        self.calls += 1
+        return AccessToken(f"tok{self.calls}", int(time.time()) + 3600)
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    _MockGraph.log, _MockGraph.batches, _MockGraph.throttle = [], [], set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockGraph)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GRAPH_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1.0")
+    sp = SharePointConnector("tenant", "client", "secret", site_id="site-1", max_workers=4)
+    sp.credential = _Credential()
+    yield sp
+    server.shutdown()
+    server.server_close()
+
+
+def test_listing_pages_walks_subfolders_and_honours_throttling(graph):
+    _MockGraph.throttle = {f"/v1.0/drives/{DRIVE}/items/sub2/children"}
+    flat = graph.list_files("Manuals")
+    tree = graph.list_files("Manuals", recursive=True)
+
+    assert len(flat) == 452 and sum(i["isFolder"] for i in flat) == 2  # beyond the 200-item first page
+    names = {i["name"] for i in tree}
+    assert len(tree) == 460 and {"deep_2.pdf", "s2_4.pdf", "notes.txt"} <= names and "sub1" not in names
+    assert graph.credential.calls == 1  # token cached across every request
+    paths = [p for p, _ in _MockGraph.log]
+    assert sum(p.endswith("/drives") for p in paths) == 1  # drive resolved once
+    assert paths.count(f"/v1.0/drives/{DRIVE}/items/sub2/children") == 2  # 429, then retried
+    assert _MockGraph.batches == [2, 1, 1]  # sub1+sub2, throttled sub2 again, then sub1a
+    first_page = next(q for p, q in _MockGraph.log if p.endswith(":/children"))
+    assert "file" in first_page["$select"][0] and first_page["$top"] == ["200"]
+
+
+def test_token_refreshed_near_expiry():
+    sp = SharePointConnector("tenant", "client", "secret", site_id="site-1")
+    sp.credential = credential = _Credential()
+    assert sp._token() == sp._token() == "tok1"
+    sp._access_token = AccessToken("old", int(time.time()) + 60)
+    assert sp._token() == "tok2" and credential.calls == 2
+
+
+def test_get_items_batches_by_twenty_and_retries_throttled_subrequests(graph):
+    ids = [f"root-manual_{i:03d}.pdf" for i in range(44)] + ["gone"]
+    _MockGraph.throttle = {f"/v1.0/drives/{DRIVE}/items/{ids[3]}", f"/v1.0/drives/{DRIVE}/items/{ids[30]}"}
+    items = graph.get_items(ids)
+
+    assert sorted(_MockGraph.batches) == [1, 1, 5, 20, 20]  # 45 ids in 3 calls + one retry per throttled id
+    assert list(items) == ids[:44]  # input order, deleted item left out
+    assert items[ids[3]]["name"] == "manual_003.pdf" and items[ids[3]]["downloadUrl"].endswith(f"/dl/{ids[3]}")
+
+
+class _Ingestor:
+    def __init__(self):
+        self.seen = {}
+
+    def index_pdf(self, pdf, file_name, doc_id=None, doc_version=None):
+        self.seen[file_name] = pdf.read_bytes()
+        return {"doc_version": doc_version, "point_ids": [], "blob_names": []}
+
+    def delete_document(self, *args, **kwargs):
+        pass
+
+
+def test_sync_downloads_through_batched_download_urls(graph, tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_SPOOL_DIR", str(tmp_path / "spool"))
+    ingestor = _Ingestor()
+    summary = sync_folder(graph, ingestor, "Manuals/sub1", manifest=IngestManifest(tmp_path / "m.json"))
+
+    assert summary["ingested"] == 4 and not summary["errors"]  # a, b + sub1a's deep_1, deep_2
+    assert ingestor.seen["deep_1.pdf"] == b"sub1a-deep_1.pdf"
+    assert _MockGraph.batches == [4]  # one batched metadata lookup for every changed file
+    paths = [p for p, _ in _MockGraph.log]
+    assert not any(p.endswith("/content") for p in paths)  # no per-file Graph redirect
+    assert list((tmp_path / "spool").iterdir()) == []
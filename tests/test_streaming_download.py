@@ -0,0 +1,161 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import ServiceResponseError
+
+from src.bridge import raw_blob_reader
+from src.bridge.downloads import stream_to_file, temporary_download
+from src.bridge.raw_blob_reader import RawFilesBlobReader
+from src.text_indexing.parallel_ingest import iter_converted
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 17)
+_spool_dir = None  # set per test; downloads run in the parent process
+
+
+class _FlakyFile(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support; the first response dies a third of the way in."""
+
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+    honour_range = True
+    etag = '"v1"'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        rng = self.headers.get("Range")
+        self.requests_seen.append((rng, self.headers.get("If-Range"), self.headers.get("Authorization")))
+        start = int(rng[len("bytes=") : -1]) if rng and self.honour_range else 0
+        body = PAYLOAD[start:]
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.etag:
+            self.send_header("ETag", self.etag)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        self.end_headers()
+        if len(self.requests_seen) == 1:
+            self.wfile.write(body[: len(body) // 3])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+
+def _download(tmp_path, monkeypatch, honour_range, etag='"v1"'):
+    monkeypatch.setenv("DOWNLOAD_SPOOL_DIR", str(tmp_path))
+    _FlakyFile.requests_seen = []
+    _FlakyFile.honour_range = honour_range
+    _FlakyFile.etag = etag
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyFile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tokens = iter(["t1", "t2", "t3"])
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/manual.pdf"
+        return stream_to_file(url, lambda: {"Authorization": f"Bearer {next(tokens)}"}, retries=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_interrupted_download_resumes_with_range(tmp_path, monkeypatch):
+    path = _download(tmp_path, monkeypatch, honour_range=True)
+    assert path.read_bytes() == PAYLOAD
+    (first, _, auth1), (resume, if_range, auth2) = _FlakyFile.requests_seen
+    assert first is None and resume.startswith("bytes=") and int(resume[6:-1]) > 0
+    assert if_range == '"v1"' and (auth1, auth2) == ("Bearer t1", "Bearer t2")  # token refreshed per attempt
+
+
+def test_server_ignoring_range_restarts_cleanly(tmp_path, monkeypatch):
+    path = _download(tmp_path, monkeypatch, honour_range=False)
+    assert path.read_bytes() == PAYLOAD
+    with temporary_download(path):
+        pass
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_without_etag_restarts_instead_of_resuming(tmp_path, monkeypatch):
+    path = _download(tmp_path, monkeypatch, honour_range=True, etag=None)
+    assert path.read_bytes() == PAYLOAD
+    assert [(rng, if_range) for rng, if_range, _auth in _FlakyFile.requests_seen] == [(None, None), (None, None)]
+
+
+def _spooled(file_id):
+    path = _spool_dir / f"{file_id}.pdf"
+    path.write_bytes(file_id.encode())
+    return path
+
+
+def _read_convert(pdf, file_name):
+    return {"collected": [{"type": "text", "text": pdf.read_text()}], "total_pages": 1, "convert_s": 0.0}
+
+
+def _noop_init(*_):
+    pass
+
+
+def test_parallel_ingest_passes_paths_and_removes_spool_files(tmp_path):
+    global _spool_dir
+    _spool_dir = tmp_path
+    items = [(f"id{i}", f"doc{i}.pdf") for i in range(4)]
+    texts = {
+        name: parsed["collected"][0]["text"]
+        for _fid, name, parsed, _error in iter_converted(
+            items, _spooled, workers=2, dl_workers=2, convert_fn=_read_convert, initializer=_noop_init
+        )
+    }
+    assert texts == {f"doc{i}.pdf": f"id{i}" for i in range(4)}
+    assert list(tmp_path.iterdir()) == []
+
+
+class _Blob:
+    """download_blob() fake: the first stream drops after one chunk, later ones fail with `error`."""
+
+    def __init__(self, error=None):
+        self.calls, self.error = [], error
+
+    def download_blob(self, offset=None, **kwargs):
+        self.calls.append((offset, kwargs.get("etag")))
+
+        def chunks():
+            start = offset or 0
+            yield PAYLOAD[start : start + 1024]
+            if len(self.calls) == 1:
+                raise ServiceResponseError("connection reset")
+            if self.error:
+                raise self.error
+            yield PAYLOAD[start + 1024 :]
+
+        return SimpleNamespace(properties=SimpleNamespace(etag='"v1"'), chunks=chunks)
+
+
+def _reader(blob):
+    reader = RawFilesBlobReader.__new__(RawFilesBlobReader)
+    reader.container = "raw-files"
+    reader.client = SimpleNamespace(
+        list_blobs=lambda name_starts_with=None: [SimpleNamespace(name="doc/manual.pdf")],
+        get_blob_client=lambda name: blob,
+    )
+    return reader
+
+
+def test_blob_download_resumes_pinned_to_first_etag(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(raw_blob_reader.time, "sleep", lambda s: None)
+    blob = _Blob()
+    path, name = _reader(blob).download_pdf("doc")
+    assert path.read_bytes() == PAYLOAD and name == "doc/manual.pdf"
+    assert blob.calls == [(None, None), (1024, '"v1"')]
+
+
+def test_blob_download_removes_spool_file_on_any_error(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(raw_blob_reader.time, "sleep", lambda s: None)
+    with pytest.raises(OSError):
+        _reader(_Blob(error=OSError("disk full"))).download_pdf("doc")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,104 @@
+import io
+import threading
+import time
+import weakref
+
+from PIL import Image
+
+from src.text_indexing.markdown_builder import FigureUploader, render_markdown
+from src.text_indexing.step_builder import build_steps
+
+
+class _Storage:
+    def __init__(self, delay_s=0.0):
+        self.delay_s, self.blobs = delay_s, {}
+
+    def upload_and_get_sas(self, data, blob_name, **kwargs):
+        time.sleep(self.delay_s)
+        self.blobs[blob_name] = data
+        return f"https://blob/{blob_name}?sas"
+
+
+def _items(live=None, figures=3):
+    """Preamble logo, then steps 1 and 2 with figures; bitmaps are created as items are read."""
+
+    def image(page, shade):
+        img = Image.new("RGB", (32, 32), (shade, 0, 0))
+        if live is not None:
+            live.append(weakref.ref(img))
+        return {"type": "image", "image": img, "page": page, "step": None}
+
+    yield {"type": "text", "text": "Printer guide", "step": None}
+    yield image(1, 1)
+    for step in (1, 2):
+        yield {"type": "text", "text": f"Step {step}: Open tray {step}", "step": step}
+        for n in range(figures):
+            yield image(step + 1, 10 * step + n)
+
+
+def test_streamed_figures_render_like_the_batch_path(monkeypatch):
+    monkeypatch.setenv("FIGURE_FORMAT", "png")
+    batch_storage, stream_storage = _Storage(), _Storage()
+    batch = render_markdown(build_steps(list(_items())), "m", None, batch_storage)
+
+    uploader = FigureUploader(stream_storage, "m", window=2)
+    try:
+        ordered_steps = build_steps(_items(), on_image=uploader.submit_item)
+        stream = render_markdown(ordered_steps, "m", None, stream_storage, uploader=uploader)
+    finally:
+        uploader.close()
+
+    assert stream == batch
+    assert stream_storage.blobs == batch_storage.blobs
+    assert "m/images/fig_4_page_2.png" in stream_storage.blobs  # logo, then step 1's figures in order
+    assert all("image" not in itm for _, data in ordered_steps for itm in data["content"])
+
+
+def test_out_of_order_steps_get_distinct_figure_names(monkeypatch):
+    monkeypatch.setenv("FIGURE_FORMAT", "png")
+    logo = {"type": "image", "image": Image.new("RGB", (8, 8), (1, 0, 0)), "page": 1, "step": None}
+    items = [
+        {"type": "text", "text": "Printer guide", "step": None},
+        logo,
+        {"type": "text", "text": "Step 2: Close tray", "step": 2},
+        {"type": "image", "image": Image.new("RGB", (8, 8), (2, 0, 0)), "page": 1, "step": None},
+        {"type": "text", "text": "Step 1: Open tray", "step": 1},
+        {"type": "image", "image": Image.new("RGB", (8, 8), (3, 0, 0)), "page": 1, "step": None},
+    ]
+    storage = _Storage()
+    uploader = FigureUploader(storage, "m", window=2)
+    try:
+        ordered_steps = build_steps(iter(items), on_image=uploader.submit_item)
+        full_md, _, sas_urls, fig_meta = render_markdown(ordered_steps, "m", None, storage, uploader=uploader)
+    finally:
+        uploader.close()
+
+    assert len(storage.blobs) == len(set(sas_urls)) == 3
+    assert [m["step"] for m in fig_meta] == [1, 1, 2]
+    shades = [Image.open(io.BytesIO(storage.blobs[m["blob_name"]])).getpixel((0, 0))[0] for m in fig_meta]
+    assert shades == [1, 3, 2]  # preamble logo joins step 1, the lowest step, ahead of its own figure
+    assert full_md.index("Step 1: Open tray") < full_md.index("Step 2: Close tray")
+
+
+def test_bitmaps_in_memory_bounded_by_window():
+    live = []
+    peak, lock = [0], threading.Lock()
+    storage = _Storage(delay_s=0.01)
+    upload = storage.upload_and_get_sas
+
+    def tracked_upload(data, blob_name, **kwargs):
+        with lock:
+            peak[0] = max(peak[0], sum(ref() is not None for ref in live))
+        return upload(data, blob_name, **kwargs)
+
+    storage.upload_and_get_sas = tracked_upload
+    uploader = FigureUploader(storage, "m", window=3)
+    try:
+        ordered_steps = build_steps(_items(live, figures=12), on_image=uploader.submit_item)
+        _, _, sas_urls, fig_meta = render_markdown(ordered_steps, "m", None, storage, uploader=uploader)
+    finally:
+        uploader.close()
+
+    assert len(sas_urls) == 25 and [m["step"] for m in fig_meta] == [1] * 13 + [2] * 12
+    assert peak[0] <= 3 + 1  # in flight plus the one waiting to be submitted
+    assert all(ref() is None for ref in live)
@@ -1,4 +1,5 @@
 import sys
+import uuid
 from pathlib import Path
 
 import streamlit as st
@@ -14,9 +15,15 @@ from src.wrappers.qa_service import answer_question
 st.set_page_config(page_title="1440 Bot", page_icon="🤖", layout="wide")
 st.title("1440 Bot - Multimodal RAG")
 
-# Simple chat state
+# Simple chat state; session_id keys the server-side conversation memory, and the last
+# response id / manual are kept here too so the chain survives a server-side eviction.
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "previous_response_id" not in st.session_state:
+    st.session_state.previous_response_id = None
+    st.session_state.previous_context_id = None
 
 
 def add_message(role: str, content: str) -> None:
@@ -35,9 +42,16 @@ if prompt:
     add_message("user", prompt)
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
-            res = answer_question(prompt)
+            res = answer_question(
+                prompt,
+                session_id=st.session_state.session_id,
+                previous_response_id=st.session_state.previous_response_id,
+                previous_context_id=st.session_state.previous_context_id,
+            )
             if res.get("ok"):
                 reply = res.get("answer_markdown") or ""
+                st.session_state.previous_response_id = res.get("response_id")
+                st.session_state.previous_context_id = res.get("context_id")
             else:
                 reply = f"Error: {res.get('message') or 'OpenAI call failed'}"
 